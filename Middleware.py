@@ -1,23 +1,48 @@
 import json
 import re
 import ast
-import pickle
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from defect_classes import DefectClass
+import math
+import time
+import asyncio
+import logging
+from classifier import get_classifier, snippet_for_lines
 from strategy_router import STRATEGY_ROUTER, PROMPT_TEMPLATES
+from tracing import Tracer
+from history import CommandHistory
+from fix_gate import REJECTED
+from edits import EDIT_FORMAT, apply_edits, numbered
+from observation import last_tools
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4.0
+
+def estimate_tokens(text: str, chars_per_token: float = CHARS_PER_TOKEN) -> int:
+    """Rough token count for backends that report none."""
+    return math.ceil(len(text or "") / chars_per_token)
 
 class Middleware:
-    def __init__(self, llm, fsm, toolset, static_prompt):
+    def __init__(self, llm, fsm, toolset, static_prompt, classifier=None, speculative=None,
+                 token_budget: int = None, tracer: Tracer = None, mutator=None, recorder=None):
         self.llm       = llm
         self.fsm       = fsm
         self._forced_tool = None      
-        model_dir = "defect_classifier_model"
-        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
-        self.classifier = AutoModelForSequenceClassification.from_pretrained(model_dir)
-        with open("label_encoder.pkl","rb") as f:
-            self.label_encoder = pickle.load(f)
+        # Shared, lazily loaded CodeBERT classifier (see classifier.get_classifier)
+        self.classifier = classifier or get_classifier()
+        # Optional speculative.SpeculativeFixer serving generate_method_body with N validated candidates
+        self.speculative = speculative
+        # Timed spans for this session (see tracing.Tracer)
+        self.tracer = tracer or Tracer()
+        # Optional mutation_repair.MutationRepairer tried before the first LLM call
+        self.mutator = mutator
+        # Optional trajectories.TrajectoryRecorder logging every transition for offline RL
+        self.recorder = recorder
+        # Start and LLM time of the cycle being dispatched, for the recorder
+        self._cycle_started = None
+        self._llm_seconds = 0.0
 
         self._strategy_initialized = False
+        self._strategy_injected = False
 
         self.toolset   = toolset
         self.prompt    = {
@@ -26,59 +51,124 @@ class Middleware:
             'guidelines':static_prompt['guidelines'],
             'tools':     static_prompt['tools'],
             'state':     None,     
-            'history':   [],       
+            'history':   CommandHistory(),
         }
+        # Role, goals, guidelines and tool list never change within a session: assemble
+        # them once and send them as a prefix the backend can keep in its context cache
+        self.static_prefix = "\n\n".join([
+            self.prompt['role'],
+            self.prompt['goals'],
+            self.prompt['guidelines'],
+            f"Available tools: {', '.join(self.prompt['tools'])}",
+        ])
+        # Prompt + completion tokens allowed per session (None: unlimited)
+        self.token_budget = token_budget
+        self.usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'cached_tokens': 0,
+                      'calls': 0, 'estimated_calls': 0, 'cycles': []}
+        self.fsm.state_data['token_usage'] = self.usage
+        # Characters per token, recalibrated from every call whose backend reported its usage
+        self._chars_per_token = CHARS_PER_TOKEN
     def _maybe_inject_strategy(self):
+        # The template goes into the first prompt after classification, even when
+        # the classification itself happened earlier (mutation stage)
+        if self._strategy_injected or not self._init_strategy():
+            return ""
+        self._strategy_injected = True
+        return f"Repair strategy template:\n{self.fsm.state_data['strategy_prompt']}\n\n"
+
+    def _init_strategy(self) -> bool:
+        """Classify the defect and load its strategy and prompt template, once failing tests are known."""
         if self._strategy_initialized:
-            return ""  
+            return True
         tests = self.fsm.state_data.get('bug_info', {}).get('tests', [])
         if not tests:
-            return ""
+            return False
         
-        first_test = tests[0]
-        line_no    = first_test.line_no
-        method_name= first_test.name
-        # Extract context around the buggy line
-        start = max(1, line_no - 3)
-        end   = line_no + 3
-        snippet = self.toolset.read_range(
-            file_path="current_program.py",
-            start_line=start,
-            end_line=end
-        )
-        # Classify via CodeBERT
-        tokens = self.tokenizer(snippet, return_tensors="pt", truncation=True, max_length=512)
-        logits = self.classifier(**tokens).logits
-        pred  = logits.argmax(dim=-1).item()
-        defect_label = self.label_encoder.inverse_transform([pred])[0]
-        defect = DefectClass(defect_label)
+        work_file = self.fsm.state_data.get('work_file', 'current_program.py')
+        snippet, method_name, line_no = self._classification_input(work_file)
+        # Classify via CodeBERT (served from the prediction cache when already seen)
+        with self.tracer.span('classify', cat='classifier'):
+            defect = self.classifier.predict(snippet)
         # Load strategy & template
         self.fsm.state_data['defect_class']  = defect
         self.fsm.state_data['strategy']      = STRATEGY_ROUTER[defect]
         self.fsm.state_data['strategy_idx']  = 0
 
         template = PROMPT_TEMPLATES[defect]
-        method_body = self.toolset.extract_method("current_program.py", method_name)
+        # Numbered as in the file, so the fix can come back as line edits
+        method_body = self.toolset._extract_method_lines(work_file, method_name)
+        if method_body.startswith(("Method '", "Error")):
+            with open(work_file) as f:
+                method_body = numbered(f.readlines())
 
         filled = template.format(
             method_name=method_name,
             line_no=line_no,
             orig_condition="<original condition>",  
-            method_body=method_body
+            method_body=method_body,
+            edit_format=EDIT_FORMAT
         )
+        suspicious = self.fsm.state_data.get('suspicious_lines')
+        if suspicious:
+            filled += "\n\nMost suspicious lines (Ochiai, from per-test coverage):\n" + "\n".join(
+                f"  line {s['line']} ({s['score']:.2f}): {s['code']}" for s in suspicious)
 
+        self.fsm.state_data['strategy_prompt'] = filled
         self._strategy_initialized = True
-        return f"Repair strategy template:\n{filled}\n\n"
+        return True
+
 
+    def _classification_input(self, work_file: str) -> tuple:
+        """
+        Snippet, method name and line number to classify. The snippet spans the
+        lines that share the top suspiciousness score (run_fault_localization)
+        plus classifier.SNIPPET_CONTEXT lines either side; without a ranking the
+        whole program is classified.
+        """
+        method_name = self.fsm.state_data.get('algo_name', '')
+        suspicious = self._suspicious_lines(method_name)
+        if not suspicious:
+            return snippet_for_lines(work_file, []), method_name, None
+        top = [s['line'] for s in suspicious if s['score'] == suspicious[0]['score']]
+        return snippet_for_lines(work_file, top), method_name, suspicious[0]['line']
 
-    def _force_strategy_tool(self, proposed_tool):
+    def _suspicious_lines(self, algo_name: str) -> list:
+        """Ranked lines from run_fault_localization, kept in state_data['suspicious_lines']."""
+        with self.tracer.span('fault_localization', cat='tool') as span:
+            ranked = self.toolset.run_fault_localization(file_path=algo_name)
+            span['lines'] = len(ranked)
+        ranked = [r for r in ranked if isinstance(r, dict)]
+        if not ranked:
+            logger.info(f"fault localization found no suspicious lines for {algo_name}")
+        self.fsm.state_data['suspicious_lines'] = ranked
+        return ranked
+
+    def _force_strategy_tool(self, proposed_tool, args: dict = None):
         strat = self.fsm.state_data.get('strategy', [])
         idx   = self.fsm.state_data.get('strategy_idx', 0)
         if idx < len(strat):
             next_tool = strat[idx]
             self.fsm.state_data['strategy_idx'] = idx + 1
+            # generate_method_body already applied the fix: the strategy's write_fix step has nothing to write
+            if next_tool == 'write_fix' and not (args or {}).get('new_source') and not self._pending_fix():
+                return proposed_tool
             return next_tool
         return proposed_tool
+
+    def _pending_fix(self):
+        """The generated fix if it can still be written: in GENERATE_FIX, not in place and not tried before."""
+        fix = self.fsm.state_data.get('fix')
+        if not fix or self.fsm.current_state() != 'GENERATE_FIX':
+            return None
+        if fix in self.fsm.state_data['tried_fixes']:
+            return None
+        try:
+            with open(self.fsm.state_data['work_file']) as f:
+                if f.read().strip() == fix.strip():
+                    return None
+        except OSError:
+            pass
+        return fix
     
     def override_next_tool(self, tool_name: str, args: dict = None):
         self._forced_tool = (tool_name, args or {})
@@ -95,7 +185,8 @@ class Middleware:
             try: 
                 payload = ast.literal_eval(clean_output)
             except Exception as e:
-                print(f"⚠️ parse_response failed: {e}\nRaw output:\n{llm_output}")
+                logger.warning(f"parse_response failed: {e}")
+                logger.debug(f"Raw output:\n{llm_output}")
                 for t in self.prompt['tools']:
                     if re.search(rf'"?{t}"?', llm_output):
                         return t, {}
@@ -113,6 +204,12 @@ class Middleware:
         if tool_name == "run_tests":
             args["test_script"]=  self.fsm.test_script
             args["file_path"] = self.fsm.state_data.get("algo_name", "bitcount")
+            # Validating a candidate only needs pass/fail: stop at the first failing case
+            args["fail_fast"] = self.fsm.current_state() == 'VALIDATE_FIX'
+        if tool_name == "run_fault_localization":
+            args["file_path"] = self.fsm.state_data.get("algo_name", "bitcount")
+        if tool_name == "generate_method_body":
+            return self._generate_fix(args)
         tool = getattr(self.toolset, tool_name, None)
         if not tool:
             return f"Error: unknown tool '{tool_name}'."
@@ -122,77 +219,285 @@ class Middleware:
         except Exception as e:
             return f"Exception during {tool_name}: {e}"
 
-    def update_prompt(self, command: str, result: str):
-        self.prompt['history'].append((command, result))
+    def _generate_fix(self, args: dict) -> str:
+        """
+        generate_method_body with the session's LLM. The strategy template (which
+        carries the method body) is used when the LLM gave no usable prompt.
+        """
+        prompt = args.get("prompt") if isinstance(args.get("prompt"), str) else ""
+        strategy_prompt = self.fsm.state_data.get('strategy_prompt', '')
+        if strategy_prompt and strategy_prompt not in prompt:
+            prompt = f"{strategy_prompt}\n\n{prompt}".strip()
+        # Fix generation has the longest outputs (n of them when speculating): charge it too
+        if self._over_budget():
+            return "Error: token budget exhausted."
+        started = time.perf_counter()
+        try:
+            if self.speculative is None:
+                usage = {}
+                output = self.toolset.generate_method_body(prompt, self.llm, usage=usage)
+                self._record_usage(prompt, output, usage, kind='fix')
+                return output
+            calls = []
+            report = self.speculative.propose(prompt, self.fsm.state_data.get("algo_name", "bitcount"),
+                                              usage=calls, original=self.fsm.state_data.get('original_source'))
+            for output, usage in calls:
+                self._record_usage(prompt, output, usage, kind='fix')
+        except Exception as e:
+            return f"Exception during generate_method_body: {e}"
+        finally:
+            self._llm_seconds += time.perf_counter() - started
+        if report['verified']:
+            self.fsm.state_data['verified_fix'] = report['source']
+        return report['source']
+
+    def update_prompt(self, tool_name: str, args: dict, result):
+        # The history keeps a bounded, summarized record, so prompts stay about the same size
+        self.prompt['history'].append(tool_name, args, result)
         self.prompt['state'] = self.fsm.current_state()
         
         dynamic_parts = [
             f"Current state: {self.prompt['state']}",
             "History of commands and results:"
-        ] + [f"- {c}: {r}" for c, r in self.prompt['history'][-5:]]
+        ] + self.prompt['history'].render()
         self.prompt['dynamic'] = "\n".join(dynamic_parts)
 
 
-    def run_cycle(self):
-        # Build the dynamic prompt, injecting strategy template on first cycle
+    def _build_prompt(self) -> str:
+        # Build the dynamic prompt, injecting strategy template on first cycle.
+        # The static part travels separately as self.static_prefix.
         dynamic = self.prompt.get('dynamic', '')
         injection = self._maybe_inject_strategy()
         if injection:
             dynamic = injection + dynamic
-        # 1. Build prompt text
-        full_prompt = "\n\n".join([
-            self.prompt['role'],
-            self.prompt['goals'],
-            self.prompt['guidelines'],
-            f"Available tools: {', '.join(self.prompt['tools'])}",
-            dynamic
-        ])
-        # 2. Query LLM
-        if self._forced_tool is None:
-            llm_output = self.llm.generate(full_prompt)
-            print("===== DEBUG LLM OUTPUT =====\n", llm_output, "\n=============================\n")
-            tool_name, args = self.parse_response(llm_output)
+        return dynamic
+
+    def _record_usage(self, prompt: str, llm_output: str, usage: dict, kind: str = 'tool'):
+        """
+        Add one LLM call to the session's token accounting (estimated if the
+        backend reported nothing, at the characters per token of the calls
+        that did report usage). kind is 'tool' for the tool-choice call of a
+        cycle, which carries the static prefix, and 'fix' for fix generation.
+        """
+        estimated = 'prompt_tokens' not in usage
+        prefix = self.static_prefix if kind == 'tool' else ""
+        if estimated:
+            usage = {'prompt_tokens': estimate_tokens(prefix + prompt, self._chars_per_token),
+                     'completion_tokens': estimate_tokens(llm_output, self._chars_per_token),
+                     'cached_tokens': 0, 'cache_hit': usage.get('cache_hit', False)}
         else:
-            llm_output = "<forced-by-override>"
-            tool_name, args = self._forced_tool
-            self._forced_tool = None
+            reported = usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0)
+            if reported:
+                self._chars_per_token = len(prefix + prompt + (llm_output or "")) / reported
+        self.usage['calls'] += 1
+        self.usage['estimated_calls'] += int(estimated)
+        for field in ('prompt_tokens', 'completion_tokens', 'cached_tokens'):
+            self.usage[field] += usage.get(field, 0)
+        self.usage['cycles'].append({
+            'cycle': self.fsm.cycle_count,
+            'kind': kind,
+            'prompt_tokens': usage.get('prompt_tokens', 0),
+            'completion_tokens': usage.get('completion_tokens', 0),
+            'cached_tokens': usage.get('cached_tokens', 0),
+            'estimated': estimated,
+            'cache_hit': bool(usage.get('cache_hit', False)),
+        })
+
+    def tokens_used(self) -> int:
+        return self.usage['prompt_tokens'] + self.usage['completion_tokens']
 
-        tool_name = self._force_strategy_tool(tool_name)
+    def _over_budget(self) -> bool:
+        """Fail the session instead of making another LLM call once the token budget is spent."""
+        if self.token_budget is None or self.tokens_used() < self.token_budget:
+            return False
+        logger.warning(f"token budget exhausted ({self.tokens_used()}/{self.token_budget}); failing session")
+        self.fsm.state = 'FAILED'
+        self.fsm.state_data['failure_reason'] = 'token_budget'
+        return True
+
+    def _dispatch(self, llm_output, tool_name: str, args: dict, follow_strategy: bool = True):
+        """Run the chosen tool, record it and advance the FSM."""
+        dispatch_started = time.perf_counter()
+        if follow_strategy:
+            tool_name = self._force_strategy_tool(tool_name, args)
         command_desc = f"{tool_name}({args})"
 
-        print(f"===== DEBUG PARSED =====\n tool_name = {tool_name!r}, args = {args!r}\n========================\n")
+        logger.debug(f"parsed tool_name={tool_name!r}, args={args!r}")
 
         self.fsm.state_data.setdefault('analysis_cycles', 0)
-        if tool_name != 'write_fix':
+        if tool_name not in ('write_fix', 'apply_edits'):
             self.fsm.state_data['analysis_cycles'] += 1
         else:
             self.fsm.state_data['analysis_cycles'] = 0
 
-        if self.fsm.state_data['analysis_cycles'] >= 2:
-            fix_source = self.fsm.state_data.get('fix')
+        # After two analysis cycles, write the generated fix instead, unless the
+        # cycle runs the tests or asks for a fix, or that fix was already tried
+        if (self.fsm.state_data['analysis_cycles'] >= 2
+                and tool_name not in ('run_tests', 'generate_method_body')):
+            fix_source = self._pending_fix()
             if fix_source:
                 tool_name = 'write_fix'
                 args = {
-                    'file_path': 'current_program.py',
-                    'new_source': self.fsm.state_data.get('fix','')
+                    'file_path': self.fsm.state_data.get('work_file', 'current_program.py'),
+                    'new_source': fix_source
                 }
+                self.fsm.state_data['analysis_cycles'] = 0
         command_desc = f"{tool_name}({args})"
 
-        if tool_name == "write_fix":
-            file_path  = args.get("file_path",
-                          self.fsm.state_data.get("work_file", "current_program.py"))
-            new_source = args.get("new_source",
-                          self.fsm.state_data.get("fix", "")) or ""
-            diff = self.toolset.write_fix(
-                file_path=file_path,
-                new_source=new_source
-            ) 
-            self.fsm.state_data['last_diff'] = diff
-            result = diff
-        else:
-            result = self.invoke_tool(tool_name, args)
-            
-        self.update_prompt(command_desc, result)
-        self.fsm.transition(tool_name, result)
+        with self.tracer.span(f"tool:{tool_name}", cat='tool'):
+            if tool_name in ("write_fix", "apply_edits"):
+                file_path  = args.get("file_path",
+                              self.fsm.state_data.get("work_file", "current_program.py"))
+                rejection = None
+                if tool_name == "apply_edits":
+                    new_source, rejection = self._edited_source(args.get("edits"))
+                else:
+                    new_source = args.get("new_source",
+                                  self.fsm.state_data.get("fix", "")) or ""
+                if not rejection and self.fsm.current_state() == 'GENERATE_FIX':
+                    new_source, rejection = self._prevalidate(new_source)
+                self.fsm.state_data['tried_fixes'].append(new_source)
+                if rejection:
+                    result = rejection
+                else:
+                    diff = self.toolset.write_fix(
+                        file_path=file_path,
+                        new_source=new_source
+                    )
+                    # Re-writing the source already in place (e.g. the strategy's write_fix right
+                    # after generate_method_body applied it) must not erase the diff being validated
+                    if diff != 'No changes made.' or not self.fsm.state_data.get('last_diff'):
+                        self.fsm.state_data['last_diff'] = diff
+                    result = diff
+            else:
+                result = self.invoke_tool(tool_name, args)
+                if tool_name == 'generate_method_body' and self.fsm.current_state() == 'GENERATE_FIX':
+                    source, rejection = self._prevalidate(result)
+                    result = rejection or source
+
+        previous_tools = last_tools(self.prompt['history'])
+        with self.tracer.span('fsm.transition', cat='fsm', tool=tool_name) as span:
+            span['from'] = self.fsm.current_state()
+            self.fsm.transition(tool_name, result)
+            span['to'] = self.fsm.current_state()
+        # After the transition, so the next prompt shows the state the next tool runs in
+        self.update_prompt(tool_name, args, result)
+        if self.recorder is not None:
+            self.recorder.record(span['from'], previous_tools, tool_name, span['to'],
+                                 time.perf_counter() - (self._cycle_started or dispatch_started),
+                                 self._llm_seconds)
+            self._cycle_started, self._llm_seconds = None, 0.0
         return llm_output, command_desc, result
 
+    def _prevalidate(self, candidate: str) -> tuple:
+        """
+        Returns (source, rejection): the fence-stripped candidate, and the message
+        sent back to the LLM in place of a test run if the static checks fail.
+        """
+        with self.tracer.span('prevalidate', cat='tool') as span:
+            source, reason = self.fsm.prevalidate(candidate)
+            span['rejected'] = reason is not None
+        if reason is None:
+            return source, None
+        return source, self._rejection(reason)
+
+    def _rejection(self, reason: str) -> str:
+        logger.info(f"rejected candidate fix: {reason}")
+        return f"{REJECTED} {reason}. Nothing was written or tested; send a corrected version."
+
+    def _edited_source(self, edits) -> tuple:
+        """(source, rejection) for apply_edits: the work file with the edits applied."""
+        work_file = self.fsm.state_data.get('work_file', 'current_program.py')
+        try:
+            with open(work_file) as f:
+                return apply_edits(f.read(), edits), None
+        except (OSError, ValueError) as e:
+            return "", self._rejection(f"invalid line edits: {e}")
+
+    def try_mutation_fix(self) -> bool:
+        """
+        LLM-free fast path, run before the first LLM cycle: run the tests, classify
+        the defect and let self.mutator validate AST mutations for that class.
+        A passing mutation is written and re-tested through the FSM like any
+        other fix. Returns True if the session reached GOAL_ACCOMPLISHED; otherwise
+        the FSM is left in GENERATE_FIX for the LLM to take over.
+        """
+        if self.mutator is None or self.fsm.current_state() != 'INIT':
+            return False
+        work_file = self.fsm.state_data.get('work_file', 'current_program.py')
+        self._run_tool('run_tests')
+        if not self.fsm.state_data.get('initial_failures') or not self._init_strategy():
+            return False
+        defect = self.fsm.state_data['defect_class']
+        with self.tracer.span('mutation_repair', cat='repair', defect=defect.value) as span:
+            lines = [s['line'] for s in self.fsm.state_data.get('suspicious_lines', [])]
+            report = self.mutator.repair(work_file, self.fsm.state_data.get('algo_name', 'bitcount'), defect,
+                                         lines=lines or None)
+            span.update(candidates=report['candidates'], validated=report['validated'],
+                        verified=report['verified'])
+        self.fsm.state_data['mutation'] = {k: v for k, v in report.items() if k != 'source'}
+        if not report['verified']:
+            return False
+        self._run_tool('write_fix', {'file_path': work_file, 'new_source': report['source']})
+        self._run_tool('run_tests')
+        return self.fsm.current_state() == 'GOAL_ACCOMPLISHED'
+
+    def _run_tool(self, tool_name: str, args: dict = None):
+        """One FSM cycle with a tool chosen by the caller: no LLM call, no strategy override."""
+        self.fsm.cycle_count += 1
+        return self._dispatch("<mutation-repair>", tool_name, args or {}, follow_strategy=False)
+
+    def _take_forced_tool(self):
+        tool_name, args = self._forced_tool
+        self._forced_tool = None
+        return "<forced-by-override>", tool_name, args
+
+    def run_cycle(self):
+        self._cycle_started = time.perf_counter()
+        # 1. Build prompt text
+        with self.tracer.span('build_prompt'):
+            full_prompt = self._build_prompt()
+        # 2. Query LLM
+        if self._forced_tool is None:
+            if self._over_budget():
+                return None, None, "Error: token budget exhausted."
+            usage = {}
+            llm_started = time.perf_counter()
+            with self.tracer.span('llm', cat='llm'):
+                llm_output = self.llm.generate(full_prompt, prefix=self.static_prefix, usage=usage)
+            self._llm_seconds = time.perf_counter() - llm_started
+            self._record_usage(full_prompt, llm_output, usage)
+            logger.debug(f"LLM output:\n{llm_output}")
+            with self.tracer.span('parse_response'):
+                tool_name, args = self.parse_response(llm_output)
+        else:
+            llm_output, tool_name, args = self._take_forced_tool()
+        # 3. Run the tool and advance the FSM
+        return self._dispatch(llm_output, tool_name, args)
+
+    async def arun_cycle(self, executor=None):
+        """
+        Async run_cycle: awaits the LLM (self.llm must provide `agenerate`) and
+        runs the blocking parts - classification, tools, tests - in `executor`
+        so other sessions on the event loop keep going meanwhile.
+        """
+        loop = asyncio.get_running_loop()
+        self._cycle_started = time.perf_counter()
+        with self.tracer.span('build_prompt'):
+            full_prompt = await loop.run_in_executor(executor, self._build_prompt)
+        if self._forced_tool is None:
+            if self._over_budget():
+                return None, None, "Error: token budget exhausted."
+            usage = {}
+            # Includes time queued behind the shared rate limiter
+            llm_started = time.perf_counter()
+            with self.tracer.span('llm', cat='llm'):
+                llm_output = await self.llm.agenerate(full_prompt, prefix=self.static_prefix, usage=usage)
+            self._llm_seconds = time.perf_counter() - llm_started
+            self._record_usage(full_prompt, llm_output, usage)
+            logger.debug(f"LLM output:\n{llm_output}")
+            with self.tracer.span('parse_response'):
+                tool_name, args = self.parse_response(llm_output)
+        else:
+            llm_output, tool_name, args = self._take_forced_tool()
+        return await loop.run_in_executor(executor, self._dispatch, llm_output, tool_name, args)
@@ -0,0 +1,74 @@
+import time
+import asyncio
+import threading
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts of up to `capacity`."""
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate     = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens  = self.capacity
+        self._updated = time.monotonic()
+        self._lock    = None
+
+    async def acquire(self, tokens: float = 1.0):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+class RateLimitedLLM:
+    """
+    Shares one LLM between many repair sessions. At most max_concurrency
+    requests are in flight, and requests are admitted at requests_per_minute
+    (bursting up to `burst`) to stay inside the API quota.
+
+    The limits live on a private event loop started in __init__ on a daemon
+    thread, so `agenerate` on any loop and `generate` on any thread (e.g. the
+    generate_method_body tool running in an executor) pass the same limiter.
+    Backends with an `agenerate` coroutine are awaited on that loop; plain
+    `generate` backends run in its default executor.
+    """
+    def __init__(self, llm, max_concurrency: int = 8, requests_per_minute: float = 60,
+                 burst: int = None):
+        self.llm        = llm
+        self.model_name = getattr(llm, 'model_name', type(llm).__name__)
+        self.max_concurrency = max_concurrency
+        self.bucket     = TokenBucket(requests_per_minute / 60.0, burst or max_concurrency)
+        self._semaphore = None
+        self.in_flight  = 0
+        self.requests   = 0
+        self._loop      = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name='rate-limited-llm', daemon=True).start()
+
+    async def _limited(self, prompt: str, kwargs: dict) -> str:
+        # Runs on self._loop only
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            await self.bucket.acquire()
+            self.in_flight += 1
+            self.requests  += 1
+            try:
+                if hasattr(self.llm, 'agenerate'):
+                    return await self.llm.agenerate(prompt, **kwargs)
+                return await self._loop.run_in_executor(None, lambda: self.llm.generate(prompt, **kwargs))
+            finally:
+                self.in_flight -= 1
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        return await asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(self._limited(prompt, kwargs), self._loop))
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        return asyncio.run_coroutine_threadsafe(self._limited(prompt, kwargs), self._loop).result()
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
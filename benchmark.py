@@ -0,0 +1,282 @@
+import os
+import re
+import csv
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import functools
+import subprocess
+import evaluate
+from classifier import DefectClassifier, register_classifier, snippet_for_file
+from defect_classes import DefectClass
+from llm_cache import make_llm
+from edits import edit_script
+from tracing import aggregate
+
+logger = logging.getLogger(__name__)
+
+CORRECT_DIR = os.path.join('Code-Refactoring-QuixBugs', 'correct_python_programs')
+LABELS_CSV  = 'quixbugs_defect_labels.csv'
+OUTPUT      = 'benchmark_results.json'
+STATE_RE    = re.compile(r"Current state: (\w+)")
+DEF_RE      = re.compile(r"def (\w+)\s*\(")
+
+class ScriptedLLM:
+    """
+    Deterministic stand-in for Gemini. Agent prompts (those sent with the static
+    prefix) are answered from the FSM state named in the prompt: run the tests,
+    ask for a fix, validate it. Fix prompts get the reference program from
+    correct_python_programs (as line edits when the prompt asks for them), so
+    sessions take the same path every run.
+    """
+    model_name = 'scripted'
+    ACTIONS = {'GENERATE_FIX': 'generate_method_body'}
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def generate(self, prompt: str, temperature: float = 0.2, max_output_tokens: int = 512,
+                 prefix: str = None, usage: dict = None) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        if prefix is None:
+            return self._fix(prompt)
+        state = STATE_RE.findall(prompt)
+        tool = self.ACTIONS.get(state[-1] if state else 'INIT', 'run_tests')
+        return json.dumps({"thoughts": "scripted", "command": {"name": tool, "args": {}}})
+
+    async def agenerate(self, prompt: str, **kwargs) -> str:
+        return self.generate(prompt, **kwargs)
+
+    def _fix(self, prompt: str) -> str:
+        for name in DEF_RE.findall(prompt):
+            path = os.path.join(CORRECT_DIR, f"{name}.py")
+            if os.path.exists(path):
+                with open(path) as f:
+                    fixed = f.read()
+                if "REPLACE LINES" not in prompt:
+                    return fixed
+                with open(os.path.join(evaluate.BUGGY_DIR, f"{name}.py")) as f:
+                    return edit_script(f.read(), fixed)
+        return ""
+
+class LabelClassifier:
+    """
+    Stand-in for CodeBERT: the hand-labelled defect class of the program a
+    snippet came from, i.e. the labelled file whose source contains it.
+    """
+    def __init__(self, labels_csv: str = LABELS_CSV, code_dir: str = evaluate.BUGGY_DIR,
+                 default: DefectClass = DefectClass.OFF_BY_ONE):
+        self.default = default
+        self.programs = []
+        with open(labels_csv, newline="") as f:
+            for row in csv.DictReader(f):
+                path = os.path.join(code_dir, row['filename'])
+                if os.path.exists(path):
+                    self.programs.append((snippet_for_file(path), DefectClass(row['defect_class'])))
+
+    def load(self):
+        return self
+
+    def label(self, snippet: str) -> DefectClass:
+        return next((label for source, label in self.programs if snippet in source), self.default)
+
+    def classify_batch(self, snippets: list) -> list:
+        return [self.label(s) for s in snippets]
+
+    def predict(self, snippet: str) -> DefectClass:
+        return self.classify_batch([snippet])[0]
+
+
+def percentiles(samples: list, qs=(50, 90, 95, 99)) -> dict:
+    """Nearest-rank percentiles in milliseconds of samples given in seconds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    out = {f"p{q}_ms": 1000 * ordered[min(len(ordered) - 1, max(0, -(-q * len(ordered) // 100) - 1))]
+           for q in qs}
+    out['count'] = len(ordered)
+    return out
+
+def stage_latencies(spans: list) -> dict:
+    """Span name -> latency percentiles."""
+    by_name = {}
+    for s in spans:
+        by_name.setdefault(s['name'], []).append(s['dur'])
+    return {name: percentiles(durs) for name, durs in sorted(by_name.items())}
+
+def peak_rss_mb() -> dict:
+    """Peak RSS of this process and of its reaped children (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale}
+
+def read_spans(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def bench_evaluate(files: list, llm_factory=None, llm_mode: str = 'replay', llm_cache: str = None,
+                   workers: int = 1, concurrency: int = 0, trace_prefix: str = 'benchmark') -> dict:
+    """One evaluate_all sweep with a cold test-outcome cache; LLM requests are not rate limited."""
+    scratch = tempfile.mkdtemp(prefix='bench_')
+    options = {'llm_factory': llm_factory, 'llm_mode': llm_mode,
+               'test_cache_path': os.path.join(scratch, 'outcomes.sqlite'),
+               'results_path': os.path.join(scratch, 'results.jsonl')}
+    if llm_cache:
+        options['llm_cache'] = llm_cache
+    try:
+        start = time.perf_counter()
+        results = evaluate.evaluate_all(files, workers=workers, concurrency=concurrency,
+                                        requests_per_minute=1e9, trace=trace_prefix, **options)
+        wall = time.perf_counter() - start
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    cycles = sum(r.get('cycles', 0) for r in results.values())
+    spans = read_spans(f"{trace_prefix}.jsonl")
+    return {
+        'programs': len(results),
+        'fixed': sum(1 for r in results.values() if r['fixed']),
+        'errors': sum(1 for r in results.values() if 'error' in r),
+        'cycles': cycles,
+        'wall_s': wall,
+        'programs_per_min': 60 * len(results) / wall,
+        'cycles_per_s': cycles / wall,
+        'stages': stage_latencies(spans),
+        'stage_totals': aggregate(spans),
+    }
+
+def bench_env(bugs: list, llm, episodes: int = 5, seed: int = 0) -> dict:
+    """Drive RepairEnv.step with a fixed action script: run tests, generate a fix, validate it."""
+    from repair_env import RepairEnv
+    scratch = tempfile.mkdtemp(prefix='bench_env_')
+    env = RepairEnv(bugs, seed=seed, llm=llm, scratch_root=scratch)
+    script = [env.tool_names.index(t) for t in ('run_tests', 'generate_method_body', 'run_tests')]
+    steps, rewards, spans = [], [], []
+    start = time.perf_counter()
+    try:
+        for _ in range(episodes):
+            env.reset()
+            done, i = False, 0
+            while not done:
+                t0 = time.perf_counter()
+                _, reward, done, _ = env.step(script[i % len(script)])
+                steps.append(time.perf_counter() - t0)
+                i += 1
+            rewards.append(reward)
+            spans.extend(env.middleware.tracer.spans)
+    finally:
+        env.close()
+        shutil.rmtree(scratch, ignore_errors=True)
+    wall = time.perf_counter() - start
+    return {
+        'episodes': episodes,
+        'steps': len(steps),
+        'wall_s': wall,
+        'steps_per_s': len(steps) / wall,
+        'mean_reward': sum(rewards) / len(rewards),
+        'step_latency': percentiles(steps),
+        'stages': stage_latencies(spans),
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.10) -> list:
+    """Lines describing throughput, latency and memory changes beyond `tolerance`."""
+    lines = []
+    def check(label, old, new, higher_is_better, floor=0.0):
+        # floor: ignore absolute differences below it (sub-millisecond stage jitter)
+        if not old or new is None or abs(new - old) < floor:
+            return
+        change = (new - old) / old
+        worse = change < -tolerance if higher_is_better else change > tolerance
+        better = change > tolerance if higher_is_better else change < -tolerance
+        if worse or better:
+            lines.append(f"{'REGRESSION' if worse else 'improved'}: {label} {old:.3g} -> {new:.3g} ({change:+.0%})")
+
+    old_ev, new_ev = baseline.get('evaluate', {}), current.get('evaluate', {})
+    check('evaluate programs/min', old_ev.get('programs_per_min'), new_ev.get('programs_per_min'), True)
+    check('evaluate cycles/s', old_ev.get('cycles_per_s'), new_ev.get('cycles_per_s'), True)
+    for name, row in new_ev.get('stages', {}).items():
+        old = old_ev.get('stages', {}).get(name, {})
+        check(f"{name} p95 ms", old.get('p95_ms'), row.get('p95_ms'), False, floor=1.0)
+    old_env, new_env = baseline.get('env', {}), current.get('env', {})
+    check('env steps/s', old_env.get('steps_per_s'), new_env.get('steps_per_s'), True)
+    check('peak RSS MB', baseline.get('peak_rss_mb', {}).get('self'),
+          current.get('peak_rss_mb', {}).get('self'), False)
+    return lines
+
+def environment() -> dict:
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                             text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        rev = ''
+    return {'git_rev': rev, 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpus': os.cpu_count(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark of the repair pipeline.")
+    parser.add_argument('programs', nargs='*', help=f"Programs to repair (default: all in {evaluate.BUGGY_DIR})")
+    parser.add_argument('--llm', choices=['scripted', 'replay'], default='scripted',
+                        help="scripted: deterministic stand-in; replay: recorded responses from --llm-cache")
+    parser.add_argument('--llm-cache', default=None, help="Response store for --llm replay")
+    parser.add_argument('--llm-latency', type=float, default=0.0,
+                        help="Seconds the scripted LLM sleeps per call (0 measures pipeline overhead only)")
+    parser.add_argument('--classifier', choices=['labels', 'model'], default='labels',
+                        help="labels: hand-labelled classes from the CSV; model: uncached CodeBERT inference")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=0)
+    parser.add_argument('--env-episodes', type=int, default=5, help="RepairEnv episodes (0 skips the env benchmark)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=OUTPUT, help="Where to write the JSON report")
+    parser.add_argument('--compare', metavar='BASELINE', help="Report changes against an earlier JSON report")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    files = args.programs or sorted(f for f in os.listdir(evaluate.BUGGY_DIR) if f.endswith('.py'))
+
+    if args.classifier == 'labels':
+        register_classifier(LabelClassifier())
+    else:
+        register_classifier(DefectClassifier(cache_path=None))
+    if args.llm == 'scripted':
+        llm_factory = functools.partial(ScriptedLLM, latency=args.llm_latency)
+    else:
+        llm_factory = functools.partial(make_llm, evaluate.GEMINI_API_KEY, mode='replay',
+                                        **({'path': args.llm_cache} if args.llm_cache else {}))
+
+    trace_prefix = os.path.splitext(args.output)[0]
+    report = {'environment': environment(),
+              'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')}}
+    report['evaluate'] = bench_evaluate(files, llm_factory=llm_factory, workers=args.workers,
+                                        concurrency=args.concurrency, trace_prefix=trace_prefix)
+    if args.env_episodes:
+        bugs = [os.path.join(evaluate.BUGGY_DIR, f) for f in files]
+        report['env'] = bench_env(bugs, llm_factory(), episodes=args.env_episodes, seed=args.seed)
+    report['peak_rss_mb'] = peak_rss_mb()
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    ev = report['evaluate']
+    print(f"evaluate: {ev['programs_per_min']:.1f} programs/min, {ev['cycles_per_s']:.2f} cycles/s, "
+          f"{ev['fixed']}/{ev['programs']} fixed")
+    if 'env' in report:
+        print(f"env: {report['env']['steps_per_s']:.2f} steps/s over {report['env']['steps']} steps")
+    print(f"peak RSS: {report['peak_rss_mb']['self']:.0f} MB (children {report['peak_rss_mb']['children']:.0f} MB)")
+    print(f"report: {args.output}, traces: {trace_prefix}.jsonl / {trace_prefix}.trace.json")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for line in compare(baseline, report) or ["no changes beyond 10%"]:
+            print(line)
@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules a test worker, code search or evaluation run imports before it needs a model
+MODULES = ['kvstore', 'source_model', 'code_index', 'outcome_cache', 'test_runner', 'fault_localization', 'tools',
+           'workspace', 'tracing', 'prompts', 'fix_gate', 'history', 'observation', 'fsm', 'classifier', 'Middleware', 'llm_interface',
+           'llm_cache', 'async_llm', 'speculative', 'mutation_repair', 'results_log', 'evaluate', 'benchmark']
+# Only imported on first use (model load, Gemini client, RL training)
+HEAVY = ['torch', 'transformers', 'google.generativeai', 'gym', 'stable_baselines3', 'numpy']
+BUDGET = 0.5
+
+PROBE = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def check_module(module: str, heavy: list = HEAVY) -> dict:
+    """
+    Import `module` in a fresh interpreter, from an empty working directory.
+    Reports its import time, which heavy dependencies it pulled in and any
+    files it created (imports must not have side effects).
+    """
+    cwd = tempfile.mkdtemp(prefix='check_imports_')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])),
+               PYTHONDONTWRITEBYTECODE='1')
+    try:
+        proc = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=heavy)],
+                              cwd=cwd, env=env, capture_output=True, text=True, timeout=120)
+        created = sorted(os.listdir(cwd))
+    finally:
+        shutil.rmtree(cwd, ignore_errors=True)
+    if proc.returncode != 0:
+        error = (proc.stderr.strip().splitlines() or ['import failed'])[-1]
+        return {'module': module, 'error': error}
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    report.update(module=module, created=created)
+    return report
+
+def problems(report: dict, budget: float = BUDGET) -> list:
+    if 'error' in report:
+        return [report['error']]
+    found = []
+    if report['seconds'] > budget:
+        found.append(f"import took {report['seconds']:.2f}s (budget {budget:.2f}s)")
+    if report['heavy']:
+        found.append(f"imports {', '.join(report['heavy'])} eagerly")
+    if report['created']:
+        found.append(f"created {', '.join(report['created'])} at import time")
+    return found
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check import time and import-time side effects of the repo's modules.")
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--budget', type=float, default=BUDGET, help="Max seconds per module import")
+    parser.add_argument('--json', action='store_true', help="Print the raw reports as JSON")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    reports = [check_module(m) for m in args.modules]
+    failed = 0
+    for report in reports:
+        found = problems(report, args.budget)
+        failed += bool(found)
+        if not args.json:
+            seconds = f"{report['seconds'] * 1000:7.1f} ms" if 'seconds' in report else "      -   "
+            print(f"{'FAIL' if found else 'ok  '} {report['module']:<16} {seconds}  {'; '.join(found)}")
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    print(f"{len(reports) - failed}/{len(reports)} modules ok ({time.perf_counter() - start:.1f}s)")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,339 @@
+import os
+import gc
+import csv
+import glob
+import pickle
+import hashlib
+import argparse
+import threading
+import time
+from defect_classes import DefectClass
+from kvstore import KeyValueStore, content_hash
+
+MODEL_DIR     = "defect_classifier_model"
+LABEL_ENCODER = "label_encoder.pkl"
+CACHE_PATH    = os.path.join(".cache", "defect_predictions.sqlite")
+WEIGHT_GLOBS  = ("*.safetensors", "*.bin")
+ONNX_DIR      = os.path.join(".cache", "onnx")
+BACKENDS      = ("fp32", "int8", "onnx")
+# Lines of context kept around the suspicious lines in a classifier snippet
+SNIPPET_CONTEXT = 3
+
+def snippet_for_file(file_path: str) -> str:
+    """The classifier's input when no line ranking is known: the whole program."""
+    with open(file_path, "r") as f:
+        return f.read()
+
+def snippet_for_lines(file_path: str, lines: list, context: int = SNIPPET_CONTEXT) -> str:
+    """
+    The classifier's input once fault localization has ranked lines: the span
+    from the first to the last of `lines`, plus `context` lines either side.
+    Falls back to the whole program when `lines` is empty.
+    """
+    if not lines:
+        return snippet_for_file(file_path)
+    with open(file_path, "r") as f:
+        source = f.readlines()
+    start = max(0, min(lines) - 1 - context)
+    return "".join(source[start:max(lines) + context])
+
+def localized_snippet(file_path: str, testcase_path: str, algo_name: str) -> str:
+    """
+    snippet_for_lines over the lines sharing the top Ochiai score when the
+    program is run against testcase_path, as Middleware classifies it.
+    """
+    from fault_localization import collect_coverage, rank_lines
+    coverage = collect_coverage(file_path, testcase_path, algo_name)
+    ranked = rank_lines(coverage.get('cases', []))
+    return snippet_for_lines(file_path, [line for line, score in ranked if score == ranked[0][1]])
+
+class DefectClassifier:
+    """
+    CodeBERT defect classifier. Weights are loaded on the first prediction,
+    not at construction time. Predictions are cached on disk keyed by snippet
+    hash and model revision, so re-classifying a known snippet skips inference.
+
+    backend selects the CPU inference path: 'fp32' (the model as trained),
+    'int8' (torch dynamic quantization of the Linear layers) or 'onnx' (the
+    model exported once to .cache/onnx and run with onnxruntime). num_threads
+    caps the intra-op threads used by torch / onnxruntime.
+    """
+    def __init__(self, model_dir: str = MODEL_DIR, encoder_path: str = LABEL_ENCODER,
+                 cache_path: str = CACHE_PATH, batch_size: int = 16, backend: str = "fp32",
+                 num_threads: int = None, max_length: int = 512):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown classifier backend {backend!r} (expected one of {BACKENDS})")
+        self.model_dir    = model_dir
+        self.encoder_path = encoder_path
+        self.batch_size   = batch_size
+        self.backend      = backend
+        self.num_threads  = num_threads
+        self.max_length   = max_length
+        self.cache = KeyValueStore(cache_path, table='predictions') if cache_path else None
+        self.tokenizer     = None
+        self.model         = None
+        self.session       = None
+        self.label_encoder = None
+        self._revision = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+    @property
+    def revision(self) -> str:
+        """
+        Identifies the model without loading it: config and label encoder contents,
+        the size/mtime of the weight files and, if not fp32, the inference backend
+        (quantized predictions are cached separately).
+        """
+        if self._revision is None:
+            h = hashlib.sha256()
+            for path in (os.path.join(self.model_dir, "config.json"), self.encoder_path):
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        h.update(f.read())
+            for pattern in WEIGHT_GLOBS:
+                for path in sorted(glob.glob(os.path.join(self.model_dir, pattern))):
+                    st = os.stat(path)
+                    h.update(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}".encode())
+            if self.backend != "fp32":
+                h.update(f"backend:{self.backend}".encode())
+            self._revision = h.hexdigest()[:16]
+        return self._revision
+
+    def load(self):
+        with self._lock:
+            if self.loaded:
+                return self
+            import torch
+            from transformers import AutoTokenizer, AutoModelForSequenceClassification
+            if self.num_threads:
+                torch.set_num_threads(self.num_threads)
+            tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+            model = AutoModelForSequenceClassification.from_pretrained(self.model_dir)
+            model.eval()
+            # Inference only: never let autograd touch (and thereby write to) the shared weights
+            for param in model.parameters():
+                param.requires_grad_(False)
+            if self.backend == "int8":
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            elif self.backend == "onnx":
+                self.session = self._onnx_session(tokenizer, model)
+            with open(self.encoder_path, "rb") as f:
+                label_encoder = pickle.load(f)
+            self.tokenizer, self.label_encoder = tokenizer, label_encoder
+            self.model = model
+        return self
+
+    def _onnx_session(self, tokenizer, model):
+        """onnxruntime session over the model exported to ONNX_DIR/<revision>.onnx (exported once)."""
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("classifier backend 'onnx' needs onnxruntime (pip install onnxruntime)") from e
+        import torch
+        path = os.path.join(ONNX_DIR, f"{self.revision}.onnx")
+        if not os.path.exists(path):
+            os.makedirs(ONNX_DIR, exist_ok=True)
+            sample = tokenizer(["def f(x):\n    return x"], return_tensors="pt")
+            names = list(sample.keys())
+            tmp = f"{path}.{os.getpid()}.tmp"
+            torch.onnx.export(model, tuple(sample[n] for n in names), tmp,
+                              input_names=names, output_names=["logits"], opset_version=14,
+                              dynamic_axes={**{n: {0: "batch", 1: "sequence"} for n in names},
+                                            "logits": {0: "batch"}})
+            os.replace(tmp, path)
+        options = onnxruntime.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        return onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def _infer(self, snippets: list) -> list:
+        self.load()
+        import torch
+        # Batch snippets of similar length together and pad each batch only to its
+        # longest member, so a 7-line snippet costs ~100 tokens, not max_length
+        order  = sorted(range(len(snippets)), key=lambda i: len(snippets[i]))
+        labels = [None] * len(snippets)
+        for i in range(0, len(order), self.batch_size):
+            idx    = order[i:i + self.batch_size]
+            batch  = [snippets[j] for j in idx]
+            if self.session is not None:
+                tokens = self.tokenizer(batch, return_tensors="np", padding="longest",
+                                        truncation=True, max_length=self.max_length)
+                inputs = {n.name: tokens[n.name].astype("int64") for n in self.session.get_inputs()}
+                preds  = self.session.run(None, inputs)[0].argmax(axis=-1).tolist()
+            else:
+                tokens = self.tokenizer(batch, return_tensors="pt", padding="longest",
+                                        truncation=True, max_length=self.max_length)
+                with torch.no_grad():
+                    preds = self.model(**tokens).logits.argmax(dim=-1).tolist()
+            for j, label in zip(idx, self.label_encoder.inverse_transform(preds)):
+                labels[j] = str(label)
+        return labels
+
+    def has_predictions(self, snippets: list) -> bool:
+        """True if every snippet's prediction is already cached, so classifying them needs no model."""
+        if self.cache is None:
+            return False
+        keys = [content_hash(self.revision, s) for s in snippets]
+        return len(self.cache.get_many(keys)) == len(set(keys))
+
+    def classify_batch(self, snippets: list) -> list:
+        """
+        Classify many snippets at once. Cached predictions are served from disk;
+        the remaining unique snippets go through the model in padded batches.
+        """
+        keys = [content_hash(self.revision, s) for s in snippets]
+        known = self.cache.get_many(keys) if self.cache is not None else {}
+        todo = {}
+        for key, snippet in zip(keys, snippets):
+            if key not in known:
+                todo.setdefault(key, snippet)
+        if todo:
+            fresh = dict(zip(todo, self._infer(list(todo.values()))))
+            if self.cache is not None:
+                self.cache.put_many(fresh)
+            known.update(fresh)
+        return [DefectClass(known[k]) for k in keys]
+
+    def predict(self, snippet: str) -> DefectClass:
+        return self.classify_batch([snippet])[0]
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def get_classifier(model_dir: str = MODEL_DIR, encoder_path: str = LABEL_ENCODER) -> DefectClassifier:
+    """
+    Process-wide classifier registry: every Middleware / RepairEnv asking for the
+    same model gets the same (lazily loaded) instance.
+    """
+    key = (model_dir, encoder_path)
+    with _registry_lock:
+        clf = _registry.get(key)
+        if clf is None:
+            clf = _registry[key] = DefectClassifier(model_dir, encoder_path)
+    return clf
+
+def register_classifier(classifier, model_dir: str = MODEL_DIR, encoder_path: str = LABEL_ENCODER):
+    """Serve `classifier` (anything with predict/classify_batch) from get_classifier, e.g. a stub in benchmarks."""
+    with _registry_lock:
+        _registry[(model_dir, encoder_path)] = classifier
+    return classifier
+
+def configure_classifier(backend: str = "fp32", num_threads: int = None, model_dir: str = MODEL_DIR,
+                         encoder_path: str = LABEL_ENCODER):
+    """
+    Serve a DefectClassifier with these inference options from get_classifier.
+    Spawned worker processes start with an empty registry, so call it in each
+    of them too, e.g. as a process pool initializer. An already registered
+    classifier with the same options is kept (with any weights it has loaded).
+    """
+    with _registry_lock:
+        clf = _registry.get((model_dir, encoder_path))
+        if (not isinstance(clf, DefectClassifier) or clf.backend != backend
+                or clf.num_threads != num_threads):
+            clf = _registry[(model_dir, encoder_path)] = DefectClassifier(
+                model_dir, encoder_path, backend=backend, num_threads=num_threads)
+    return clf
+
+def preload_classifier(model_dir: str = MODEL_DIR, encoder_path: str = LABEL_ENCODER,
+                       snippets: list = None) -> DefectClassifier:
+    """
+    Load the weights in the parent before forking a worker pool. Children then
+    share the tensors copy-on-write; gc.freeze() moves the loaded objects out of
+    the collector's generations so GC passes in the children don't touch (and
+    copy) their pages. Nothing is loaded when a stub is registered in place of
+    the model, or when the predictions for all snippets are already cached.
+    """
+    clf = get_classifier(model_dir, encoder_path)
+    if not isinstance(clf, DefectClassifier):
+        return clf
+    if snippets is not None and clf.has_predictions(snippets):
+        return clf
+    clf.load()
+    gc.freeze()
+    return clf
+
+def precompute(labels_csv: str, code_dir: str, classifier: DefectClassifier = None,
+               test_dir: str = None) -> dict:
+    """
+    Classify every program listed in labels_csv in one batched pass and fill the
+    prediction cache. With test_dir, each program is classified through the
+    snippet Middleware would build from its JSON test cases (localized_snippet);
+    otherwise the whole program is. Returns {filename: DefectClass}.
+    """
+    classifier = classifier or get_classifier()
+    with open(labels_csv, newline="") as f:
+        names = [row["filename"] for row in csv.DictReader(f)]
+    names = [n for n in names if os.path.exists(os.path.join(code_dir, n))]
+    snippets = []
+    for n in names:
+        algo = os.path.splitext(n)[0]
+        testcase = os.path.join(test_dir, f"{algo}.json") if test_dir else None
+        if testcase and os.path.exists(testcase):
+            snippets.append(localized_snippet(os.path.join(code_dir, n), testcase, algo))
+        else:
+            snippets.append(snippet_for_file(os.path.join(code_dir, n)))
+    return dict(zip(names, classifier.classify_batch(snippets)))
+
+def check_accuracy(labels_csv: str, code_dir: str, backends: tuple = ("fp32", "int8"),
+                   num_threads: int = None) -> dict:
+    """
+    Classify every labelled program with each backend, uncached. Reports accuracy
+    against the CSV labels, inference time and, for every backend after the
+    first, which programs it labels differently from the first one.
+    """
+    with open(labels_csv, newline="") as f:
+        rows = [r for r in csv.DictReader(f) if os.path.exists(os.path.join(code_dir, r["filename"]))]
+    names    = [r["filename"] for r in rows]
+    truth    = [DefectClass(r["defect_class"]) for r in rows]
+    snippets = [snippet_for_file(os.path.join(code_dir, n)) for n in names]
+
+    report, reference = {}, None
+    for backend in backends:
+        clf = DefectClassifier(cache_path=None, backend=backend, num_threads=num_threads).load()
+        start = time.perf_counter()
+        preds = clf.classify_batch(snippets)
+        seconds = time.perf_counter() - start
+        row = {"accuracy": sum(p == t for p, t in zip(preds, truth)) / max(1, len(truth)),
+               "programs": len(names), "seconds": seconds,
+               "ms_per_program": 1000 * seconds / max(1, len(names))}
+        if reference is None:
+            reference = preds
+        else:
+            row["agreement"] = sum(p == r for p, r in zip(preds, reference)) / max(1, len(preds))
+            row["differs_on"] = [n for n, p, r in zip(names, preds, reference) if p != r]
+        report[backend] = row
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-classify a benchmark into the prediction cache.")
+    parser.add_argument("--labels", default="quixbugs_defect_labels.csv")
+    parser.add_argument("--code-dir", default=os.path.join("Code-Refactoring-QuixBugs", "python_programs"))
+    parser.add_argument("--test-dir", default=os.path.join("Code-Refactoring-QuixBugs", "json_testcases"),
+                        help="JSON test cases used to localize each program's snippet")
+    parser.add_argument("--backend", choices=BACKENDS, default="fp32", help="CPU inference path")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads for inference")
+    parser.add_argument("--check", nargs="*", choices=BACKENDS, metavar="BACKEND",
+                        help="Compare backends (default: fp32 int8) on the labelled programs instead")
+    args = parser.parse_args()
+
+    if args.check is not None:
+        report = check_accuracy(args.labels, args.code_dir, tuple(args.check or ("fp32", "int8")), args.threads)
+        for backend, row in report.items():
+            agreement = f", agrees with {next(iter(report))} on {row['agreement']:.1%}" if "agreement" in row else ""
+            print(f"{backend}\taccuracy {row['accuracy']:.1%} on {row['programs']} programs, "
+                  f"{row['ms_per_program']:.1f} ms/program{agreement}")
+            if row.get("differs_on"):
+                print(f"\tdiffers on: {', '.join(row['differs_on'])}")
+    else:
+        clf = register_classifier(DefectClassifier(backend=args.backend, num_threads=args.threads))
+        predictions = precompute(args.labels, args.code_dir, clf, args.test_dir)
+        for name, defect in predictions.items():
+            print(f"{name}\t{defect.value}")
+        print(f"cache: {clf.cache.stats()}")
@@ -0,0 +1,354 @@
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from kvstore import content_hash
+from source_model import get_source_model
+
+INDEX_DIR = os.path.join(".cache", "code_index")
+INDEX_VERSION = 2
+# A directory modified this recently may change again within the same mtime tick: re-list it next time
+RACY_SECONDS = 2.0
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def walk_python_files(root: str) -> list:
+    paths = []
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            if name.endswith('.py'):
+                paths.append(os.path.join(dirpath, name))
+    return paths
+
+def linear_search(root: str, keyword: str) -> list:
+    """Reference implementation: scan every line of every .py file."""
+    matches = []
+    for path in walk_python_files(root):
+        try:
+            with open(path, 'r') as f:
+                for idx, line in enumerate(f.readlines()):
+                    if keyword in line:
+                        matches.append((path, idx + 1, line.strip()))
+        except Exception as e:
+            matches.append((path, None, f"search_error: {e}"))
+    return matches
+
+def _list_dir(dirpath: str) -> tuple:
+    """(mtime_ns, .py files, subdirectories walked) of one directory, in os.walk order."""
+    mtime = os.stat(dirpath).st_mtime_ns
+    files, subdirs = [], []
+    with os.scandir(dirpath) as entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                # os.walk lists symlinked directories but does not descend into them
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+            elif entry.name.endswith('.py'):
+                files.append(entry.path)
+    if time.time_ns() - mtime < RACY_SECONDS * 1e9:
+        mtime = None
+    return mtime, files, subdirs
+
+class TrigramIndex:
+    """
+    Trigram -> files index over the .py files under root, persisted to disk as JSON.
+
+    A query intersects the posting lists of the keyword's trigrams and only
+    scans the lines of the surviving files. Before a query the index is
+    brought up to date incrementally (at most every `max_staleness` seconds):
+    only the directories are stat'ed, and only those whose mtime changed
+    (files added, removed or renamed) are re-listed. Files rewritten in place
+    don't touch their directory; Toolset.write_fix reports them through
+    invalidate_code_index, and the first refresh in a process (or
+    refresh(force=True)) stats every file to catch edits made meanwhile.
+    """
+    def __init__(self, root: str, index_path: str = None, max_staleness: float = 0.0):
+        self.root = root
+        self.index_path = index_path or os.path.join(
+            INDEX_DIR, content_hash(os.path.abspath(root))[:16] + ".json")
+        self.max_staleness = max_staleness
+        self.files    = {}                  # path -> ((mtime_ns, size), trigram set)
+        self.dirs     = {}                  # dir -> (mtime_ns or None, .py files, subdirectories)
+        self.order    = {}                  # path -> position in os.walk order
+        self.postings = defaultdict(set)    # trigram -> paths
+        self._dirty = set()
+        self._verified = False
+        self._refreshed = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get('version') != INDEX_VERSION \
+                or data.get('root') != os.path.abspath(self.root):
+            return
+        try:
+            files = {path: ((mtime, size), None if grams is None else set(grams))
+                     for path, (mtime, size, grams) in data['files'].items()}
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return
+        # Directories are re-listed by the first refresh, which also stats every file
+        self.files = files
+        for path, (_, grams) in files.items():
+            self._post(path, grams)
+
+    def _post(self, path: str, grams):
+        if grams is None:
+            # Unreadable: a candidate for every query so the read error gets reported
+            self.postings[None].add(path)
+            return
+        for gram in grams:
+            self.postings[gram].add(path)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        data = {'version': INDEX_VERSION, 'root': os.path.abspath(self.root),
+                'files': {p: [stamp[0], stamp[1], None if grams is None else sorted(grams)]
+                          for p, (stamp, grams) in self.files.items()}}
+        with open(tmp, 'w') as f:
+            # json.dumps runs the C encoder; json.dump(..., f) would not
+            f.write(json.dumps(data))
+        os.replace(tmp, self.index_path)
+
+    def _drop(self, path: str):
+        _, grams = self.files.pop(path)
+        for gram in (None,) if grams is None else grams:
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(path)
+                if not posting:
+                    del self.postings[gram]
+
+    def _index_file(self, path: str, force: bool = False) -> bool:
+        """(Re)index one file if its mtime/size changed (or force); True if it was."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        stamp = (st.st_mtime_ns, st.st_size)
+        entry = self.files.get(path)
+        if entry is not None and entry[0] == stamp and not force:
+            return False
+        if entry is not None:
+            self._drop(path)
+        try:
+            with open(path, 'r') as f:
+                grams = trigrams(f.read())
+        except Exception:
+            grams = None
+        self.files[path] = (stamp, grams)
+        self._post(path, grams)
+        return True
+
+    def _forget_dir(self, dirpath: str):
+        entry = self.dirs.pop(dirpath, None)
+        for sub in entry[2] if entry else []:
+            self._forget_dir(sub)
+
+    def _relist(self, dirpath: str) -> list:
+        """Re-list dirpath and any subdirectory not seen before; returns their .py files."""
+        old = self.dirs.get(dirpath)
+        try:
+            self.dirs[dirpath] = listing = _list_dir(dirpath)
+        except OSError:
+            self._forget_dir(dirpath)
+            return []
+        for sub in set(old[2] if old else ()) - set(listing[2]):
+            self._forget_dir(sub)
+        files = list(listing[1])
+        for sub in listing[2]:
+            if sub not in self.dirs:
+                files.extend(self._relist(sub))
+        return files
+
+    def _reorder(self):
+        order, stack = {}, [self.root] if self.root in self.dirs else []
+        while stack:
+            _, files, subdirs = self.dirs[stack.pop()]
+            for path in files:
+                order[path] = len(order)
+            stack.extend(sub for sub in reversed(subdirs) if sub in self.dirs)
+        self.order = order
+
+    def invalidate(self, path: str):
+        """Re-index `path` (written in place, so its directory mtime is unchanged) on the next refresh."""
+        rel = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+        if not rel.startswith(os.pardir):
+            with self._lock:
+                self._dirty.add(os.path.join(self.root, rel))
+                self._refreshed = None
+
+    def refresh(self, force: bool = False) -> int:
+        """Re-index changed files; returns how many files were (re)indexed or dropped."""
+        with self._lock:
+            if not force and self._refreshed is not None \
+                    and time.monotonic() - self._refreshed < self.max_staleness:
+                return 0
+            full = force or not self._verified
+            if full:
+                self.dirs = {}
+                stale = [self.root]
+            else:
+                stale = []
+                for dirpath, (mtime, _, _) in self.dirs.items():
+                    try:
+                        current = os.stat(dirpath).st_mtime_ns
+                    except OSError:
+                        current = None
+                    if mtime is None or current != mtime:
+                        stale.append(dirpath)
+            dirty, self._dirty = self._dirty, set()
+            changed = 0
+            to_check = set()
+            for dirpath in stale:
+                # A stale parent may already have re-listed (or dropped) this one
+                if dirpath == self.root or dirpath in self.dirs:
+                    to_check.update(self._relist(dirpath))
+            if stale:
+                self._reorder()
+                for path in [p for p in self.files if p not in self.order]:
+                    self._drop(path)
+                    changed += 1
+            for path in to_check | dirty:
+                if path in self.order:
+                    changed += self._index_file(path, force=path in dirty)
+            if changed:
+                self._save()
+            self._verified = True
+            self._refreshed = time.monotonic()
+            return changed
+
+    def candidates(self, keyword: str) -> list:
+        grams = trigrams(keyword)
+        with self._lock:
+            if not grams:
+                found = set(self.files)
+            else:
+                postings = sorted((self.postings.get(g, set()) for g in grams), key=len)
+                found = set(postings[0]).intersection(*postings[1:])
+            found |= self.postings.get(None, set())
+            order = self.order
+        return sorted((p for p in found if p in order), key=order.get)
+
+    def search(self, keyword: str) -> list:
+        """Same (path, line, text) results, in the same order, as linear_search."""
+        self.refresh()
+        matches = []
+        for path in self.candidates(keyword):
+            try:
+                for idx, line in enumerate(get_source_model(path).lines):
+                    if keyword in line:
+                        matches.append((path, idx + 1, line.strip()))
+            except Exception as e:
+                matches.append((path, None, f"search_error: {e}"))
+        return matches
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_code_index(root: str) -> TrigramIndex:
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = TrigramIndex(root)
+    return index
+
+def invalidate_code_index(path: str):
+    """Tell every index covering `path` that it was rewritten in place."""
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.invalidate(path)
+
+
+def _synthetic_corpus(root: str, n_files: int, lines_per_file: int = 60, seed: int = 0):
+    rng = random.Random(seed)
+    words = [f"{a}{b}" for a in ("get", "set", "load", "parse", "walk", "emit", "merge", "split")
+             for b in ("_node", "_edge", "_item", "_path", "_key", "_value", "_tree", "_heap")]
+    for i in range(n_files):
+        sub = os.path.join(root, f"pkg{i % 32}")
+        os.makedirs(sub, exist_ok=True)
+        with open(os.path.join(sub, f"mod{i}.py"), 'w') as f:
+            for j in range(lines_per_file):
+                f.write(f"    x{j} = {rng.choice(words)}({rng.choice(words)}, {rng.randint(0, 999)})\n")
+        if i == n_files // 2:
+            with open(os.path.join(sub, f"mod{i}.py"), 'a') as f:
+                f.write("    needle = binary_search(arr, target)\n")
+
+def benchmark(sizes: list, queries: list, repeats: int = 5) -> list:
+    """
+    Query latency of the linear scan vs. the trigram index for growing corpora.
+    Every indexed query includes its refresh; refresh_ms is that refresh alone
+    (directory stats only), full_refresh_ms a forced one that stats every file.
+    """
+    rows = []
+    for n in sizes:
+        root = tempfile.mkdtemp(prefix='code_index_bench_')
+        index_dir = tempfile.mkdtemp(prefix='code_index_bench_index_')
+        try:
+            _synthetic_corpus(root, n)
+            # Age the corpus past the racy window, as for a checkout that isn't being edited
+            past = time.time() - 60
+            for dirpath, _, files in os.walk(root):
+                for name in files + ['.']:
+                    os.utime(os.path.join(dirpath, name), (past, past))
+            index = TrigramIndex(root, index_path=os.path.join(index_dir, 'index.json'), max_staleness=0.0)
+            start = time.perf_counter()
+            index.refresh(force=True)
+            build = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(repeats):
+                index.refresh(force=True)
+            full_refresh = (time.perf_counter() - start) / repeats
+            start = time.perf_counter()
+            for _ in range(repeats):
+                index.refresh()
+            refresh = (time.perf_counter() - start) / repeats
+            for query in queries:
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    expected = linear_search(root, query)
+                scan = (time.perf_counter() - start) / repeats
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    got = index.search(query)
+                indexed = (time.perf_counter() - start) / repeats
+                rows.append({'files': n, 'query': query, 'build_s': build,
+                             'refresh_ms': 1000 * refresh, 'full_refresh_ms': 1000 * full_refresh,
+                             'scan_ms': 1000 * scan, 'index_ms': 1000 * indexed,
+                             'matches': len(got), 'same_results': got == expected})
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+            shutil.rmtree(index_dir, ignore_errors=True)
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the code search index or benchmark it.")
+    parser.add_argument("root", nargs="?", default=os.path.join("Code-Refactoring-QuixBugs", "python_programs"))
+    parser.add_argument("--bench", action="store_true", help="Benchmark query latency against corpus size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--queries", nargs="+", default=["binary_search", "merge_heap", "range("])
+    args = parser.parse_args()
+
+    if args.bench:
+        for row in benchmark(args.sizes, args.queries):
+            print(json.dumps(row))
+    else:
+        index = get_code_index(args.root)
+        print(f"indexed {index.refresh(force=True)} changed files under {args.root} -> {index.index_path}")
@@ -0,0 +1,116 @@
+import re
+import difflib
+
+# Compact fix format: a one-line repair costs a few tokens instead of the whole file
+EDIT_FORMAT = (
+    "Reply with line edits only, not the whole file. Line numbers refer to the numbered "
+    "listing; write replacement lines with their full indentation and without the number prefix:\n"
+    "REPLACE LINES 4-4\n"
+    "        n &= n - 1\n"
+    "END\n"
+    "Use `INSERT AFTER LINE n` ... `END` to add lines and an empty REPLACE block to delete them. "
+    "Several blocks may follow each other."
+)
+
+REPLACE_RE = re.compile(r"^\s*REPLACE LINES? (\d+)(?:\s*-\s*(\d+))?\s*:?\s*$")
+INSERT_RE  = re.compile(r"^\s*INSERT AFTER LINE (\d+)\s*:?\s*$")
+END_RE     = re.compile(r"^\s*END\s*$")
+NUMBERED_RE = re.compile(r"^\s*\d+ \| ?")
+
+def numbered(lines: list, start: int = 1) -> str:
+    """Source lines prefixed with their line numbers, as shown to the LLM."""
+    return "".join(f"{n:>3} | {line.rstrip()}\n" for n, line in enumerate(lines, start))
+
+def _header(line: str):
+    match = REPLACE_RE.match(line)
+    if match:
+        start = int(match.group(1))
+        return start, int(match.group(2) or start)
+    match = INSERT_RE.match(line)
+    if match:
+        # Inserting after line n replaces the empty range n+1..n
+        return int(match.group(1)) + 1, int(match.group(1))
+    return None
+
+def is_edit_script(text: str) -> bool:
+    first = next((line for line in (text or "").splitlines() if line.strip()), "")
+    return _header(first) is not None
+
+def parse_edits(edits) -> list:
+    """
+    (start, end, lines) triples from an edit script, or from a list of
+    {'start_line', 'end_line', 'new_text'} dicts (the apply_edits tool args).
+    end == start - 1 means an insertion before `start`. Raises ValueError.
+    """
+    if isinstance(edits, str):
+        return _parse_script(edits)
+    if isinstance(edits, dict):
+        edits = [edits]
+    parsed = []
+    for edit in edits or []:
+        try:
+            start = int(edit['start_line'])
+            end = int(edit.get('end_line', start))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"edit needs integer start_line/end_line: {edit!r}")
+        text = edit.get('new_text', '') or ''
+        parsed.append((start, end, [line + "\n" for line in text.splitlines()]))
+    if not parsed:
+        raise ValueError("no edits given")
+    return parsed
+
+def _parse_script(script: str) -> list:
+    parsed, current = [], None
+    for line in script.splitlines():
+        if current is None:
+            if not line.strip():
+                continue
+            span = _header(line)
+            if span is None:
+                raise ValueError(f"expected REPLACE LINES or INSERT AFTER LINE, got {line.strip()[:60]!r}")
+            current = (span[0], span[1], [])
+        elif END_RE.match(line):
+            parsed.append(current)
+            current = None
+        else:
+            current[2].append(line + "\n")
+    if current is not None:
+        raise ValueError(f"edit at line {current[0]} has no END (output truncated?)")
+    if not parsed:
+        raise ValueError("no edits given")
+    # Tolerate replacement lines copied together with their listing prefix
+    for _, _, body in parsed:
+        if body and all(NUMBERED_RE.match(line) for line in body):
+            body[:] = [NUMBERED_RE.sub("", line, count=1) for line in body]
+    return parsed
+
+def apply_edits(source: str, edits) -> str:
+    """
+    Apply line edits to source. All line numbers refer to source as given;
+    ranges must lie inside the file and must not overlap. Raises ValueError.
+    """
+    lines = source.splitlines(keepends=True)
+    if lines and not lines[-1].endswith("\n"):
+        lines[-1] += "\n"
+    parsed = sorted(parse_edits(edits), key=lambda e: (e[0], e[1]))
+    previous_end = 0
+    for start, end, _ in parsed:
+        if start < 1 or end < start - 1 or end > len(lines):
+            raise ValueError(f"lines {start}-{end} are outside the file (1-{len(lines)})")
+        if start <= previous_end:
+            raise ValueError(f"edit at lines {start}-{end} overlaps the previous one")
+        previous_end = end
+    for start, end, body in reversed(parsed):
+        lines[start - 1:end] = body
+    return "".join(lines)
+
+def edit_script(before: str, after: str) -> str:
+    """The shortest REPLACE/INSERT script turning before into after."""
+    old, new = before.splitlines(), after.splitlines()
+    blocks = []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if op == 'equal':
+            continue
+        header = f"INSERT AFTER LINE {i1}" if i1 == i2 else f"REPLACE LINES {i1 + 1}-{i2}"
+        blocks.append("\n".join([header] + new[j1:j2] + ["END"]))
+    return "\n".join(blocks) + ("\n" if blocks else "")
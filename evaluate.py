@@ -1,160 +1,326 @@
 import os
 import shutil
 import logging
-from llm_interface import GeminiLLM
+import argparse
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from async_llm import RateLimitedLLM
+from llm_cache import make_llm, MODES as LLM_MODES, CACHE_PATH as LLM_CACHE_PATH
 from tools import Toolset
 from fsm import RepairAgentFSM
 from Middleware import Middleware
 from utils import compare_to_ground_truth
+from workspace import Workspace
+from prompts import build_static_prompt
+from speculative import SpeculativeFixer
+from mutation_repair import MutationRepairer
+from classifier import configure_classifier, preload_classifier, BACKENDS as CLASSIFIER_BACKENDS
+from test_runner import get_test_runner, CASE_TIMEOUT
+from outcome_cache import TestOutcomeCache
+from tracing import Tracer, write_jsonl, write_chrome_trace
+from results_log import RESULTS_PATH, append_result, load_results, completed, summarize
 
 TEST_DIR=os.path.join('Code-Refactoring-QuixBugs', 'json_testcases')
 BUGGY_DIR = os.path.join('Code-Refactoring-QuixBugs', 'python_programs')
 TEST_SCRIPT = os.path.join('Code-Refactoring-QuixBugs', 'tester.py')
-WORK_FILE = 'current_program.py'
 GEMINI_API_KEY = "API_KEY"
 MAX_CYCLES = 10
+MUTATION_CANDIDATES = 64
+MUTATION_PARALLEL = 4
+SCRATCH_DIR = 'scratch'
 
 FIXED_DIR = 'fixed_code'
-os.makedirs(FIXED_DIR, exist_ok=True)
 
-code_dir    = os.path.join('Code-Refactoring-QuixBugs', 'python_programs')
+logger = logging.getLogger(__name__)
 
-tools   = Toolset(code_dir=code_dir, test_dir='.')   
+def crash_row(error: BaseException) -> dict:
+    return {'fixed': False, 'attempts': 0, 'diff': None, 'exact_match': False, 'error': str(error)}
+
+def start_session(fname: str, ws: Workspace, llm, warm_tests: bool = True,
+                  case_timeout: float = CASE_TIMEOUT, candidates: int = 1, token_budget: int = None,
+                  tracer: Tracer = None, test_cache_path: str = None,
+                  mutation_candidates: int = MUTATION_CANDIDATES, trajectories: str = None):
+    """
+    Build the toolset, FSM and Middleware for one program loaded into ws.
+    With trajectories set, every transition is logged to that TrajectoryStore.
+    """
+    # Enough warm test workers for the candidates validated side by side
+    runner_workers = min(os.cpu_count() or 1, max(candidates, MUTATION_PARALLEL if mutation_candidates else 1))
+    tools = Toolset(code_dir=BUGGY_DIR, test_dir=TEST_DIR, work_dir=ws.path,
+                    test_runner=get_test_runner(workers=runner_workers, case_timeout=case_timeout)
+                    if warm_tests else None,
+                    test_cache=TestOutcomeCache(test_cache_path) if test_cache_path else TestOutcomeCache())
+    fsm = RepairAgentFSM(llm=llm,
+                          toolset=tools,
+                          test_script=TEST_SCRIPT,
+                          max_cycles=MAX_CYCLES)
+
+    speculative = None
+    if candidates > 1:
+        speculative = SpeculativeFixer(llm, tools, TEST_SCRIPT, n_candidates=candidates,
+                                       scratch_root=os.path.dirname(ws.path))
+    mutator = None
+    if mutation_candidates:
+        mutator = MutationRepairer(tools, TEST_SCRIPT, max_candidates=mutation_candidates,
+                                   parallel=MUTATION_PARALLEL, scratch_root=os.path.dirname(ws.path))
+    recorder = None
+    if trajectories:
+        # numpy is only needed when recording
+        from trajectories import TrajectoryRecorder
+        recorder = TrajectoryRecorder(trajectories)
+    mw = Middleware(llm=llm, fsm=fsm, toolset=tools, static_prompt=build_static_prompt(tools),
+                    speculative=speculative, token_budget=token_budget, tracer=tracer, mutator=mutator,
+                    recorder=recorder)
+    fsm.state_data["algo_name"] = fname.replace(".py", "")
+    return fsm, mw
+
+
+def finish_session(fname: str, ws: Workspace, fsm: RepairAgentFSM, final_state: str,
+                   tracer: Tracer = None, keep_spans: bool = False, recorder=None) -> dict:
+    if recorder is not None:
+        recorder.end_episode(final_state, fname, fsm.state_data.get('defect_class'))
+    diff = fsm.state_data.get('last_diff', None)
+    result = {
+        'fixed': final_state == 'GOAL_ACCOMPLISHED',
+        'attempts': fsm.state_data.get('attempts', fsm.cycle_count),
+        'cycles': fsm.cycle_count,
+        'diff': diff,
+        'exact_match': compare_to_ground_truth(fname, ws.work_file),
+        'test_cache': fsm.toolset.test_cache.stats(),
+        'tokens': {k: v for k, v in fsm.state_data.get('token_usage', {}).items() if k != 'cycles'},
+        'rejected_fixes': fsm.state_data.get('rejections', 0),
+    }
+    if fsm.state_data.get('mutation'):
+        result['mutation'] = fsm.state_data['mutation']
+    if fsm.state_data.get('failure_reason'):
+        result['failure_reason'] = fsm.state_data['failure_reason']
+    if tracer is not None:
+        result['timings'] = tracer.aggregate()
+        if keep_spans:
+            result['spans'] = tracer.spans
+
+    if result['fixed']:
+        os.makedirs(FIXED_DIR, exist_ok=True)
+        dest = os.path.join(FIXED_DIR, fname)
+        shutil.copy(ws.work_file, dest)
+        logger.info(f"Saved patched code to {dest}")
+
+    if diff and diff != "No changes made.":
+        print(f"\n📄 Patch for {fname}:\n{diff}")
+
+    logger.info(f"Result for {fname}: fixed={result['fixed']}, attempts={result['attempts']}\n")
+    return result
+
+
+def repair_program(fname: str, scratch_root: str = SCRATCH_DIR, warm_tests: bool = True,
+                   case_timeout: float = CASE_TIMEOUT, llm_mode: str = 'cache',
+                   llm_cache: str = LLM_CACHE_PATH, candidates: int = 1, token_budget: int = None,
+                   trace: bool = False, llm_factory=None, test_cache_path: str = None,
+                   mutation_candidates: int = MUTATION_CANDIDATES, trajectories: str = None) -> dict:
+    """
+    Repair a single QuixBugs program inside its own Workspace and return its result row.
+    Safe to run in a worker process: nothing outside the workspace is written
+    except the patched copy in FIXED_DIR. llm_factory (a picklable callable)
+    replaces the Gemini client, e.g. with a scripted LLM for benchmarks.
+    """
+    logger.info(f"Evaluating {fname}...")
+    with Workspace(root=scratch_root, prefix=fname.replace('.py', '') + '_') as ws:
+        ws.load(os.path.join(BUGGY_DIR, fname))
+        llm = llm_factory() if llm_factory else make_llm(GEMINI_API_KEY, mode=llm_mode, path=llm_cache)
+        tracer = Tracer(session=fname)
+        fsm, mw = start_session(fname, ws, llm, warm_tests, case_timeout, candidates, token_budget,
+                                tracer, test_cache_path, mutation_candidates, trajectories)
+        # Try LLM-free mutations first, then run the repair FSM
+        with tracer.span('session', cat='session'):
+            mw.try_mutation_fix()
+            final_state = fsm.run(mw)
+        return finish_session(fname, ws, fsm, final_state, tracer, keep_spans=trace, recorder=mw.recorder)
+
+
+async def arepair_program(fname: str, llm, executor=None, scratch_root: str = SCRATCH_DIR,
+                          warm_tests: bool = True, case_timeout: float = CASE_TIMEOUT,
+                          candidates: int = 1, token_budget: int = None, trace: bool = False,
+                          test_cache_path: str = None, mutation_candidates: int = MUTATION_CANDIDATES,
+                          trajectories: str = None) -> dict:
+    """repair_program for the event loop: llm is the shared RateLimitedLLM."""
+    logger.info(f"Evaluating {fname}...")
+    with Workspace(root=scratch_root, prefix=fname.replace('.py', '') + '_') as ws:
+        ws.load(os.path.join(BUGGY_DIR, fname))
+        tracer = Tracer(session=fname)
+        fsm, mw = start_session(fname, ws, llm, warm_tests, case_timeout, candidates, token_budget,
+                                tracer, test_cache_path, mutation_candidates, trajectories)
+        with tracer.span('session', cat='session'):
+            await asyncio.get_running_loop().run_in_executor(executor, mw.try_mutation_fix)
+            final_state = await fsm.arun(mw, executor)
+        return finish_session(fname, ws, fsm, final_state, tracer, keep_spans=trace, recorder=mw.recorder)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-logger = logging.getLogger(__name__)
 
-def evaluate_all():
+async def evaluate_all_async(files: list, concurrency: int = 8, requests_per_minute: float = 60,
+                             llm_mode: str = 'cache', llm_cache: str = LLM_CACHE_PATH, llm_factory=None,
+                             on_result=None, **options) -> dict:
+    """
+    Run every repair session concurrently on one event loop. All sessions share
+    one rate-limited LLM; tools and tests run on a thread pool. on_result(fname, row)
+    is called as each session finishes.
+    """
+    backend = llm_factory() if llm_factory else make_llm(GEMINI_API_KEY, mode=llm_mode, path=llm_cache)
+    llm = RateLimitedLLM(backend,
+                         max_concurrency=concurrency, requests_per_minute=requests_per_minute)
+    if options.get('warm_tests', True):
+        get_test_runner(workers=min(concurrency, os.cpu_count() or 1),
+                        case_timeout=options.get('case_timeout', CASE_TIMEOUT))
+    async def run(fname, executor):
+        try:
+            row = await arepair_program(fname, llm, executor, **options)
+        except Exception as e:
+            logger.error(f"{fname} crashed: {e}")
+            row = crash_row(e)
+        if on_result:
+            on_result(fname, row)
+        return row
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            rows = await asyncio.gather(*(run(fname, executor) for fname in files))
+    finally:
+        llm.close()
+    results = dict(zip(files, rows))
+    logger.info(f"LLM requests: {llm.requests}")
+    return results
+
+
+def evaluate_all(files: list = None, workers: int = 1, concurrency: int = 0,
+                 requests_per_minute: float = 60, trace: str = None, classifier_backend: str = 'fp32',
+                 classifier_threads: int = None, results_path: str = RESULTS_PATH, resume: bool = False,
+                 **options):
+    """
+    Repair each file and print the summary table. Programs run sequentially,
+    on a process pool (workers > 1) or as concurrent sessions on one event loop
+    (concurrency > 0). Remaining options are passed to repair_program.
+
+    Each result row is appended to results_path (JSONL) as soon as its program
+    finishes; with resume, programs already recorded there are skipped and
+    their recorded rows are included in the summary.
+
+    With trace set, every session's spans are written to <trace>.jsonl and
+    <trace>.trace.json (Chrome trace format).
+    """
+    files = sorted(files or ['bitcount.py'])
     results = {}
-    files = ['bitcount.py']
-    total = len(files)
-
-    for fname in sorted(files):
-        logger.info(f"Evaluating {fname}...")
-        src_path = os.path.join(BUGGY_DIR, fname)
-        shutil.copy(src_path, WORK_FILE)
-
-        # Initialize components
-        llm = GeminiLLM(api_key=GEMINI_API_KEY)
-        tools = Toolset(code_dir=BUGGY_DIR, test_dir=TEST_DIR)
-        fsm = RepairAgentFSM(llm=llm,
-                              toolset=tools,
-                              test_script=TEST_SCRIPT,
-                              max_cycles=MAX_CYCLES)
-        
-        static_prompt = {
-            'role': "You are an expert Python bug fixer agent.",
-            'goals': "Locate and fix a single-line defect in the file `current_program.py` using the available tools.",
-            'guidelines': (
-                "At each step, pick exactly one tool and return a JSON object with:\n"
-                "  • `thoughts`: why you chose this tool and what you expect.\n"
-                "  • `command`: { `name`: TOOL_NAME, `args`: { ... } }\n\n"
-
-                "TOOLS AND USAGE:\n"
-                "1) read_range(file_path: str, start_line: int, end_line: int) → str\n"
-                "   • Returns the lines from `start_line` to `end_line` in the file.\n"
-                "   • Use this to inspect specific code snippets.\n"
-                "   • Example args: {\"file_path\": \"current_program.py\", \"start_line\": 5, \"end_line\": 15}\n\n"
-
-                "2) get_classes_and_methods(file_path: str) → dict\n"
-                "   • Returns all class and function names in the file.\n"
-                "   • Useful to discover available methods or entry points.\n"
-                "   • Example args: {\"file_path\": \"current_program.py\"}\n\n"
-
-                "3) extract_method(file_path: str, method_name: str) → str\n"
-                "   • Returns the full source of `method_name`.\n"
-                "   • Use when you want the body of a particular function.\n"
-                "   • Example args: {\"file_path\": \"current_program.py\", \"method_name\": \"binary_search\"}\n\n"
-
-                "4) extract_tests(test_output: str) → list\n"
-                "   • Parses test harness output and returns failing test names.\n"
-                "   • Use after `run_tests` to know which cases failed.\n"
-                "   • Example args: {\"test_output\": \"(raw output)\"}\n\n"
-
-                "5) search_code_base(keyword: str, code_dir: str) → list\n"
-                "   • Finds lines containing `keyword` across all .py files in `code_dir`.\n"
-                "   • Use to find related usage or similar logic.\n"
-                "   • Example args: {\"keyword\": \"range(\", \"code_dir\": \"python_programs\"}\n\n"
-
-                "6) find_similar_api_calls(method_name: str) → list\n"
-                "   • Shortcut for `search_code_base(method_name, code_dir)`.\n\n"
-
-                "7) generate_method_body(prompt: str, llm: object) → str\n"
-                "   • Ask the LLM to draft a new method or full source based on your prompt.\n"
-                "   • Use to propose the fixed code before writing it.\n"
-                "   • Example args: {\"prompt\": \"Fix the off-by-one in this loop...\", \"llm\": LLM_OBJECT}\n\n"
-
-                "8) run_tests(test_script: str, file_path: str) → str\n"
-                "   • Runs `tester.py current_program.py` and returns combined stdout/stderr.\n"
-                "   • Use only `tester.py` and `current_program.py` for test_script and file_path respectively. These are injected automatically.\n"
-
-                "9) run_fault_localization(test_output: str) → list\n"
-                "   • Identical to `extract_tests`, returns failing test names.\n\n"
-
-                "10) write_fix(file_path: str, new_source: str) → str\n"
-                "   • Overwrites `file_path` with `new_source` and returns a unified diff.\n"
-                "   • Use this when you have the complete fixed file.\n"
-                "   • Example args: {\"file_path\": \"current_program.py\", \"new_source\": \"<full file>\"}\n\n"
-
-                "11) express_hypothesis(hypothesis: str, state: dict) → str\n"
-                "   • Record your current bug hypothesis into the agent’s state.\n\n"
-
-                "12) discard_hypothesis(state: dict) → str\n"
-                "   • Clear the last hypothesis when it’s invalidated.\n\n"
-
-                "13) collect_more_information(state: dict) → str\n"
-                "   • Signal to return to gathering info (e.g., after a failed fix).\n\n"
-
-                "**Important:** After doing *any* analysis (run_tests, extract_method, etc), "
-                "you must *then* call `write_fix` exactly once, with the full corrected source. "
-                "Do *not* call run_tests again until after applying a patch."
-
-                "Always include **only** the JSON in your response—no additional text."
-            ),
-            'tools': [t for t in dir(tools) if not t.startswith('_')]
-        }
-
-        mw = Middleware(llm=llm, fsm=fsm, toolset=tools, static_prompt=static_prompt)
-
-        # Run the repair FSM
-        fsm.state_data["algo_name"] = fname.replace(".py", "")
-        final_state = fsm.run(mw)
-
-        diff = fsm.state_data.get('last_diff', None)
-        results[fname] = {
-            'fixed': final_state == 'GOAL_ACCOMPLISHED',
-            'attempts': fsm.state_data.get('attempts', fsm.cycle_count),
-            'diff': diff,
-            'exact_match': compare_to_ground_truth(fname, WORK_FILE),
-        }
-    
-        if results[fname]['fixed']:
-            dest = os.path.join(FIXED_DIR, fname)
-            shutil.copy(WORK_FILE, dest)
-            logger.info(f"Saved patched code to {dest}")
-
-        if diff and diff != "No changes made.":
-            print(f"\n📄 Patch for {fname}:\n{diff}")
-
-        attempts = fsm.state_data.get('attempts', fsm.cycle_count)
-        success = (final_state == 'GOAL_ACCOMPLISHED')
-        logger.info(f"Result for {fname}: fixed={success}, attempts={attempts}\n")
-        
-  
-
-    # Summarize
-    fixed_count = sum(1 for r in results.values() if r['fixed'])
-    logger.info("=== Evaluation Summary ===")
-    logger.info(f"Total programs: {total}")
-    logger.info(f"Fixed: {fixed_count}/{total} ({fixed_count/total:.1%})")
-
-    print("\nProgram\tFixed\tAttempts\tExactMatch")
-    for fname, info in results.items():
-        print(f"{fname}\t{info['fixed']}\t{info['attempts']}\t{info.get('matched_ground_truth', False)}")
+    if resume:
+        recorded = load_results(results_path)
+        done = completed(recorded) & set(files)
+        results = {fname: recorded[fname] for fname in files if fname in done}
+        if done:
+            logger.info(f"Resuming: {len(done)}/{len(files)} programs already recorded in {results_path}")
+        files = [fname for fname in files if fname not in done]
+    # Workers that don't fork re-create it from these options (pool initializer below)
+    classifier_options = None
+    if classifier_backend != 'fp32' or classifier_threads:
+        classifier_options = (classifier_backend, classifier_threads)
+        configure_classifier(*classifier_options)
+    if trace:
+        options['trace'] = True
+    spans = []
+
+    def record(fname: str, row: dict):
+        spans.extend(row.pop('spans', []))
+        results[fname] = row
+        append_result(results_path, fname, row)
+
+    if concurrency > 0 and files:
+        asyncio.run(evaluate_all_async(files, concurrency, requests_per_minute, on_result=record, **options))
+    elif workers > 1 and files:
+        # Load CodeBERT once here so forked workers share its weights copy-on-write,
+        # unless a stub is registered. The snippets classified depend on each
+        # session's fault localization, so the parent can't tell whether they are cached
+        preload_classifier()
+        ctx = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=configure_classifier if classifier_options else None,
+                                 initargs=classifier_options or ()) as pool:
+            futures = {pool.submit(repair_program, fname, **options): fname for fname in files}
+            for fut in as_completed(futures):
+                fname = futures[fut]
+                try:
+                    row = fut.result()
+                except Exception as e:
+                    logger.error(f"{fname} crashed in worker: {e}")
+                    row = crash_row(e)
+                record(fname, row)
+    else:
+        for fname in files:
+            try:
+                row = repair_program(fname, **options)
+            except Exception as e:
+                logger.error(f"{fname} crashed: {e}")
+                row = crash_row(e)
+            record(fname, row)
+
+    if trace:
+        write_jsonl(spans, f"{trace}.jsonl")
+        write_chrome_trace(spans, f"{trace}.trace.json")
+        logger.info(f"Wrote {len(spans)} spans to {trace}.jsonl and {trace}.trace.json")
+
+    if results:
+        summarize(results)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Evaluate the repair agent on QuixBugs.")
+    parser.add_argument('programs', nargs='*', help="Program files to repair (default: bitcount.py)")
+    parser.add_argument('--all', action='store_true', help=f"Repair every program in {BUGGY_DIR}")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes, each with its own scratch workspace")
+    parser.add_argument('--concurrency', type=int, default=0,
+                        help="Run up to N repair sessions concurrently on one asyncio event loop")
+    parser.add_argument('--rpm', type=float, default=60,
+                        help="LLM requests per minute allowed across all concurrent sessions")
+    parser.add_argument('--candidates', type=int, default=1,
+                        help="Candidate fixes requested per GENERATE_FIX cycle, validated in parallel")
+    parser.add_argument('--mutations', type=int, default=MUTATION_CANDIDATES,
+                        help="AST mutations validated before the first LLM call (0 disables the fast path)")
+    parser.add_argument('--subprocess-tests', action='store_true',
+                        help="Run tests in a fresh interpreter per call (`python test_runner.py`) instead of warm workers")
+    parser.add_argument('--case-timeout', type=float, default=CASE_TIMEOUT,
+                        help="Time budget in seconds per test case without a measured baseline (warm runner only)")
+    parser.add_argument('--llm-mode', choices=LLM_MODES, default='cache',
+                        help="LLM response cache: off, cache (read-through), record, or replay (offline)")
+    parser.add_argument('--llm-cache', default=LLM_CACHE_PATH, help="Path of the LLM response store")
+    parser.add_argument('--token-budget', type=int, default=None,
+                        help="Fail a session once its prompt + completion tokens reach this many")
+    parser.add_argument('--classifier-backend', choices=CLASSIFIER_BACKENDS, default='fp32',
+                        help="Defect classifier inference path: fp32, int8 (dynamic quantization) or onnx")
+    parser.add_argument('--classifier-threads', type=int, default=None,
+                        help="Intra-op threads for classifier inference")
+    parser.add_argument('--trace', metavar='PREFIX',
+                        help="Write timing spans to PREFIX.jsonl and PREFIX.trace.json (chrome://tracing)")
+    parser.add_argument('--results', default=RESULTS_PATH,
+                        help="JSONL file each program's result is appended to as it finishes")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip programs already recorded in the results file")
+    parser.add_argument('--record-trajectories', metavar='DIR',
+                        help="Log every transition to a trajectory store for offline RL (train_offline.py)")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="DEBUG also logs raw LLM output and parsed tool calls")
+    return parser.parse_args()
+
 
 if __name__ == '__main__':
-    evaluate_all()
+    args = parse_args()
+    logging.basicConfig(
+        level=args.log_level,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    files = args.programs
+    if args.all:
+        files = [f for f in os.listdir(BUGGY_DIR) if f.endswith('.py')]
+    evaluate_all(files, workers=args.workers, concurrency=args.concurrency,
+                 requests_per_minute=args.rpm, warm_tests=not args.subprocess_tests,
+                 case_timeout=args.case_timeout, llm_mode=args.llm_mode, llm_cache=args.llm_cache,
+                 candidates=args.candidates, token_budget=args.token_budget, mutation_candidates=args.mutations, trace=args.trace,
+                 classifier_backend=args.classifier_backend, classifier_threads=args.classifier_threads,
+                 results_path=args.results, resume=args.resume, trajectories=args.record_trajectories)
@@ -0,0 +1,116 @@
+import io
+import sys
+import json
+import math
+import argparse
+import contextlib
+from test_runner import (CASE_TIMEOUT, MAX_TIMEOUTS, CaseTimeout, time_limit, load_testcases, load_candidate,
+                         _normalize)
+
+TOP_LINES = 5
+# Budget for cases expected to time out: only their coverage is needed
+TIMED_OUT_BUDGET = 0.05
+
+def collect_coverage(work_file: str, testcase_path: str, algo_name: str,
+                     case_timeout: float = CASE_TIMEOUT, timed_out: list = None) -> dict:
+    """
+    Run every JSON test case once with a line tracer on work_file. Returns
+    {'cases': [{'name', 'passed', 'timed_out', 'lines'}]} with the work_file
+    lines each case executed, or {'error': ...} if the cases or the candidate failed to load.
+    Cases are judged as in test_runner.run_cases, with the same per-case budget;
+    cases named in timed_out (by an earlier run) count as failing and are cut
+    off after TIMED_OUT_BUDGET, as is every case after MAX_TIMEOUTS timeouts.
+    """
+    try:
+        cases = load_testcases(testcase_path)
+    except Exception as e:
+        return {'error': f"Error loading test cases: {e}"}
+    sink = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(sink), time_limit(case_timeout):
+            func = load_candidate(work_file, algo_name)
+    except (CaseTimeout, Exception) as e:
+        return {'error': f"Error importing {algo_name}: {type(e).__name__}: {e}"}
+
+    filename = func.__code__.co_filename
+    covered = set()
+
+    def trace_lines(frame, event, arg):
+        if event == 'line':
+            covered.add(frame.f_lineno)
+        return trace_lines
+
+    def trace_calls(frame, event, arg):
+        # Only frames of the candidate module get a local tracer
+        return trace_lines if frame.f_code.co_filename == filename else None
+
+    timed_out = set(timed_out or [])
+    timeouts = 0
+    results = []
+    for i, (test_in, expected) in enumerate(cases):
+        name = f"test_{algo_name}_{i}"
+        covered.clear()
+        passed = timed_out_now = False
+        expect_timeout = name in timed_out or timeouts >= MAX_TIMEOUTS
+        budget = min(case_timeout, TIMED_OUT_BUDGET) if expect_timeout else case_timeout
+        try:
+            with contextlib.redirect_stdout(sink), time_limit(budget):
+                sys.settrace(trace_calls)
+                try:
+                    got = func(*test_in)
+                    got = _normalize(got)
+                finally:
+                    sys.settrace(None)
+            passed = got == expected and name not in timed_out
+        except CaseTimeout:
+            timed_out_now = True
+            timeouts += 1
+        except Exception:
+            pass
+        finally:
+            sink.seek(0)
+            sink.truncate()
+        results.append({'name': name, 'passed': passed, 'timed_out': timed_out_now, 'lines': sorted(covered)})
+    return {'cases': results}
+
+def ochiai(failed: int, passed: int, total_failed: int) -> float:
+    """Ochiai suspiciousness of a line run by `failed` failing and `passed` passing cases."""
+    if not failed:
+        return 0.0
+    return failed / math.sqrt(total_failed * (failed + passed))
+
+def rank_lines(cases: list, formula=ochiai) -> list:
+    """
+    (line, score) for every line run by a failing case, most suspicious first;
+    ties keep file order. Empty when no case failed.
+    """
+    total_failed = sum(not c['passed'] for c in cases)
+    if not total_failed:
+        return []
+    failed, passed = {}, {}
+    for case in cases:
+        counts = passed if case['passed'] else failed
+        for line in case['lines']:
+            counts[line] = counts.get(line, 0) + 1
+    scores = [(line, formula(failed[line], passed.get(line, 0), total_failed)) for line in failed]
+    return sorted(scores, key=lambda s: (-s[1], s[0]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank the lines of a candidate file by Ochiai suspiciousness.")
+    parser.add_argument("work_file")
+    parser.add_argument("testcase_path")
+    parser.add_argument("algo_name")
+    parser.add_argument("--case-timeout", type=float, default=CASE_TIMEOUT)
+    parser.add_argument("--timed-out", nargs="*", default=[], metavar="TEST",
+                        help="Tests known to time out; traced only briefly")
+    parser.add_argument("--coverage", action="store_true", help="Print the raw per-case coverage as JSON")
+    args = parser.parse_args()
+
+    coverage = collect_coverage(args.work_file, args.testcase_path, args.algo_name, args.case_timeout,
+                                args.timed_out)
+    if args.coverage or 'error' in coverage:
+        print(json.dumps(coverage))
+    else:
+        for line, score in rank_lines(coverage['cases'])[:TOP_LINES]:
+            print(f"{line}\t{score:.3f}")
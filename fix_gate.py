@@ -0,0 +1,76 @@
+import re
+import ast
+import difflib
+from edits import is_edit_script, apply_edits
+
+REJECTED = "Rejected candidate fix:"
+# A QuixBugs repair touches a line or two; allow generous slack for reformatting
+MAX_CHANGED_LINES = 10
+MAX_CHANGED_FRACTION = 0.5
+
+FENCE_RE = re.compile(r"```(?:python)?\s*\n(.*?)```", re.DOTALL)
+
+def extract_code(text: str) -> str:
+    """Source inside the first markdown code fence, or the text itself."""
+    match = FENCE_RE.search(text or "")
+    return match.group(1) if match else (text or "")
+
+def signature(tree: ast.AST, name: str):
+    """Parameter names and kinds of the first function called `name` (defaults may change), or None."""
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == name:
+            a = node.args
+            return (tuple(p.arg for p in a.posonlyargs), tuple(p.arg for p in a.args),
+                    a.vararg.arg if a.vararg else None, tuple(p.arg for p in a.kwonlyargs),
+                    a.kwarg.arg if a.kwarg else None)
+    return None
+
+def changed_lines(before: str, after: str) -> int:
+    matcher = difflib.SequenceMatcher(None, before.splitlines(), after.splitlines(), autojunk=False)
+    return sum(max(i2 - i1, j2 - j1) for op, i1, i2, j1, j2 in matcher.get_opcodes() if op != 'equal')
+
+def check_fix(candidate: str, original: str, current: str = None, entry_point: str = None) -> tuple:
+    """
+    Cheap checks a candidate fix must pass before it is written and tested.
+    The candidate is a full source or a line-edit script (edits.py) against
+    current. Returns (source, reason): the resulting full source with any
+    markdown fence removed, and None if it may go on to the tests, otherwise
+    why it was rejected.
+    """
+    source = extract_code(candidate)
+    if is_edit_script(source):
+        if current is None:
+            return source, "line edits need the current program"
+        try:
+            source = apply_edits(current, source)
+        except ValueError as e:
+            return source, f"invalid line edits: {e}"
+    if not source.strip():
+        return source, "the response contained no code"
+    if "```" in source:
+        return source, "unterminated code fence; the output was probably cut off at max_output_tokens"
+    try:
+        tree = ast.parse(source)
+        compile(tree, "current_program.py", "exec")
+    except SyntaxError as e:
+        return source, f"SyntaxError at line {e.lineno}: {e.msg}"
+    except ValueError as e:
+        return source, f"does not compile: {e}"
+    if current is not None and source == current:
+        return source, "identical to the current program"
+    if original is not None:
+        if entry_point:
+            try:
+                expected = signature(ast.parse(original), entry_point)
+            except SyntaxError:
+                expected = None
+            got = signature(tree, entry_point)
+            if expected is not None and got is None:
+                return source, f"entry point `{entry_point}` is missing"
+            if expected is not None and got != expected:
+                return source, f"signature of `{entry_point}` changed"
+        limit = max(MAX_CHANGED_LINES, int(MAX_CHANGED_FRACTION * len(original.splitlines())))
+        changed = changed_lines(original, source)
+        if changed > limit:
+            return source, f"{changed} lines changed (limit {limit}); make a minimal edit"
+    return source, None
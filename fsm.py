@@ -1,3 +1,6 @@
+from tools import tests_passed
+from fix_gate import REJECTED, check_fix
+
 class RepairAgentFSM:
     def __init__(self, llm, toolset, test_script, max_cycles=10):
         self.llm = llm
@@ -12,8 +15,30 @@ class RepairAgentFSM:
             'fix': None,
             'attempts': 0,
             'max_attempts': 3,
+            'work_file': toolset.work_file,
+            'original_source': self._read_work_file(toolset.work_file),
+            'rejections': 0,
+            # Every fix source written or rejected, so none is forced twice (Middleware._pending_fix)
+            'tried_fixes': [],
         }
 
+    @staticmethod
+    def _read_work_file(path):
+        try:
+            with open(path) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def prevalidate(self, candidate: str) -> tuple:
+        """
+        Static checks on a candidate fix before it is written (see fix_gate.check_fix).
+        Returns (source, reason); reason is None if the candidate may be written.
+        """
+        current = self._read_work_file(self.state_data['work_file'])
+        original = self.state_data.get('original_source') or current
+        return check_fix(candidate, original, current, self.state_data.get('algo_name'))
+
     def current_state(self):
         return self.state
 
@@ -36,17 +61,34 @@ class RepairAgentFSM:
             self.state = 'GENERATE_FIX'
 
         elif self.state == 'GENERATE_FIX':
-            new_source = last_result
-            self.state_data['fix'] = new_source
-            diff = self.toolset.write_fix('current_program.py', new_source)
-            self.state_data['last_diff'] = diff
-            self.state = 'VALIDATE_FIX'
+            if last_command in ('write_fix', 'apply_edits', 'generate_method_body') and last_result.startswith(REJECTED):
+                # Middleware refused to write it: nothing to test, ask the LLM again
+                self.state_data['rejections'] += 1
+                self.state_data['last_rejection'] = last_result
+                self.state_data.pop('verified_fix', None)
+            elif last_command in ('write_fix', 'apply_edits'):
+                # Middleware already applied the patch and recorded its diff in last_diff
+                self.state_data.setdefault('last_diff', last_result)
+                self.state = 'VALIDATE_FIX'
+            elif last_command == 'generate_method_body':
+                new_source = last_result
+                self.state_data['fix'] = new_source
+                self.state_data['tried_fixes'].append(new_source)
+                diff = self.toolset.write_fix(self.state_data['work_file'], new_source)
+                self.state_data['last_diff'] = diff
+                verified = self.state_data.pop('verified_fix', None)
+                if verified is not None and verified == new_source and diff != 'No changes made.':
+                    # Already passed its tests in a speculative workspace: no validation cycle needed
+                    self.state = 'GOAL_ACCOMPLISHED'
+                    self.toolset.goal_accomplished(self.state_data)
+                else:
+                    self.state = 'VALIDATE_FIX'
+            # Analysis tools (extract_method, read_range, ...) don't produce a fix: keep generating
 
-        elif self.state == 'VALIDATE_FIX':
-            failing_after = self.toolset.extract_tests(last_result)
+        elif self.state == 'VALIDATE_FIX' and last_command == 'run_tests':
             initial = self.state_data.get('initial_failures', 0)
             diff = self.state_data.get('last_diff', '')
-            if initial > 0 and not failing_after and diff and diff != 'No changes made.':
+            if initial > 0 and tests_passed(last_result) and diff and diff != 'No changes made.':
                 self.state = 'GOAL_ACCOMPLISHED'
                 self.toolset.goal_accomplished(self.state_data)
             else:
@@ -63,3 +105,10 @@ class RepairAgentFSM:
             middleware.run_cycle()
 
         return self.state
+
+    async def arun(self, middleware, executor=None):
+        while not self.is_done() and self.cycle_count < self.max_cycles:
+            self.cycle_count += 1
+            await middleware.arun_cycle(executor)
+
+        return self.state
@@ -0,0 +1,87 @@
+import re
+import json
+from collections import deque, namedtuple
+from tools import failed_tests
+
+# Entries kept, entries rendered into the prompt, and the rough size of one rendered entry
+MAX_ENTRIES  = 20
+SHOWN        = 5
+ENTRY_TOKENS = 100
+ARG_CHARS    = 60
+
+SUMMARY_RE = re.compile(r"(\d+)\s*/\s*(\d+) tests passed")
+
+# (command, result) first, so entry[0] / entry[1] read like the old history tuples
+HistoryEntry = namedtuple('HistoryEntry', 'command result tool')
+
+def truncate(text: str, limit: int) -> str:
+    text = text if isinstance(text, str) else str(text)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}… (+{len(text) - limit} chars)"
+
+def compact_args(args: dict) -> str:
+    """Tool args with long values (sources, test logs, edit lists) cut down to ARG_CHARS."""
+    parts = []
+    for key, value in (args or {}).items():
+        text = value if isinstance(value, str) else json.dumps(value, default=str)
+        lines = text.splitlines()
+        parts.append(f"{key}=<{len(lines)} lines>" if len(lines) > 1 else f"{key}={truncate(text, ARG_CHARS)}")
+    return ", ".join(parts)
+
+def summarize_tests(output: str) -> str:
+    """'3/10 tests passed; failing: ...' plus the first failure line, from a run_tests output."""
+    match = SUMMARY_RE.search(output)
+    failing = sorted(failed_tests(output))
+    head = f"{match.group(1)}/{match.group(2)} tests passed" if match else f"{len(failing)} failing tests"
+    if failing:
+        head += f"; failing: {', '.join(failing[:5])}" + (f" (+{len(failing) - 5} more)" if len(failing) > 5 else "")
+        first = next((line.strip() for line in output.splitlines() if "FAILED" in line or "Error" in line), "")
+        if first:
+            head += f"\n  first failure: {first}"
+    return head
+
+def summarize_diff(diff: str) -> str:
+    """Only the changed lines of a unified diff."""
+    changed = [line for line in diff.splitlines()
+               if line[:1] in '+-' and not line.startswith(('+++', '---'))]
+    return "changed:\n" + "\n".join(f"  {line}" for line in changed) if changed else diff
+
+def summarize_result(tool: str, result) -> str:
+    text = result if isinstance(result, str) else json.dumps(result, default=str)
+    if tool == 'run_tests' and (SUMMARY_RE.search(text) or "PASSED" in text or "FAILED" in text):
+        return summarize_tests(text)
+    if tool in ('write_fix', 'apply_edits') and text.startswith('---'):
+        return summarize_diff(text)
+    return text
+
+class CommandHistory:
+    """
+    Bounded, summarized record of the session's tool calls. Only a compact
+    rendering of each call is kept: long args are elided, test logs and diffs
+    are summarized, and every result is cut to about entry_tokens tokens.
+    Indexing and slicing give (command, result, tool) entries, oldest first.
+    """
+    def __init__(self, max_entries: int = MAX_ENTRIES, shown: int = SHOWN, entry_tokens: int = ENTRY_TOKENS):
+        self.entries = deque(maxlen=max_entries)
+        self.shown = shown
+        self.entry_chars = 4 * entry_tokens
+
+    def append(self, tool: str, args: dict, result) -> HistoryEntry:
+        entry = HistoryEntry(f"{tool}({compact_args(args)})",
+                             truncate(summarize_result(tool, result), self.entry_chars), tool)
+        self.entries.append(entry)
+        return entry
+
+    def render(self) -> list:
+        """Prompt lines for the most recent `shown` entries."""
+        return [f"- {e.command}: {e.result}" for e in list(self.entries)[-self.shown:]]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, index):
+        return list(self.entries)[index]
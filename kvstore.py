@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+def content_hash(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode('utf-8', errors='surrogatepass'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+class KeyValueStore:
+    """
+    Small persistent key -> JSON value store on top of sqlite3.
+
+    Safe to share between threads and between worker processes (each process
+    opens its own connection). With max_entries set, the least recently used
+    entries are evicted once the store grows past the bound.
+    """
+    def __init__(self, path: str, table: str = 'entries', max_entries: int = None):
+        self.path        = path
+        self.table       = table
+        self.max_entries = max_entries
+        self.hits   = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid  = None
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so reopen in each process
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: list) -> dict:
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({marks})", chunk
+                ).fetchall()
+                found.update((k, json.loads(v)) for k, v in rows)
+            if found and self.max_entries:
+                now = time.time()
+                conn.executemany(f"UPDATE {self.table} SET accessed = ? WHERE key = ?",
+                                 [(now, k) for k in found])
+                conn.commit()
+            self.hits   += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put(self, key: str, value):
+        self.put_many({key: value})
+
+    def put_many(self, items: dict):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, accessed) VALUES (?, ?, ?)",
+                [(k, json.dumps(v), now) for k, v in items.items()]
+            )
+            if self.max_entries:
+                conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} "
+                    "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+                )
+            conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
@@ -0,0 +1,112 @@
+import os
+import json
+import asyncio
+import logging
+from kvstore import KeyValueStore, content_hash
+
+CACHE_PATH = os.path.join(".cache", "llm_responses.sqlite")
+MODES = ('off', 'cache', 'record', 'replay')
+
+logger = logging.getLogger(__name__)
+
+class ReplayMiss(LookupError):
+    """A prompt with no recorded response was requested in replay mode."""
+
+class CachingLLM:
+    """
+    Wraps an LLM with a persistent response cache keyed by
+    (model, generation config, prompt hash).
+
+    Modes:
+      cache  - serve hits, call the backend on misses and store the result
+      record - always call the backend and (over)write the recorded response
+      replay - serve recorded responses only; never touches the network
+
+    Recordings live in their own table, which is never evicted; the cache
+    table is bounded by max_entries. Lookups try the recordings first.
+    """
+    def __init__(self, llm=None, path: str = CACHE_PATH, mode: str = 'cache',
+                 max_entries: int = 10000, model_name: str = None):
+        if mode not in ('cache', 'record', 'replay'):
+            raise ValueError(f"unknown LLM cache mode {mode!r}")
+        if llm is None and mode != 'replay':
+            raise ValueError(f"mode {mode!r} needs a backend LLM")
+        self.llm        = llm
+        self.mode       = mode
+        self.model_name = model_name or getattr(llm, 'model_name', type(llm).__name__)
+        # Recordings are transcripts replay depends on: kept apart from the evicting cache
+        self.recordings = KeyValueStore(path, table='recordings')
+        self.store = KeyValueStore(path, table='responses', max_entries=max_entries)
+        self.hits = self.misses = 0
+
+    def _key(self, prompt: str, config: dict, prefix: str = None) -> str:
+        # Keyed on the full text the model sees, so prefix/prompt splits share entries
+        text = f"{prefix}\n\n{prompt}" if prefix else prompt
+        return content_hash(self.model_name, json.dumps(config, sort_keys=True), content_hash(text))
+
+    def _lookup(self, prompt: str, config: dict, prefix: str = None):
+        key = self._key(prompt, config, prefix)
+        if self.mode != 'record':
+            cached = self.recordings.get(key)
+            if cached is None:
+                # Older recordings were written to the cache table
+                cached = self.store.get(key)
+            if cached is not None:
+                self.hits += 1
+                return key, cached
+            self.misses += 1
+            if self.mode == 'replay':
+                raise ReplayMiss(f"no recorded response for prompt {content_hash(prompt)[:12]} "
+                                 f"({self.model_name}, {config})")
+        return key, None
+
+    def generate(self, prompt: str, temperature: float = 0.2, max_output_tokens: int = 512,
+                 prefix: str = None, usage: dict = None) -> str:
+        config = {"temperature": temperature, "max_output_tokens": max_output_tokens}
+        key, cached = self._lookup(prompt, config, prefix)
+        if cached is not None:
+            if usage is not None:
+                usage['cache_hit'] = True
+            return cached
+        response = self.llm.generate(prompt, prefix=prefix, usage=usage, **config)
+        self._put(key, response)
+        return response
+
+    async def agenerate(self, prompt: str, temperature: float = 0.2, max_output_tokens: int = 512,
+                        prefix: str = None, usage: dict = None) -> str:
+        config = {"temperature": temperature, "max_output_tokens": max_output_tokens}
+        # sqlite reads and writes block: keep them off the event loop
+        loop = asyncio.get_running_loop()
+        key, cached = await loop.run_in_executor(None, self._lookup, prompt, config, prefix)
+        if cached is not None:
+            if usage is not None:
+                usage['cache_hit'] = True
+            return cached
+        if hasattr(self.llm, 'agenerate'):
+            response = await self.llm.agenerate(prompt, prefix=prefix, usage=usage, **config)
+        else:
+            response = await loop.run_in_executor(
+                None, lambda: self.llm.generate(prompt, prefix=prefix, usage=usage, **config))
+        await loop.run_in_executor(None, self._put, key, response)
+        return response
+
+    def _put(self, key: str, response: str):
+        (self.recordings if self.mode == 'record' else self.store).put(key, response)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'recordings': len(self.recordings)}
+
+
+def make_llm(api_key: str, mode: str = 'cache', path: str = CACHE_PATH,
+             model: str = 'gemini-2.0-flash', max_entries: int = 10000):
+    """Build the repair LLM for the given cache mode ('off' returns the bare GeminiLLM)."""
+    if mode == 'replay':
+        return CachingLLM(None, path=path, mode='replay', model_name=model)
+    from llm_interface import GeminiLLM
+    llm = GeminiLLM(api_key=api_key, model=model)
+    if mode == 'off':
+        return llm
+    return CachingLLM(llm, path=path, mode=mode, max_entries=max_entries)
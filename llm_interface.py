@@ -1,22 +1,135 @@
-import google.generativeai as genai
-from google.genai import types
-class GeminiLLM:
-    def __init__(self, api_key: str, model: str = 'gemini-2.0-flash'):
+import atexit
+import hashlib
+import asyncio
+import logging
+import datetime
+import threading
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_CACHE_TTL = datetime.timedelta(hours=1)
+# The API refuses CachedContents below a minimum size; smaller prefixes go straight to system_instruction
+MIN_CACHED_TOKENS = 4096
+
+# (model, prefix hash) -> server-side CachedContent (None if the API refused it), shared by
+# every GeminiLLM in the process so sessions don't each create their own; deleted at exit
+_context_caches = {}
+_context_caches_lock = threading.Lock()
+_delete_at_exit = False
 
+def _cached_content(model_name: str, prefix: str):
+    global _delete_at_exit
+    # ~4 characters per token: don't spend a round trip on a prefix the API will refuse
+    if len(prefix) // 4 < MIN_CACHED_TOKENS:
+        return None
+    key = (model_name, hashlib.sha256(prefix.encode('utf-8')).hexdigest())
+    with _context_caches_lock:
+        if key not in _context_caches:
+            try:
+                from google.generativeai import caching
+                _context_caches[key] = caching.CachedContent.create(
+                    model=model_name, system_instruction=prefix, ttl=CONTEXT_CACHE_TTL)
+                if not _delete_at_exit:
+                    atexit.register(delete_context_caches)
+                    _delete_at_exit = True
+            except Exception as e:
+                logger.info(f"context cache unavailable for {model_name}, "
+                            f"sending prefix as system instruction: {e}")
+                _context_caches[key] = None
+        return _context_caches[key]
+
+def delete_context_caches():
+    """Delete the CachedContents this process created instead of leaving them to expire."""
+    with _context_caches_lock:
+        cached = list(_context_caches.values())
+        _context_caches.clear()
+    for content in cached:
+        if content is None:
+            continue
+        try:
+            content.delete()
+        except Exception as e:
+            logger.debug(f"could not delete context cache: {e}")
+
+class GeminiLLM:
+    def __init__(self, api_key: str, model: str = 'gemini-2.0-flash', context_cache: bool = True):
+        # Imported here so code paths that never talk to Gemini don't pay for the SDK
+        import google.generativeai as genai
+        self._genai = genai
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model,
-        generation_config={
-        "temperature": 0.2,
-        "max_output_tokens": 512
-    })
+        self.model_name = model
+        self.generation_config = {
+            "temperature": 0.2,
+            "max_output_tokens": 512
+        }
+        self.model = genai.GenerativeModel(model, generation_config=self.generation_config)
+        self.context_cache = context_cache
+        # prefix hash -> model carrying that prefix (server-side cached content or system instruction)
+        self._prefixed = {}
+        self._prefixed_lock = threading.Lock()
 
-    def generate(self, prompt: str, temperature: float = 0.2, max_output_tokens: int = 512) -> str:
+    def _model_for(self, prefix: str = None):
+        """
+        Model that already carries the static prompt prefix. The prefix is put
+        into a server-side CachedContent when the API accepts it (prefixes
+        below MIN_CACHED_TOKENS are not tried), otherwise it is sent as the
+        system instruction. CachedContents are shared per process
+        (see _cached_content).
+        """
+        if not prefix:
+            return self.model
+        key = hashlib.sha256(prefix.encode('utf-8')).hexdigest()
+        with self._prefixed_lock:
+            model = self._prefixed.get(key)
+            if model is not None:
+                return model
+            cached = _cached_content(self.model_name, prefix) if self.context_cache else None
+            if cached is not None:
+                model = self._genai.GenerativeModel.from_cached_content(
+                    cached_content=cached, generation_config=self.generation_config)
+            if model is None:
+                model = self._genai.GenerativeModel(self.model_name, generation_config=self.generation_config,
+                                                    system_instruction=prefix)
+            self._prefixed[key] = model
+            return model
 
-        response = self.model.generate_content(
+    def generate(self, prompt: str, temperature: float = 0.2, max_output_tokens: int = 512,
+                 prefix: str = None, usage: dict = None) -> str:
+
+        response = self._model_for(prefix).generate_content(
+            contents=prompt,
+            generation_config={
+                "temperature": temperature,
+                "max_output_tokens": max_output_tokens,
+            }
+        )
+        self._usage(response, usage)
+        return self._text(response)
+
+    async def agenerate(self, prompt: str, temperature: float = 0.2, max_output_tokens: int = 512,
+                        prefix: str = None, usage: dict = None) -> str:
+        model = self.model if not prefix else await asyncio.to_thread(self._model_for, prefix)
+        response = await model.generate_content_async(
             contents=prompt,
-            generation_config=self.model._generation_config  
+            generation_config={
+                "temperature": temperature,
+                "max_output_tokens": max_output_tokens,
+            }
         )
+        self._usage(response, usage)
+        return self._text(response)
+
+    def _usage(self, response, usage: dict):
+        """Copy the token counts the API reported into the caller's usage dict."""
+        meta = getattr(response, 'usage_metadata', None)
+        if usage is None or meta is None:
+            return
+        usage['prompt_tokens']     = getattr(meta, 'prompt_token_count', 0) or 0
+        usage['completion_tokens'] = getattr(meta, 'candidates_token_count', 0) or 0
+        usage['cached_tokens']     = getattr(meta, 'cached_content_token_count', 0) or 0
+
+    def _text(self, response) -> str:
         if hasattr(response, 'text'):
             return response.text
-       
+
         return str(response)
@@ -0,0 +1,372 @@
+import os
+import ast
+import csv
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from defect_classes import DefectClass
+from speculative import validate_candidate
+
+logger = logging.getLogger(__name__)
+
+# Replacement operators, most plausible first
+CMP_TEXT = {ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.Eq: '==', ast.NotEq: '!=',
+            ast.Is: 'is', ast.IsNot: 'is not', ast.In: 'in', ast.NotIn: 'not in'}
+CMP_ALTERNATIVES = {
+    '<':  ['<=', '>', '>=', '!=', '=='],
+    '<=': ['<', '>=', '>', '==', '!='],
+    '>':  ['>=', '<', '<=', '!=', '=='],
+    '>=': ['>', '<=', '<', '==', '!='],
+    '==': ['!=', '<=', '>=', '<', '>', 'is'],
+    '!=': ['==', '<', '>', 'is not'],
+    'is': ['is not', '=='],
+    'is not': ['is', '!='],
+    'in': ['not in'],
+    'not in': ['in'],
+}
+BINOP_TEXT = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/', ast.FloorDiv: '//', ast.Mod: '%',
+              ast.Pow: '**', ast.BitAnd: '&', ast.BitOr: '|', ast.BitXor: '^', ast.LShift: '<<', ast.RShift: '>>'}
+BINOP_ALTERNATIVES = {
+    '+': ['-', '*'], '-': ['+', '*'], '*': ['/', '//', '+', '**'], '/': ['//', '*', '%'],
+    '//': ['/', '%', '*'], '%': ['//', '/'], '**': ['*'],
+    '&': ['|', '^'], '|': ['&', '^'], '^': ['&', '|'], '<<': ['>>'], '>>': ['<<'],
+}
+BOOLOP_TEXT = {ast.And: 'and', ast.Or: 'or'}
+# Expressions `x + 1` can be appended to without parentheses
+ATOMIC = (ast.Name, ast.Constant, ast.Call, ast.Subscript, ast.Attribute,
+          ast.List, ast.Tuple, ast.Dict, ast.Set, ast.UnaryOp)
+ARITHMETIC = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+
+MECHANICAL = (DefectClass.INCORRECT_COMPARISON_OPERATOR, DefectClass.OFF_BY_ONE, DefectClass.MISSING_OR_ADDED_1,
+              DefectClass.INCORRECT_OPERATOR, DefectClass.INCORRECT_ASSIGNMENT_OPERATOR,
+              DefectClass.INCORRECT_ARRAY_SLICE, DefectClass.INCORRECT_DATA_STRUCTURE_CONSTANT)
+
+class _Source:
+    """Byte offsets for AST positions (col_offset counts UTF-8 bytes) and text splicing."""
+    def __init__(self, source: str):
+        self.text  = source
+        self.data  = source.encode('utf-8')
+        self.starts = [0]
+        for line in self.data.splitlines(keepends=True):
+            self.starts.append(self.starts[-1] + len(line))
+
+    def start(self, node) -> int:
+        return self.starts[node.lineno - 1] + node.col_offset
+
+    def end(self, node) -> int:
+        return self.starts[node.end_lineno - 1] + node.end_col_offset
+
+    def segment(self, start: int, end: int) -> str:
+        return self.data[start:end].decode('utf-8')
+
+    def node_text(self, node) -> str:
+        return self.segment(self.start(node), self.end(node))
+
+    def splice(self, start: int, end: int, text: str) -> str:
+        return (self.data[:start] + text.encode('utf-8') + self.data[end:]).decode('utf-8')
+
+
+class MutationGenerator:
+    """
+    Enumerates single-edit AST mutations of a program for one DefectClass:
+    operator swaps, +/-1 on indices, bounds and comparisons, dropping a +1,
+    slice bound changes and constant perturbations. Edits are spliced into the
+    original text, so the rest of the file (comments, formatting) is untouched.
+    """
+    def __init__(self, source: str):
+        self.src  = _Source(source)
+        self.tree = ast.parse(source)
+
+    def _scope(self, function: str = None) -> list:
+        if function:
+            for node in ast.walk(self.tree):
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == function:
+                    return list(ast.walk(node))
+        return list(ast.walk(self.tree))
+
+    def _edit(self, start: int, end: int, text: str, line: int, what: str, rank: int) -> tuple:
+        return (rank, line, what, self.src.splice(start, end, text))
+
+    def _replace_in_gap(self, left, right, old: str, new: str, rank: int, what: str):
+        """Swap the operator token `old` found between two adjacent operand nodes."""
+        start, end = self.src.end(left), self.src.start(right)
+        gap = self.src.segment(start, end)
+        pos = gap.find(old)
+        if pos < 0:
+            return None
+        offset = start + len(gap[:pos].encode('utf-8'))
+        return self._edit(offset, offset + len(old.encode('utf-8')), new, left.end_lineno,
+                          f"{what}: {old} -> {new}", rank)
+
+    def _plus_minus_one(self, node, rank: int, what: str) -> list:
+        text = self.src.node_text(node)
+        start, end = self.src.start(node), self.src.end(node)
+        out = []
+        if isinstance(node, ast.Constant) and type(node.value) is int:
+            for delta in (1, -1):
+                out.append(self._edit(start, end, str(node.value + delta), node.lineno,
+                                      f"{what}: {text} -> {node.value + delta}", rank))
+            return out
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)) \
+                and isinstance(node.right, ast.Constant) and node.right.value == 1:
+            # x + 1 -> x and x - 1 -> x
+            out.append(self._edit(start, end, self.src.node_text(node.left), node.lineno,
+                                  f"{what}: {text} -> {self.src.node_text(node.left)}", rank))
+        wrapped = text if isinstance(node, ATOMIC) or (
+            isinstance(node, ast.BinOp) and isinstance(node.op, ARITHMETIC)) else f"({text})"
+        for sign in ('+', '-'):
+            out.append(self._edit(start, end, f"{wrapped} {sign} 1", node.lineno,
+                                  f"{what}: {text} -> {wrapped} {sign} 1", rank + 1))
+        return out
+
+    def comparison_swaps(self, nodes: list, strictness_only: bool = False) -> list:
+        out = []
+        for node in nodes:
+            if not isinstance(node, ast.Compare):
+                continue
+            operands = [node.left] + node.comparators
+            for i, op in enumerate(node.ops):
+                old = CMP_TEXT[type(op)]
+                alternatives = CMP_ALTERNATIVES.get(old, [])
+                if strictness_only:
+                    alternatives = alternatives[:1] if old in ('<', '<=', '>', '>=') else []
+                for rank, new in enumerate(alternatives):
+                    edit = self._replace_in_gap(operands[i], operands[i + 1], old, new, rank, 'comparison')
+                    if edit:
+                        out.append(edit)
+        return out
+
+    def operator_swaps(self, nodes: list) -> list:
+        out = []
+        for node in nodes:
+            if isinstance(node, ast.BinOp):
+                old = BINOP_TEXT[type(node.op)]
+                for rank, new in enumerate(BINOP_ALTERNATIVES.get(old, [])):
+                    edit = self._replace_in_gap(node.left, node.right, old, new, rank, 'operator')
+                    if edit:
+                        out.append(edit)
+            elif isinstance(node, ast.BoolOp):
+                old = BOOLOP_TEXT[type(node.op)]
+                new = 'or' if old == 'and' else 'and'
+                for left, right in zip(node.values, node.values[1:]):
+                    edit = self._replace_in_gap(left, right, old, new, 0, 'boolean operator')
+                    if edit:
+                        out.append(edit)
+            elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+                text = self.src.node_text(node.operand)
+                out.append(self._edit(self.src.start(node), self.src.end(node), text, node.lineno,
+                                      f"drop not: {self.src.node_text(node)} -> {text}", 1))
+        return out
+
+    def assignment_swaps(self, nodes: list) -> list:
+        out = []
+        for node in nodes:
+            if isinstance(node, ast.AugAssign):
+                old = BINOP_TEXT[type(node.op)] + '='
+                for rank, new in enumerate([a + '=' for a in BINOP_ALTERNATIVES.get(old[:-1], [])] + ['=']):
+                    edit = self._replace_in_gap(node.target, node.value, old, new, rank, 'assignment')
+                    if edit:
+                        out.append(edit)
+            elif isinstance(node, ast.Assign) and len(node.targets) == 1:
+                for rank, new in enumerate(['+=', '-=']):
+                    edit = self._replace_in_gap(node.targets[0], node.value, '=', new, rank + 1, 'assignment')
+                    if edit:
+                        out.append(edit)
+        return out
+
+    def off_by_one(self, nodes: list) -> list:
+        sites = []
+        for node in nodes:
+            if isinstance(node, ast.Compare):
+                sites.extend([node.left] + node.comparators)
+            elif isinstance(node, ast.Subscript) and not isinstance(node.slice, ast.Slice):
+                sites.append(node.slice)
+            elif isinstance(node, ast.Slice):
+                sites.extend(b for b in (node.lower, node.upper) if b is not None)
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'range':
+                sites.extend(node.args)
+            elif isinstance(node, (ast.Return, ast.Assign, ast.AugAssign)) and isinstance(
+                    node.value, (ast.Name, ast.BinOp, ast.Constant)):
+                sites.append(node.value)
+            elif isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)) \
+                    and isinstance(node.right, ast.Constant) and node.right.value == 1:
+                sites.append(node)
+        out, seen = [], set()
+        for site in sites:
+            key = (self.src.start(site), self.src.end(site))
+            if key in seen or isinstance(site, (ast.Tuple, ast.List, ast.Dict)):
+                continue
+            seen.add(key)
+            out.extend(self._plus_minus_one(site, 0, 'off-by-one'))
+        return out
+
+    def slice_changes(self, nodes: list) -> list:
+        out = []
+        for node in nodes:
+            if not isinstance(node, ast.Slice):
+                continue
+            for bound in (node.lower, node.upper):
+                if bound is None:
+                    continue
+                out.append(self._edit(self.src.start(bound), self.src.end(bound), '', bound.lineno,
+                                      f"slice: drop bound {self.src.node_text(bound)}", 0))
+                out.extend(self._plus_minus_one(bound, 1, 'slice'))
+        return out
+
+    def constant_changes(self, nodes: list) -> list:
+        replacements = {'[]': ['{}', 'set()', '()'], '{}': ['[]', 'set()'], '()': ['[]'], 'set()': ['[]', '{}'],
+                        'True': ['False'], 'False': ['True'], 'None': ['0', '[]']}
+        out = []
+        for node in nodes:
+            text = self.src.node_text(node) if isinstance(node, (ast.Constant, ast.List, ast.Dict, ast.Tuple, ast.Call)) else None
+            if text is None:
+                continue
+            if isinstance(node, ast.Constant) and type(node.value) is int:
+                out.extend(self._plus_minus_one(node, 1, 'constant'))
+                if node.value in (0, 1):
+                    continue
+            for rank, new in enumerate(replacements.get(text, [])):
+                out.append(self._edit(self.src.start(node), self.src.end(node), new, node.lineno,
+                                      f"constant: {text} -> {new}", rank))
+        return out
+
+    def generate(self, defect: DefectClass, function: str = None) -> list:
+        """(rank, line, description, new_source) for every mutation targeting `defect`."""
+        nodes = self._scope(function)
+        if defect == DefectClass.INCORRECT_COMPARISON_OPERATOR:
+            return self.comparison_swaps(nodes)
+        if defect == DefectClass.OFF_BY_ONE:
+            return self.comparison_swaps(nodes, strictness_only=True) + self.off_by_one(nodes)
+        if defect == DefectClass.MISSING_OR_ADDED_1:
+            return self.off_by_one(nodes)
+        if defect == DefectClass.INCORRECT_OPERATOR:
+            return self.operator_swaps(nodes) + self.assignment_swaps(
+                [n for n in nodes if isinstance(n, ast.AugAssign)])
+        if defect == DefectClass.INCORRECT_ASSIGNMENT_OPERATOR:
+            return self.assignment_swaps(nodes)
+        if defect == DefectClass.INCORRECT_ARRAY_SLICE:
+            return self.slice_changes(nodes) + self.off_by_one(
+                [n for n in nodes if isinstance(n, ast.Subscript)])
+        if defect == DefectClass.INCORRECT_DATA_STRUCTURE_CONSTANT:
+            return self.constant_changes(nodes)
+        return []
+
+
+def candidate_mutations(source: str, defect: DefectClass, function: str = None, lines: list = None,
+                        max_candidates: int = 64, broaden: bool = False) -> list:
+    """
+    Ranked, de-duplicated, compilable mutations as (description, new_source).
+    Mutations on the suspicious `lines` come first; with broaden, the other
+    mechanical classes' mutations follow the predicted class's.
+    """
+    try:
+        generator = MutationGenerator(source)
+    except SyntaxError:
+        return []
+    classes = [defect] + ([c for c in MECHANICAL if c != defect] if broaden else [])
+    edits = []
+    for tier, cls in enumerate(classes):
+        edits.extend((tier,) + e for e in generator.generate(cls, function))
+
+    def distance(line):
+        return min(abs(line - l) for l in lines) if lines else 0
+    edits.sort(key=lambda e: (distance(e[2]), e[0], e[1], e[2]))
+
+    ranked, seen = [], {source}
+    for _, _, _, what, new_source in edits:
+        if new_source in seen:
+            continue
+        seen.add(new_source)
+        try:
+            ast.parse(new_source)
+        except SyntaxError:
+            continue
+        ranked.append((what, new_source))
+        if len(ranked) >= max_candidates:
+            break
+    return ranked
+
+
+class MutationRepairer:
+    """
+    LLM-free fast path: validates the ranked mutations for the predicted defect
+    class in parallel waves, each in its own Workspace. Within a wave the
+    best-ranked passing mutation wins, so the choice does not depend on which
+    test run happens to finish first.
+    """
+    def __init__(self, toolset, test_script: str, max_candidates: int = 64, parallel: int = 4,
+                 scratch_root: str = None, broaden: bool = False):
+        self.toolset        = toolset
+        self.test_script    = test_script
+        self.max_candidates = max_candidates
+        self.parallel       = parallel
+        self.scratch_root   = scratch_root
+        self.broaden        = broaden
+
+    def repair(self, work_file: str, algo_name: str, defect: DefectClass, lines: list = None) -> dict:
+        """
+        Returns {'source', 'verified', 'mutation', 'candidates', 'validated'};
+        source is the passing mutation or None.
+        """
+        with open(work_file, 'r') as f:
+            source = f.read()
+        candidates = candidate_mutations(source, defect, function=algo_name, lines=lines,
+                                         max_candidates=self.max_candidates, broaden=self.broaden)
+        report = {'source': None, 'verified': False, 'mutation': None,
+                  'candidates': len(candidates), 'validated': 0}
+        if not candidates:
+            return report
+        with ThreadPoolExecutor(max_workers=self.parallel) as pool:
+            for i in range(0, len(candidates), self.parallel):
+                wave = candidates[i:i + self.parallel]
+                passed = list(pool.map(lambda c: validate_candidate(
+                    c[1], self.toolset, self.test_script, algo_name, self.scratch_root), wave))
+                report['validated'] += len(wave)
+                for (what, new_source), ok in zip(wave, passed):
+                    if ok:
+                        report.update(source=new_source, verified=True, mutation=what)
+                        break
+                if report['verified']:
+                    break
+        logger.info(f"mutation repair ({defect.value}): verified={report['verified']} after "
+                    f"{report['validated']}/{report['candidates']} candidates"
+                    + (f" [{report['mutation']}]" if report['mutation'] else ""))
+        return report
+
+
+if __name__ == "__main__":
+    from tools import Toolset
+    from test_runner import get_test_runner
+    parser = argparse.ArgumentParser(description="Repair programs with AST mutations only (no LLM).")
+    parser.add_argument("programs", nargs="*", help="Program files (default: every labelled program)")
+    parser.add_argument("--labels", default="quixbugs_defect_labels.csv")
+    parser.add_argument("--code-dir", default=os.path.join("Code-Refactoring-QuixBugs", "python_programs"))
+    parser.add_argument("--test-dir", default=os.path.join("Code-Refactoring-QuixBugs", "json_testcases"))
+    parser.add_argument("--max-candidates", type=int, default=64)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--broaden", action="store_true", help="Also try the other mechanical classes' mutations")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with open(args.labels, newline="") as f:
+        labels = {r["filename"]: DefectClass(r["defect_class"]) for r in csv.DictReader(f)}
+    programs = args.programs or sorted(labels)
+    tools = Toolset(args.code_dir, args.test_dir, test_runner=get_test_runner(workers=args.parallel),
+                    work_dir=args.code_dir)
+    repairer = MutationRepairer(tools, os.path.join(os.path.dirname(args.code_dir), "tester.py"),
+                                args.max_candidates, args.parallel, broaden=args.broaden)
+    fixed = tried = 0
+    for name in programs:
+        path = os.path.join(args.code_dir, name)
+        if name not in labels or not os.path.exists(path):
+            continue
+        tried += 1
+        start = time.perf_counter()
+        report = repairer.repair(path, name[:-3], labels[name])
+        fixed += report['verified']
+        print(json.dumps({'program': name, 'defect': labels[name].value, 'verified': report['verified'],
+                          'mutation': report['mutation'], 'candidates': report['candidates'],
+                          'validated': report['validated'], 'seconds': round(time.perf_counter() - start, 3)}))
+    print(f"fixed {fixed}/{tried} without the LLM")
@@ -0,0 +1,43 @@
+from defect_classes import DefectClass
+
+# Shared by RepairEnv, the trajectory store and the surrogate env, so logged
+# sessions and live episodes use the same observation/action encoding
+STATES     = ['INIT', 'GATHER_INFO', 'GENERATE_FIX', 'VALIDATE_FIX', 'GOAL_ACCOMPLISHED', 'FAILED']
+# The RL action space. Frozen: saved PPO/BC policies and trajectory stores index
+# into it, so new Toolset tools are not added here (changing it means retraining)
+TOOL_NAMES = ['collect_more_information', 'discard_hypothesis', 'express_hypothesis', 'extract_method',
+              'extract_tests', 'find_similar_api_calls', 'generate_method_body', 'get_classes_and_methods',
+              'goal_accomplished', 'read_range', 'run_fault_localization', 'run_tests', 'search_code_base',
+              'write_fix']
+# LLM-only tools observed as the action they stand in for
+TOOL_ALIASES = {'apply_edits': 'write_fix'}
+DEFECTS    = list(DefectClass)
+OBS_DIM    = len(STATES) + 2 * len(TOOL_NAMES)
+
+def state_index(state: str) -> int:
+    return STATES.index(state)
+
+def tool_index(tool_name: str) -> int:
+    """Action index of a tool (aliases resolved), or -1 for names that are not actions."""
+    tool_name = TOOL_ALIASES.get(tool_name, tool_name)
+    return TOOL_NAMES.index(tool_name) if tool_name in TOOL_NAMES else -1
+
+def defect_index(defect) -> int:
+    return DEFECTS.index(defect) if defect in DEFECTS else -1
+
+def encode(state: int, last_tools: tuple) -> list:
+    """One-hot FSM state followed by one-hot vectors of the last two tools (oldest first, -1 = none)."""
+    obs = [0.0] * OBS_DIM
+    obs[state] = 1.0
+    for slot, tool in enumerate(last_tools[-2:]):
+        if tool >= 0:
+            obs[len(STATES) + slot * len(TOOL_NAMES) + tool] = 1.0
+    return obs
+
+def last_tools(history) -> tuple:
+    """Action indices of the last two history entries; entries read as (command, result, ...)."""
+    return tuple(tool_index(entry[0].split('(')[0]) for entry in history[-2:])
+
+def encode_observation(state: str, history) -> list:
+    """RepairEnv's observation for an FSM state and a Middleware command history."""
+    return encode(state_index(state), last_tools(history))
@@ -0,0 +1,56 @@
+import os
+import ast
+import hashlib
+from kvstore import KeyValueStore, content_hash
+
+CACHE_PATH = os.path.join(".cache", "test_outcomes.sqlite")
+
+def normalized_source_hash(source: str) -> str:
+    """
+    Hash of the candidate's AST, so formatting / comment-only variants of a
+    patch share one cache entry. Unparseable sources fall back to their bytes.
+    """
+    try:
+        return content_hash('ast', ast.dump(ast.parse(source)))
+    except (SyntaxError, ValueError):
+        return content_hash('src', source)
+
+def suite_hash(*paths: str, extra: str = '') -> str:
+    """Identity of a test suite: the contents of its files plus any mode string."""
+    h = hashlib.sha256(extra.encode())
+    for path in paths:
+        h.update(path.encode())
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+class TestOutcomeCache:
+    """
+    Persistent map (normalized source hash, test-suite hash) -> test output and
+    failing tests. Tracks hits, misses and the test time the hits saved.
+    """
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = None):
+        self.store = KeyValueStore(path, table='outcomes', max_entries=max_entries)
+        self.seconds_saved = 0.0
+
+    def _key(self, source: str, suite: str) -> str:
+        return content_hash(normalized_source_hash(source), suite)
+
+    def lookup(self, source: str, suite: str):
+        entry = self.store.get(self._key(source, suite))
+        if entry is not None:
+            self.seconds_saved += entry.get('seconds', 0.0)
+        return entry
+
+    def record(self, source: str, suite: str, output: str, failing: list, seconds: float):
+        self.store.put(self._key(source, suite), {
+            'output': output,
+            'failing': failing,
+            'seconds': seconds,
+        })
+
+    def stats(self) -> dict:
+        stats = self.store.stats()
+        stats['seconds_saved'] = self.seconds_saved
+        return stats
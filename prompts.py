@@ -0,0 +1,85 @@
+from tools import Toolset
+
+def build_static_prompt(tools: Toolset) -> dict:
+    """Role, goals, tool guidelines and tool list shared by evaluate.py and RepairEnv."""
+    return {
+        'role': "You are an expert Python bug fixer agent.",
+        'goals': "Locate and fix a single-line defect in the file `current_program.py` using the available tools.",
+        'guidelines': (
+            "At each step, pick exactly one tool and return a JSON object with:\n"
+            "  • `thoughts`: why you chose this tool and what you expect.\n"
+            "  • `command`: { `name`: TOOL_NAME, `args`: { ... } }\n\n"
+
+            "TOOLS AND USAGE:\n"
+            "1) read_range(file_path: str, start_line: int, end_line: int) → str\n"
+            "   • Returns the lines from `start_line` to `end_line` in the file.\n"
+            "   • Use this to inspect specific code snippets.\n"
+            "   • Example args: {\"file_path\": \"current_program.py\", \"start_line\": 5, \"end_line\": 15}\n\n"
+
+            "2) get_classes_and_methods(file_path: str) → dict\n"
+            "   • Returns all class and function names in the file.\n"
+            "   • Useful to discover available methods or entry points.\n"
+            "   • Example args: {\"file_path\": \"current_program.py\"}\n\n"
+
+            "3) extract_method(file_path: str, method_name: str) → str\n"
+            "   • Returns the full source of `method_name`.\n"
+            "   • Use when you want the body of a particular function.\n"
+            "   • Example args: {\"file_path\": \"current_program.py\", \"method_name\": \"binary_search\"}\n\n"
+
+            "4) extract_tests(test_output: str) → list\n"
+            "   • Parses test harness output and returns failing test names.\n"
+            "   • Use after `run_tests` to know which cases failed.\n"
+            "   • Example args: {\"test_output\": \"(raw output)\"}\n\n"
+
+            "5) search_code_base(keyword: str, code_dir: str) → list\n"
+            "   • Finds lines containing `keyword` across all .py files in `code_dir`.\n"
+            "   • Use to find related usage or similar logic.\n"
+            "   • Example args: {\"keyword\": \"range(\", \"code_dir\": \"python_programs\"}\n\n"
+
+            "6) find_similar_api_calls(method_name: str) → list\n"
+            "   • Shortcut for `search_code_base(method_name, code_dir)`.\n\n"
+
+            "7) generate_method_body(prompt: str, llm: object) → str\n"
+            "   • Ask the LLM to draft a fix based on your prompt, as line edits or full source.\n"
+            "   • Use to propose the fixed code before writing it; the fix is applied for you.\n"
+            "   • Example args: {\"prompt\": \"Fix the off-by-one in this loop...\", \"llm\": LLM_OBJECT}\n\n"
+
+            "8) run_tests(test_script: str, file_path: str) → str\n"
+            "   • Runs `tester.py current_program.py` and returns combined stdout/stderr.\n"
+            "   • Use only `tester.py` and `current_program.py` for test_script and file_path respectively. These are injected automatically.\n"
+
+            "9) run_fault_localization(test_output: str) → list\n"
+            "   • Ranks the lines of `current_program.py` by how often failing tests (and not passing ones) execute them.\n"
+            "   • Returns up to 5 entries {\"line\", \"score\", \"code\"}, most suspicious first; start reading there.\n"
+            "   • Example args: {\"test_output\": \"(raw output)\"}\n\n"
+
+            "10) write_fix(file_path: str, new_source: str) → str\n"
+            "   • Overwrites `file_path` with `new_source` and returns a unified diff.\n"
+            "   • Only for rewrites too large for `apply_edits`.\n"
+            "   • Example args: {\"file_path\": \"current_program.py\", \"new_source\": \"<full file>\"}\n\n"
+
+            "11) express_hypothesis(hypothesis: str, state: dict) → str\n"
+            "   • Record your current bug hypothesis into the agent’s state.\n\n"
+
+            "12) discard_hypothesis(state: dict) → str\n"
+            "   • Clear the last hypothesis when it’s invalidated.\n\n"
+
+            "13) collect_more_information(state: dict) → str\n"
+            "   • Signal to return to gathering info (e.g., after a failed fix).\n\n"
+
+            "14) apply_edits(file_path: str, edits: list) → str\n"
+            "   • Replaces line ranges (numbers as in the numbered listing of the repair strategy) and returns a unified diff.\n"
+            "   • Each edit is {\"start_line\", \"end_line\", \"new_text\"}; `new_text` keeps full indentation, "
+            "is empty to delete the lines, and `end_line` = `start_line` - 1 inserts before `start_line`.\n"
+            "   • Example args: {\"file_path\": \"current_program.py\", \"edits\": "
+            "[{\"start_line\": 4, \"end_line\": 4, \"new_text\": \"        n &= n - 1\"}]}\n\n"
+
+            "**Important:** After doing *any* analysis (run_tests, extract_method, etc), "
+            "you must *then* call `generate_method_body` exactly once; the fix it drafts is checked and written for you. "
+            "To change lines yourself instead, use `apply_edits` with only the changed lines. "
+            "Do *not* call run_tests again until after applying a patch."
+
+            "Always include **only** the JSON in your response—no additional text."
+        ),
+        'tools': [t for t in dir(tools) if not t.startswith('_') and callable(getattr(tools, t))]
+    }
@@ -1,129 +1,81 @@
+import os
+import random
 import gym
 from gym import spaces
 import numpy as np
 from fsm import RepairAgentFSM
 from Middleware import Middleware
+from classifier import configure_classifier
 from tools import Toolset
-from llm_interface import GeminiLLM
-import shutil
-from tools import Toolset
-import os
+from llm_cache import make_llm
+from outcome_cache import TestOutcomeCache
+from prompts import build_static_prompt
+from test_runner import make_test_runner, CASE_TIMEOUT
+from workspace import Workspace
+from observation import TOOL_NAMES, OBS_DIM, encode_observation
 
 TEST_DIR=os.path.join('Code-Refactoring-QuixBugs', 'json_testcases')
 BUGGY_DIR = os.path.join('Code-Refactoring-QuixBugs', 'python_programs')
-
-tools = Toolset(code_dir=BUGGY_DIR, test_dir=TEST_DIR)
+TEST_SCRIPT = os.path.join('Code-Refactoring-QuixBugs', 'tester.py')
+SCRATCH_DIR = 'scratch'
 
 class RepairEnv(gym.Env):
-    def __init__(self, buggy_file: str, code_dir: str, test_script: str, llm_api_key: str):
+    """
+    One repair episode per reset, on a bug sampled from `bugs`. Every instance
+    owns its workspace, LLM client and test runner, so several can run side by
+    side in a DummyVecEnv or SubprocVecEnv.
+    """
+    def __init__(self, bugs, code_dir: str = BUGGY_DIR, test_script: str = TEST_SCRIPT,
+                 llm_api_key: str = 'API_KEY', llm_mode: str = 'cache', seed: int = None,
+                 max_cycles: int = 10, case_timeout: float = CASE_TIMEOUT,
+                 scratch_root: str = SCRATCH_DIR, llm=None, trajectories: str = None):
         super().__init__()
-        self.tool_names = [t for t in dir(Toolset) if not t.startswith('_')]
+        self.tool_names = TOOL_NAMES
         self.n_actions = len(self.tool_names)
-        self.obs_dim   = 6 + 2 * self.n_actions
+        self.obs_dim   = OBS_DIM
         self.action_space = spaces.Discrete(self.n_actions)
         self.observation_space = spaces.Box(0,1,shape=(self.obs_dim,), dtype=np.float32)
 
-        # Initialize components
-        self.llm = GeminiLLM(api_key=llm_api_key)
-        self.tools = Toolset(code_dir=code_dir, test_dir=code_dir.replace('python_programs','json_testcases'))
-        self.fsm = RepairAgentFSM(self.llm, self.tools, test_script, max_cycles=10)
-
-        static_prompt = {
-            'role': "You are an expert Python bug fixer agent.",
-            'goals': "Locate and fix a single-line defect in the file `current_program.py` using the available tools.",
-            'guidelines': (
-                "At each step, pick exactly one tool and return a JSON object with:\n"
-                "  • `thoughts`: why you chose this tool and what you expect.\n"
-                "  • `command`: { `name`: TOOL_NAME, `args`: { ... } }\n\n"
-
-                "TOOLS AND USAGE:\n"
-                "1) read_range(file_path: str, start_line: int, end_line: int) → str\n"
-                "   • Returns the lines from `start_line` to `end_line` in the file.\n"
-                "   • Use this to inspect specific code snippets.\n"
-                "   • Example args: {\"file_path\": \"current_program.py\", \"start_line\": 5, \"end_line\": 15}\n\n"
-
-                "2) get_classes_and_methods(file_path: str) → dict\n"
-                "   • Returns all class and function names in the file.\n"
-                "   • Useful to discover available methods or entry points.\n"
-                "   • Example args: {\"file_path\": \"current_program.py\"}\n\n"
-
-                "3) extract_method(file_path: str, method_name: str) → str\n"
-                "   • Returns the full source of `method_name`.\n"
-                "   • Use when you want the body of a particular function.\n"
-                "   • Example args: {\"file_path\": \"current_program.py\", \"method_name\": \"binary_search\"}\n\n"
-
-                "4) extract_tests(test_output: str) → list\n"
-                "   • Parses test harness output and returns failing test names.\n"
-                "   • Use after `run_tests` to know which cases failed.\n"
-                "   • Example args: {\"test_output\": \"(raw output)\"}\n\n"
-
-                "5) search_code_base(keyword: str, code_dir: str) → list\n"
-                "   • Finds lines containing `keyword` across all .py files in `code_dir`.\n"
-                "   • Use to find related usage or similar logic.\n"
-                "   • Example args: {\"keyword\": \"range(\", \"code_dir\": \"python_programs\"}\n\n"
-
-                "6) find_similar_api_calls(method_name: str) → list\n"
-                "   • Shortcut for `search_code_base(method_name, code_dir)`.\n\n"
+        self.bugs = [bugs] if isinstance(bugs, str) else list(bugs)
+        self.test_script = test_script
+        self.max_cycles  = max_cycles
+        self._rng = random.Random(seed)
 
-                "7) generate_method_body(prompt: str, llm: object) → str\n"
-                "   • Ask the LLM to draft a new method or full source based on your prompt.\n"
-                "   • Use to propose the fixed code before writing it.\n"
-                "   • Example args: {\"prompt\": \"Fix the off-by-one in this loop...\", \"llm\": LLM_OBJECT}\n\n"
-
-                "8) run_tests(test_script: str, file_path: str) → str\n"
-                "   • Runs `tester.py current_program.py` and returns combined stdout/stderr.\n"
-                "   • Use only `tester.py` and `current_program.py` for test_script and file_path respectively. These are injected automatically.\n"
-
-                "9) run_fault_localization(test_output: str) → list\n"
-                "   • Identical to `extract_tests`, returns failing test names.\n\n"
-
-                "10) write_fix(file_path: str, new_source: str) → str\n"
-                "   • Overwrites `file_path` with `new_source` and returns a unified diff.\n"
-                "   • Use this when you have the complete fixed file.\n"
-                "   • Example args: {\"file_path\": \"current_program.py\", \"new_source\": \"<full file>\"}\n\n"
-
-                "11) express_hypothesis(hypothesis: str, state: dict) → str\n"
-                "   • Record your current bug hypothesis into the agent’s state.\n\n"
-
-                "12) discard_hypothesis(state: dict) → str\n"
-                "   • Clear the last hypothesis when it’s invalidated.\n\n"
-
-                "13) collect_more_information(state: dict) → str\n"
-                "   • Signal to return to gathering info (e.g., after a failed fix).\n\n"
-
-                "**Important:** After doing *any* analysis (run_tests, extract_method, etc), "
-                "you must *then* call `write_fix` exactly once, with the full corrected source. "
-                "Do *not* call run_tests again until after applying a patch."
-
-                "Always include **only** the JSON in your response—no additional text."
-            ),
-            'tools': [t for t in dir(tools) if not t.startswith('_')]
-        }
-        self.static_prompt = static_prompt
-        self.middleware = Middleware(self.llm, self.fsm, self.tools, static_prompt=static_prompt)
-        self.buggy_file = buggy_file
+        # Initialize components
+        self.workspace = Workspace(root=scratch_root, prefix='env_')
+        self.llm = llm or make_llm(llm_api_key, mode=llm_mode)
+        self.test_runner = make_test_runner(case_timeout=case_timeout)
+        self.tools = Toolset(code_dir=code_dir, test_dir=code_dir.replace('python_programs','json_testcases'),
+                             work_dir=self.workspace.path, test_runner=self.test_runner,
+                             test_cache=TestOutcomeCache())
+        self.static_prompt = build_static_prompt(self.tools)
+        # Optional transition log for offline training (see trajectories.py)
+        self.recorder = None
+        if trajectories:
+            from trajectories import TrajectoryRecorder
+            self.recorder = TrajectoryRecorder(trajectories)
+        self.buggy_file = None
+        self.fsm = None
+        self.middleware = None
+
+    def seed(self, seed=None):
+        self._rng = random.Random(seed)
+        return [seed]
 
     def reset(self):
-        shutil.copy(self.buggy_file, 'current_program.py')
-        self.fsm = RepairAgentFSM(self.llm, self.tools, self.middleware.fsm.test_script)
-        self.middleware = Middleware(self.llm, self.fsm, self.tools,  static_prompt=self.static_prompt )
+        self.buggy_file = self._rng.choice(self.bugs)
+        self.workspace.load(self.buggy_file)
+        self.fsm = RepairAgentFSM(self.llm, self.tools, self.test_script, max_cycles=self.max_cycles)
+        self.fsm.state_data['algo_name'] = os.path.splitext(os.path.basename(self.buggy_file))[0]
+        self.middleware = Middleware(self.llm, self.fsm, self.tools, static_prompt=self.static_prompt,
+                                     recorder=self.recorder)
+        if self.recorder is not None:
+            self.recorder.discard()
         return self._get_obs()
 
     def _get_obs(self):
-        states = ['INIT','GATHER_INFO','GENERATE_FIX','VALIDATE_FIX','GOAL_ACCOMPLISHED', 'FAILED']
-        state_vec = np.zeros(len(states))
-        state_vec[states.index(self.fsm.current_state())] = 1
-        last_two = self.middleware.prompt.get('history',[])[-2:]
-        act_vecs = []
-        for _,_ in enumerate(range(2)):
-            if _ < len(last_two):
-                name = last_two[_][0].split('(')[0]
-                idx = self.tool_names.index(name)
-                vec = np.zeros(self.n_actions); vec[idx]=1
-            else:
-                vec = np.zeros(self.n_actions)
-            act_vecs.append(vec)
-        obs = np.concatenate([state_vec] + act_vecs)
+        obs = np.asarray(encode_observation(self.fsm.current_state(), self.middleware.prompt.get('history', [])),
+                         dtype=np.float32)
         assert obs.shape == (self.obs_dim,)
         return obs
 
@@ -131,7 +83,8 @@ class RepairEnv(gym.Env):
         tool = self.tool_names[action]
         self.middleware.override_next_tool(tool)
         llm_out, cmd, result = self.middleware.run_cycle()
-        done = self.fsm.is_done()
+        self.fsm.cycle_count += 1
+        done = self.fsm.is_done() or self.fsm.cycle_count >= self.max_cycles
         if done:
             if self.fsm.current_state()=='GOAL_ACCOMPLISHED':
                 reward = 1.0
@@ -139,8 +92,29 @@ class RepairEnv(gym.Env):
                 reward = -1.0
         else:
             reward = 0.0
+        if done and self.recorder is not None:
+            self.recorder.end_episode(self.fsm.current_state(), os.path.basename(self.buggy_file),
+                                      self.fsm.state_data.get('defect_class'))
         obs = self._get_obs()
-        return obs, reward, done, {}
+        return obs, reward, done, {'bug': self.buggy_file}
 
     def render(self, mode='human'):
         pass
+
+    def close(self):
+        self.test_runner.close()
+        self.workspace.cleanup()
+
+
+def make_env(bugs, rank: int = 0, seed: int = 0, classifier_backend: str = None,
+             classifier_threads: int = None, **kwargs):
+    """
+    Env factory for DummyVecEnv / SubprocVecEnv; each rank gets its own seed.
+    A classifier backend is configured inside the env's own process, since
+    SubprocVecEnv workers may be spawned with an empty classifier registry.
+    """
+    def _init():
+        if classifier_backend or classifier_threads:
+            configure_classifier(classifier_backend or 'fp32', classifier_threads)
+        return RepairEnv(bugs, seed=seed + rank, **kwargs)
+    return _init
@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import logging
+import argparse
+from tracing import merge_aggregates
+
+RESULTS_PATH = 'results.jsonl'
+
+logger = logging.getLogger(__name__)
+
+def append_result(path: str, fname: str, row: dict):
+    """Append one program's result row as a JSON line, flushed to disk before returning."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    line = json.dumps(dict(row, program=fname), default=str) + "\n"
+    with open(path, 'a+b') as f:
+        # Start on a fresh line if an earlier run was killed mid-append
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                line = "\n" + line
+        f.write(line.encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+def load_results(path: str) -> dict:
+    """
+    Result rows by program, in the order they were first recorded. A program
+    recorded more than once keeps its latest row; a partial last line (the
+    writer was killed mid-append) is skipped.
+    """
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"{path}:{lineno}: skipping unreadable result line")
+                continue
+            results[row.pop('program')] = row
+    return results
+
+def completed(results: dict) -> set:
+    """Programs with a finished result; crashed sessions are not counted, so --resume retries them."""
+    return {fname for fname, row in results.items() if 'error' not in row}
+
+def summarize(results: dict):
+    total = len(results)
+    fixed_count = sum(1 for r in results.values() if r['fixed'])
+    logger.info("=== Evaluation Summary ===")
+    logger.info(f"Total programs: {total}")
+    logger.info(f"Fixed: {fixed_count}/{total} ({fixed_count/total:.1%})")
+    cache_stats = [r['test_cache'] for r in results.values() if 'test_cache' in r]
+    hits   = sum(c['hits'] for c in cache_stats)
+    lookups = hits + sum(c['misses'] for c in cache_stats)
+    saved  = sum(c['seconds_saved'] for c in cache_stats)
+    if lookups:
+        logger.info(f"Test cache: {hits}/{lookups} hits ({hits/lookups:.1%}), {saved:.1f}s of test time saved")
+    tokens = [r['tokens'] for r in results.values() if r.get('tokens')]
+    if tokens:
+        prompt_tokens = sum(t['prompt_tokens'] for t in tokens)
+        completion_tokens = sum(t['completion_tokens'] for t in tokens)
+        cached_tokens = sum(t['cached_tokens'] for t in tokens)
+        calls = sum(t['calls'] for t in tokens)
+        logger.info(f"LLM tokens: {prompt_tokens} prompt ({cached_tokens} from context cache) + "
+                    f"{completion_tokens} completion over {calls} calls")
+    timings = merge_aggregates([r['timings'] for r in results.values() if r.get('timings')])
+    if timings:
+        logger.info("Time by stage:")
+        for name, row in sorted(timings.items(), key=lambda kv: -kv[1]['total_s']):
+            logger.info(f"  {name:<32} {row['total_s']:8.2f}s  {row['count']:5d} x {row['mean_ms']:9.1f} ms"
+                        f"  (max {row['max_ms']:.1f} ms)")
+    by_mutation = [f for f, r in results.items() if r['fixed'] and r.get('mutation', {}).get('verified')]
+    if by_mutation:
+        logger.info(f"Fixed by AST mutation (no LLM): {len(by_mutation)}/{fixed_count}")
+    rejected = sum(r.get('rejected_fixes', 0) for r in results.values())
+    if rejected:
+        logger.info(f"Candidate fixes rejected before testing: {rejected}")
+    over_budget = [f for f, r in results.items() if r.get('failure_reason') == 'token_budget']
+    if over_budget:
+        logger.info(f"Stopped by token budget: {', '.join(over_budget)}")
+
+    print("\nProgram\tFixed\tAttempts\tExactMatch")
+    for fname, info in results.items():
+        print(f"{fname}\t{info['fixed']}\t{info['attempts']}\t{info.get('exact_match', False)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild the evaluation summary from a results file.")
+    parser.add_argument('path', nargs='?', default=RESULTS_PATH, help="JSONL results written by evaluate.py")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    results = load_results(args.path)
+    if not results:
+        sys.exit(f"No results in {args.path}")
+    summarize(results)
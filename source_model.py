@@ -0,0 +1,111 @@
+import os
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+
+class SourceModel:
+    """
+    Parsed view of one source file: its lines, AST, and an index from
+    class/function name to node. The AST is parsed on first use only.
+    """
+    def __init__(self, path: str, source: str):
+        self.path   = path
+        self.source = source
+        self.digest = hashlib.sha256(source.encode('utf-8', errors='surrogatepass')).hexdigest()
+        self.lines  = source.splitlines(keepends=True)
+        self._tree  = None
+        self._parse_error = None
+        self._index = None
+        self._unparsed = {}
+
+    @property
+    def tree(self) -> ast.AST:
+        if self._tree is None and self._parse_error is None:
+            try:
+                self._tree = ast.parse(self.source)
+            except SyntaxError as e:
+                self._parse_error = e
+        if self._parse_error is not None:
+            raise self._parse_error
+        return self._tree
+
+    def _build_index(self):
+        # ast.walk order, so lookups agree with a fresh walk over the tree
+        classes, functions, by_name = [], [], {}
+        for node in ast.walk(self.tree):
+            if isinstance(node, ast.ClassDef):
+                classes.append(node.name)
+            elif isinstance(node, ast.FunctionDef):
+                functions.append(node.name)
+                by_name.setdefault(node.name, node)
+        self._index = (classes, functions, by_name)
+
+    @property
+    def classes(self) -> list:
+        if self._index is None:
+            self._build_index()
+        return self._index[0]
+
+    @property
+    def functions(self) -> list:
+        if self._index is None:
+            self._build_index()
+        return self._index[1]
+
+    def function(self, name: str):
+        if self._index is None:
+            self._build_index()
+        return self._index[2].get(name)
+
+    def function_source(self, name: str):
+        """ast.unparse of the first function called `name`, or None."""
+        if name not in self._unparsed:
+            node = self.function(name)
+            self._unparsed[name] = ast.unparse(node) if node is not None else None
+        return self._unparsed[name]
+
+class SourceModelCache:
+    """
+    Path -> SourceModel, revalidated with one os.stat per lookup. A changed
+    mtime/size triggers a re-read, but the model is only rebuilt when the
+    content hash actually differs.
+    """
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> SourceModel:
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                return entry[1]
+        with open(path, "r") as f:
+            source = f.read()
+        model = SourceModel(path, source)
+        with self._lock:
+            if entry is not None and entry[1].digest == model.digest:
+                model = entry[1]
+            self._entries[path] = (stamp, model)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return model
+
+    def invalidate(self, path: str):
+        with self._lock:
+            self._entries.pop(os.path.abspath(path), None)
+
+
+_cache = SourceModelCache()
+
+def get_source_model(path: str) -> SourceModel:
+    return _cache.get(path)
+
+def invalidate_source_model(path: str):
+    _cache.invalidate(path)
@@ -0,0 +1,99 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tools import Toolset, tests_passed
+from workspace import Workspace
+from fix_gate import extract_code, check_fix
+
+logger = logging.getLogger(__name__)
+
+def validate_candidate(source: str, toolset: Toolset, test_script: str, algo_name: str,
+                       scratch_root: str = None) -> bool:
+    """Run the tests (fail-fast) on `source` in a throwaway Workspace, sharing toolset's runner and cache."""
+    with Workspace(root=scratch_root, prefix='candidate_') as ws:
+        with open(ws.work_file, 'w') as f:
+            f.write(source)
+        tools = Toolset(toolset.code_dir, toolset.test_dir, work_dir=ws.path,
+                        test_runner=toolset.test_runner, test_cache=toolset.test_cache)
+        output = tools.run_tests(test_script, algo_name, fail_fast=True)
+    return tests_passed(output)
+
+class SpeculativeFixer:
+    """
+    Asks the LLM for n candidate fixes at once (spread over temperatures),
+    validates all of them concurrently, each in its own Workspace, and returns
+    the first one whose tests pass.
+    """
+    def __init__(self, llm, toolset: Toolset, test_script: str, n_candidates: int = 4,
+                 temperatures: list = None, scratch_root: str = None):
+        self.llm          = llm
+        self.toolset      = toolset
+        self.test_script  = test_script
+        self.n_candidates = n_candidates
+        self.temperatures = temperatures or [
+            0.2 + 0.8 * i / max(1, n_candidates - 1) for i in range(n_candidates)
+        ]
+        self.scratch_root = scratch_root
+
+    def generate_candidates(self, prompt: str, usage: list = None) -> list:
+        """Fence-stripped, de-duplicated candidates; each call's (output, usage dict) is appended to usage."""
+        temperatures = self.temperatures[:self.n_candidates]
+        usages = [{} for _ in temperatures]
+        with ThreadPoolExecutor(max_workers=self.n_candidates) as pool:
+            futures = [pool.submit(self.llm.generate, prompt, temperature=t, usage=u)
+                       for t, u in zip(temperatures, usages)]
+            candidates = []
+            for fut, u in zip(futures, usages):
+                try:
+                    output = fut.result()
+                except Exception as e:
+                    logger.warning(f"candidate generation failed: {e}")
+                    continue
+                if usage is not None:
+                    usage.append((output, u))
+                candidates.append(extract_code(output))
+        # Identical candidates only need one test run
+        return list(dict.fromkeys(c for c in candidates if c.strip()))
+
+    def _validate(self, source: str, algo_name: str) -> tuple:
+        return source, validate_candidate(source, self.toolset, self.test_script, algo_name, self.scratch_root)
+
+    def propose(self, prompt: str, algo_name: str, usage: list = None, original: str = None) -> dict:
+        """
+        Returns {'source', 'verified', 'candidates', 'validated', 'rejected'}: the first
+        candidate to pass its tests (verified=True) or, if none pass, the
+        lowest-temperature one. Validation stops as soon as one passes.
+        usage collects the (output, usage) of every LLM call, as in generate_candidates;
+        original (the unrepaired program) bounds the size of a candidate's edit.
+        """
+        candidates = self.generate_candidates(prompt, usage)
+        report = {'source': candidates[0] if candidates else '', 'verified': False,
+                  'candidates': len(candidates), 'validated': 0, 'rejected': 0}
+        # Candidates that fail the static checks are not worth a test run
+        try:
+            with open(self.toolset.work_file) as f:
+                current = f.read()
+        except OSError:
+            current = None
+        checked = [check_fix(c, original or current, current, algo_name) for c in candidates]
+        # Different edit scripts can produce the same program: test it once
+        candidates = list(dict.fromkeys(source for source, reason in checked if reason is None))
+        report['rejected'] = sum(1 for _, reason in checked if reason is not None)
+        if not candidates:
+            return report
+        # One validation per runner worker, so a candidate waiting for the runner can still be cancelled
+        workers = getattr(self.toolset.test_runner, 'workers', 1) or 1
+        pool = ThreadPoolExecutor(max_workers=min(len(candidates), workers))
+        try:
+            futures = [pool.submit(self._validate, c, algo_name) for c in candidates]
+            for fut in as_completed(futures):
+                source, passed = fut.result()
+                report['validated'] += 1
+                if passed:
+                    report.update(source=source, verified=True)
+                    break
+        finally:
+            # Running validations are fail-fast and hold a runner worker: let them finish
+            pool.shutdown(wait=True, cancel_futures=True)
+        logger.info(f"speculative fix: verified={report['verified']} after "
+                    f"{report['validated']}/{report['candidates']} candidates")
+        return report
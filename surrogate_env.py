@@ -0,0 +1,166 @@
+import time
+import random
+import bisect
+import argparse
+from collections import Counter
+import gym
+from gym import spaces
+import numpy as np
+from observation import STATES, TOOL_NAMES, DEFECTS, OBS_DIM, encode, state_index
+from trajectories import TrajectoryStore, TRAJECTORY_DIR, episode_reward
+
+TERMINAL = {state_index('GOAL_ACCOMPLISHED'), state_index('FAILED')}
+INIT = state_index('INIT')
+MIN_COUNT = 5
+
+# Conditioning contexts from most to least specific; a lookup backs off to the
+# first one seen at least MIN_COUNT times. Key fields index into
+# (state, older tool, newer tool, defect, action). Every context keeps the
+# state and the action, so a tool never tried in a state gets no credit there.
+BACKOFF = [(0, 1, 2, 3, 4), (0, 2, 3, 4), (0, 3, 4), (0, 2, 4), (0, 4)]
+
+def last_two(obs: np.ndarray) -> tuple:
+    """(older, newer) tool indices in RepairEnv observations, -1 for empty slots."""
+    n = len(TOOL_NAMES)
+    slots = []
+    for slot in range(2):
+        block = obs[:, len(STATES) + slot * n:len(STATES) + (slot + 1) * n]
+        slots.append(np.where(block.any(axis=1), block.argmax(axis=1), -1))
+    return slots[0], slots[1]
+
+class SurrogateModel:
+    """
+    Next-FSM-state distribution of a repair session given the state, the last
+    two tools, the program's DefectClass and the chosen tool, estimated by
+    counting recorded transitions (trajectories.TrajectoryStore) with backoff
+    to coarser contexts where data is sparse.
+    """
+    def __init__(self, keys: np.ndarray, next_state: np.ndarray, episode_defects: list,
+                 min_count: int = MIN_COUNT):
+        self.min_count = min_count
+        self.counts = []
+        for fields in BACKOFF:
+            table = {}
+            rows, counts = np.unique(np.column_stack([keys[:, list(fields)], next_state]),
+                                     axis=0, return_counts=True)
+            for row, count in zip(rows.tolist(), counts.tolist()):
+                table.setdefault(tuple(row[:-1]), Counter())[row[-1]] = count
+            self.counts.append(table)
+        self.defects = episode_defects or [-1]
+        self._cumulative = {}
+
+    @classmethod
+    def from_store(cls, path: str = TRAJECTORY_DIR, min_count: int = MIN_COUNT) -> 'SurrogateModel':
+        cols = TrajectoryStore(path).columns()
+        known = np.asarray(cols['action']) >= 0
+        older, newer = last_two(np.asarray(cols['obs']))
+        keys = np.column_stack([cols['state'], older, newer, cols['defect'], cols['action']])[known]
+        first_steps = np.asarray(cols['step']) == 0
+        return cls(keys.astype(np.int64), np.asarray(cols['next_state'], dtype=np.int64)[known],
+                   np.asarray(cols['defect'])[first_steps].tolist(), min_count)
+
+    def distribution(self, key: tuple) -> dict:
+        """Next-state counts for key = (state, older, newer, defect, action), after backoff."""
+        fallback = None
+        for fields, table in zip(BACKOFF, self.counts):
+            counts = table.get(tuple(key[i] for i in fields))
+            if counts is None:
+                continue
+            if sum(counts.values()) >= self.min_count:
+                return counts
+            fallback = fallback or counts
+        # Never seen in this state: the tool changes nothing
+        return fallback or {key[0]: 1}
+
+    def sample(self, key: tuple, rng: random.Random) -> int:
+        cumulative = self._cumulative.get(key)
+        if cumulative is None:
+            counts = self.distribution(key)
+            states = list(counts)
+            totals, running = [], 0
+            for s in states:
+                running += counts[s]
+                totals.append(running)
+            cumulative = self._cumulative[key] = (states, totals)
+        states, totals = cumulative
+        return states[bisect.bisect_right(totals, rng.random() * totals[-1])]
+
+class SurrogateRepairEnv(gym.Env):
+    """
+    Stand-in for RepairEnv with the same observation and action spaces and
+    rewards, stepping a SurrogateModel instead of the LLM and the tests. Each
+    episode draws a DefectClass from the recorded episodes. Meant for fast
+    policy iteration; validate the result on RepairEnv.
+    """
+    def __init__(self, model: SurrogateModel, max_cycles: int = 10, seed: int = None):
+        super().__init__()
+        self.model = model
+        self.tool_names = TOOL_NAMES
+        self.n_actions = len(TOOL_NAMES)
+        self.obs_dim = OBS_DIM
+        self.action_space = spaces.Discrete(self.n_actions)
+        self.observation_space = spaces.Box(0, 1, shape=(self.obs_dim,), dtype=np.float32)
+        self.max_cycles = max_cycles
+        self._rng = random.Random(seed)
+        self.reset()
+
+    def seed(self, seed=None):
+        self._rng = random.Random(seed)
+        return [seed]
+
+    def _get_obs(self):
+        return np.asarray(encode(self.state, tuple(self.tools[-2:])), dtype=np.float32)
+
+    def reset(self):
+        self.defect = self._rng.choice(self.model.defects)
+        self.state = INIT
+        self.tools = []
+        self.cycle_count = 0
+        return self._get_obs()
+
+    def step(self, action: int):
+        # Same slots as the observation: a lone previous tool sits in the older one
+        older, newer = (self.tools[-2:] + [-1, -1])[:2]
+        key = (self.state, older, newer, self.defect, int(action))
+        self.state = self.model.sample(key, self._rng)
+        self.tools.append(int(action))
+        self.cycle_count += 1
+        done = self.state in TERMINAL or self.cycle_count >= self.max_cycles
+        reward = episode_reward(STATES[self.state]) if done else 0.0
+        defect = DEFECTS[self.defect].value if self.defect >= 0 else None
+        return self._get_obs(), reward, done, {'defect': defect}
+
+    def render(self, mode='human'):
+        pass
+
+
+def make_surrogate_env(model: SurrogateModel, rank: int = 0, seed: int = 0, **kwargs):
+    """Env factory for DummyVecEnv / SubprocVecEnv, like repair_env.make_env."""
+    def _init():
+        return SurrogateRepairEnv(model, seed=seed + rank, **kwargs)
+    return _init
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fit the surrogate env from recorded trajectories and time it.")
+    parser.add_argument('--trajectories', default=TRAJECTORY_DIR)
+    parser.add_argument('--min-count', type=int, default=MIN_COUNT)
+    parser.add_argument('--steps', type=int, default=200000, help="Random-policy steps to time")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = SurrogateModel.from_store(args.trajectories, args.min_count)
+    print(f"fitted from {len(TrajectoryStore(args.trajectories))} transitions in {time.perf_counter() - start:.2f}s")
+    env = SurrogateRepairEnv(model, seed=args.seed)
+    rng = random.Random(args.seed)
+    episodes, solved = 0, 0
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        _, reward, done, _ = env.step(rng.randrange(env.n_actions))
+        if done:
+            episodes += 1
+            solved += reward > 0
+            env.reset()
+    elapsed = time.perf_counter() - start
+    print(f"{args.steps / elapsed * 60:,.0f} steps/min; random policy solved {solved}/{episodes} episodes")
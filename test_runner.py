@@ -0,0 +1,395 @@
+import os
+import io
+import sys
+import json
+import time
+import queue
+import signal
+import atexit
+import argparse
+import threading
+import contextlib
+import subprocess
+import importlib.util
+import multiprocessing
+import statistics
+import types
+
+TIMEOUT_MSG = "Test execution timed out."
+# Budget of a case that has not passed yet (no measured baseline)
+CASE_TIMEOUT = 0.5
+# A case with a baseline gets BASELINE_FACTOR times its slowest passing run, at least MIN_CASE_TIMEOUT
+BASELINE_FACTOR = 10
+MIN_CASE_TIMEOUT = 0.05
+# A run stops after this many timed-out cases
+MAX_TIMEOUTS = 2
+
+class CaseTimeout(BaseException):
+    """Raised inside a test case that exceeded its budget (BaseException so candidates can't swallow it)."""
+
+def _on_alarm(signum, frame):
+    raise CaseTimeout()
+
+@contextlib.contextmanager
+def time_limit(seconds: float):
+    """Interrupt the body after `seconds` via SIGALRM; a no-op off the main thread."""
+    if (not seconds or not hasattr(signal, 'setitimer')
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def load_testcases(testcase_path: str) -> list:
+    """QuixBugs JSON test cases: one `[input_args, expected_output]` document per line."""
+    cases = []
+    with open(testcase_path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            test_in, test_out = json.loads(line)
+            if not isinstance(test_in, list):
+                test_in = [test_in]
+            cases.append((test_in, test_out))
+    return cases
+
+_module_counter = 0
+
+def load_candidate(work_file: str, entry_point: str):
+    """Import work_file as a fresh, unregistered module and return its entry point."""
+    global _module_counter
+    _module_counter += 1
+    spec = importlib.util.spec_from_file_location(f"_candidate_{_module_counter}", work_file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, entry_point)
+
+def _normalize(value):
+    if isinstance(value, types.GeneratorType):
+        value = list(value)
+    try:
+        # Compare the way the JSON expectations are written (tuples become lists, ...)
+        return json.loads(json.dumps(value))
+    except (TypeError, ValueError):
+        return value
+
+def case_budget(name: str, case_timeout: float, baselines: dict = None) -> float:
+    """Time budget of one case: BASELINE_FACTOR x its slowest passing run if known, else case_timeout."""
+    baseline = (baselines or {}).get(name)
+    if baseline is None:
+        return case_timeout
+    return max(MIN_CASE_TIMEOUT, BASELINE_FACTOR * baseline)
+
+def run_cases(work_file: str, testcase_path: str, algo_name: str, case_timeout: float = CASE_TIMEOUT,
+              fail_fast: bool = False, priority: list = None, baselines: dict = None,
+              timings: dict = None) -> str:
+    """
+    Run the JSON test cases against work_file in this interpreter. Every case
+    prints one `test_<algo>_<i> PASSED|FAILED` line, which Toolset.extract_tests parses.
+
+    Each case gets its own budget (see case_budget; baselines maps test names to
+    earlier passing times) and timings, if given, receives the time of every
+    passing case. Cases named in priority (usually the previously failing ones)
+    run first. fail_fast stops at the first failure when only pass/fail matters;
+    any run stops after MAX_TIMEOUTS timed-out cases.
+    """
+    try:
+        cases = load_testcases(testcase_path)
+    except Exception as e:
+        return f"Error loading test cases: {e}"
+
+    out = []
+    sink = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(sink), time_limit(case_timeout):
+            func = load_candidate(work_file, algo_name)
+    except CaseTimeout:
+        return f"test_{algo_name}_import FAILED: timed out after {case_timeout}s\n"
+    except Exception as e:
+        return f"test_{algo_name}_import FAILED: {type(e).__name__}: {e}\n"
+
+    names = [f"test_{algo_name}_{i}" for i in range(len(cases))]
+    first = [names.index(n) for n in (priority or []) if n in names]
+    order = list(dict.fromkeys(first + list(range(len(cases)))))
+
+    passed = run = timeouts = 0
+    for i in order:
+        test_in, expected = cases[i]
+        name = names[i]
+        budget = case_budget(name, case_timeout, baselines)
+        run += 1
+        failure = None
+        try:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(sink), time_limit(budget):
+                got = _normalize(func(*test_in))
+            elapsed = time.perf_counter() - start
+            if got != expected:
+                failure = f"{algo_name}{tuple(test_in)!r} returned {got!r}, expected {expected!r}"
+        except CaseTimeout:
+            failure = f"timed out after {budget:.3g}s"
+            timeouts += 1
+        except Exception as e:
+            failure = f"{type(e).__name__}: {e}"
+        finally:
+            sink.seek(0)
+            sink.truncate()
+        if failure is None:
+            passed += 1
+            out.append(f"{name} PASSED")
+            if timings is not None:
+                timings[name] = elapsed
+            continue
+        out.append(f"{name} FAILED: {failure}")
+        if fail_fast:
+            out.append(f"Stopped after first failure ({run}/{len(cases)} cases run)")
+            break
+        if timeouts >= MAX_TIMEOUTS:
+            out.append(f"Stopped after {timeouts} timed-out cases ({run}/{len(cases)} cases run)")
+            break
+    out.append(f"{passed}/{len(cases)} tests passed")
+    return "\n".join(out) + "\n"
+
+
+def _worker_loop(conn):
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        try:
+            if request.pop('coverage', False):
+                from fault_localization import collect_coverage
+                output = collect_coverage(**request)
+            else:
+                timings = {}
+                output = (run_cases(**request, timings=timings), timings)
+        except BaseException as e:
+            output = f"Error in run_tests: {type(e).__name__}: {e}"
+        conn.send(output)
+
+class CaseBaselines:
+    """Slowest passing time of every test case seen by a runner, per test case file."""
+    def __init__(self):
+        self._times = {}
+        self._lock = threading.Lock()
+
+    def get(self, testcase_path: str) -> dict:
+        with self._lock:
+            return dict(self._times.get(os.path.abspath(testcase_path), {}))
+
+    def record(self, testcase_path: str, timings: dict):
+        with self._lock:
+            times = self._times.setdefault(os.path.abspath(testcase_path), {})
+            for name, seconds in timings.items():
+                times[name] = max(seconds, times.get(name, 0.0))
+
+class WarmTestRunner:
+    """
+    Pool of pre-forked test workers. Each worker imports the harness once and
+    then only loads the candidate module per request, instead of paying a fresh
+    interpreter start per run. A worker that exceeds the timeout is killed and
+    replaced. Passing case times are kept as baselines for later budgets.
+    """
+    def __init__(self, workers: int = 1, timeout: float = 30, case_timeout: float = CASE_TIMEOUT):
+        self.timeout = timeout
+        self.case_timeout = case_timeout
+        self.baselines = CaseBaselines()
+        methods = multiprocessing.get_all_start_methods()
+        self._ctx = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+        self._idle = queue.Queue()
+        self._closed = False
+        self.workers = 0
+        self._grow_lock = threading.Lock()
+        self.grow(workers)
+
+    def grow(self, workers: int):
+        """Spawn workers until the pool has at least `workers` of them."""
+        with self._grow_lock:
+            while not self._closed and self.workers < workers:
+                self._idle.put(self._spawn())
+                self.workers += 1
+
+    def _spawn(self):
+        parent, child = self._ctx.Pipe()
+        proc = self._ctx.Process(target=_worker_loop, args=(child,), daemon=True)
+        proc.start()
+        child.close()
+        return proc, parent
+
+    def _retire(self, worker):
+        proc, conn = worker
+        proc.kill()
+        proc.join()
+        conn.close()
+
+    def run(self, work_file: str, testcase_path: str, algo_name: str, timeout: float = None,
+            fail_fast: bool = False, priority: list = None) -> str:
+        output = self._request({'work_file': os.path.abspath(work_file),
+                                'testcase_path': os.path.abspath(testcase_path),
+                                'algo_name': algo_name,
+                                'case_timeout': self.case_timeout,
+                                'fail_fast': fail_fast,
+                                'priority': priority,
+                                'baselines': self.baselines.get(testcase_path)}, timeout)
+        if isinstance(output, tuple):
+            output, timings = output
+            self.baselines.record(testcase_path, timings)
+        return output
+
+    def coverage(self, work_file: str, testcase_path: str, algo_name: str, timeout: float = None,
+                 timed_out: list = None) -> dict:
+        """Per-case line coverage of work_file (see fault_localization.collect_coverage)."""
+        output = self._request({'coverage': True,
+                                'work_file': os.path.abspath(work_file),
+                                'testcase_path': os.path.abspath(testcase_path),
+                                'algo_name': algo_name,
+                                'case_timeout': self.case_timeout,
+                                'timed_out': timed_out}, timeout)
+        return output if isinstance(output, dict) else {'error': output}
+
+    def _request(self, request: dict, timeout: float = None):
+        worker = self._idle.get()
+        proc, conn = worker
+        try:
+            conn.send(request)
+            if conn.poll(timeout or self.timeout):
+                return conn.recv()
+            self._retire(worker)
+            worker = self._spawn()
+            return TIMEOUT_MSG
+        except (EOFError, OSError) as e:
+            self._retire(worker)
+            worker = self._spawn()
+            return f"Error in run_tests: test worker died ({e})"
+        finally:
+            self._idle.put(worker)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        while not self._idle.empty():
+            proc, conn = self._idle.get_nowait()
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            proc.join(timeout=1)
+            if proc.is_alive():
+                proc.kill()
+            conn.close()
+
+
+class InProcessTestRunner:
+    """
+    Same interface as WarmTestRunner but runs the cases in the calling process.
+    For callers that may not fork, e.g. envs inside stable-baselines3's daemonic
+    SubprocVecEnv workers; per-case timeouts still apply on the main thread.
+    """
+    def __init__(self, case_timeout: float = CASE_TIMEOUT):
+        self.case_timeout = case_timeout
+        self.baselines = CaseBaselines()
+
+    def run(self, work_file: str, testcase_path: str, algo_name: str, timeout: float = None,
+            fail_fast: bool = False, priority: list = None) -> str:
+        timings = {}
+        try:
+            output = run_cases(work_file, testcase_path, algo_name, case_timeout=self.case_timeout,
+                               fail_fast=fail_fast, priority=priority,
+                               baselines=self.baselines.get(testcase_path), timings=timings)
+        except Exception as e:
+            return f"Error in run_tests: {type(e).__name__}: {e}"
+        self.baselines.record(testcase_path, timings)
+        return output
+
+    def coverage(self, work_file: str, testcase_path: str, algo_name: str, timeout: float = None,
+                 timed_out: list = None) -> dict:
+        from fault_localization import collect_coverage
+        try:
+            return collect_coverage(work_file, testcase_path, algo_name, case_timeout=self.case_timeout,
+                                    timed_out=timed_out)
+        except Exception as e:
+            return {'error': f"Error in run_fault_localization: {type(e).__name__}: {e}"}
+
+    def close(self):
+        pass
+
+def make_test_runner(workers: int = 1, case_timeout: float = CASE_TIMEOUT):
+    """A private runner: warm worker processes where this process may fork them."""
+    if multiprocessing.current_process().daemon:
+        return InProcessTestRunner(case_timeout=case_timeout)
+    return WarmTestRunner(workers=workers, case_timeout=case_timeout)
+
+
+# case_timeout -> warm runner of this process (_runners_pid)
+_runners = {}
+_runners_pid = None
+_runner_lock = threading.Lock()
+
+def get_test_runner(workers: int = 1, case_timeout: float = CASE_TIMEOUT) -> WarmTestRunner:
+    """
+    Process-wide warm runner for case_timeout; forked evaluation workers each
+    get their own. Asking for more workers than it has grows the pool.
+    """
+    global _runners, _runners_pid
+    with _runner_lock:
+        if _runners_pid != os.getpid():
+            _runners, _runners_pid = {}, os.getpid()
+        runner = _runners.get(case_timeout)
+        if runner is None:
+            runner = _runners[case_timeout] = WarmTestRunner(workers=workers, case_timeout=case_timeout)
+            atexit.register(runner.close)
+    runner.grow(workers)
+    return runner
+
+
+def benchmark(work_file: str, testcase_path: str, algo_name: str, runs: int = 20) -> dict:
+    """Per-call latency of a cold `python test_runner.py` subprocess vs. the warm pool."""
+    def timed(fn):
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        return {'mean_ms': 1000 * statistics.mean(samples),
+                'median_ms': 1000 * statistics.median(samples),
+                'runs_per_s': runs / sum(samples)}
+
+    cold = timed(lambda: subprocess.run(
+        [sys.executable, os.path.abspath(__file__), work_file, testcase_path, algo_name],
+        capture_output=True, text=True, timeout=30))
+    runner = WarmTestRunner(workers=1)
+    try:
+        warm = timed(lambda: runner.run(work_file, testcase_path, algo_name))
+    finally:
+        runner.close()
+    return {'subprocess': cold, 'warm': warm, 'speedup': cold['mean_ms'] / warm['mean_ms']}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run QuixBugs JSON test cases against a candidate file.")
+    parser.add_argument("work_file")
+    parser.add_argument("testcase_path")
+    parser.add_argument("algo_name", nargs="?", help="Entry point (default: testcase file name)")
+    parser.add_argument("--case-timeout", type=float, default=CASE_TIMEOUT,
+                        help="Budget in seconds per test case without a baseline")
+    parser.add_argument("--fail-fast", action="store_true", help="Stop at the first failing case")
+    parser.add_argument("--bench", type=int, metavar="RUNS",
+                        help="Compare subprocess vs. warm-pool throughput over RUNS calls")
+    args = parser.parse_args()
+    algo = args.algo_name or os.path.splitext(os.path.basename(args.testcase_path))[0]
+
+    if args.bench:
+        print(json.dumps(benchmark(args.work_file, args.testcase_path, algo, args.bench), indent=2))
+    else:
+        sys.stdout.write(run_cases(args.work_file, args.testcase_path, algo,
+                                   case_timeout=args.case_timeout, fail_fast=args.fail_fast))
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from async_llm import RateLimitedLLM
+from llm_cache import CachingLLM
+
+
+class SlowLLM:
+    """Records how many calls overlap."""
+    model_name = 'slow'
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.active = self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        with self._lock:
+            self.active -= 1
+        return f"answer to {prompt}"
+
+
+def test_sync_calls_share_the_concurrency_cap():
+    backend = SlowLLM()
+    llm = RateLimitedLLM(backend, max_concurrency=2, requests_per_minute=6000)
+    try:
+        # No agenerate has run yet: the sync path must still be limited
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            answers = list(pool.map(llm.generate, [f"p{i}" for i in range(6)]))
+    finally:
+        llm.close()
+    assert answers == [f"answer to p{i}" for i in range(6)]
+    assert backend.peak == 2 and llm.requests == 6
+
+
+def test_sync_calls_on_an_event_loop_pass_the_token_bucket():
+    llm = RateLimitedLLM(SlowLLM(latency=0), max_concurrency=4, requests_per_minute=600, burst=1)
+
+    async def session():
+        # A blocking call from a coroutine, as a tool running on the loop thread would make
+        return [llm.generate("p") for _ in range(3)] + [await llm.agenerate("q")]
+
+    start = time.perf_counter()
+    try:
+        answers = asyncio.run(session())
+    finally:
+        llm.close()
+    # One token up front, then one every 0.1 s
+    assert time.perf_counter() - start >= 0.25
+    assert answers[-1] == "answer to q" and llm.requests == 4
+
+
+def test_cache_lookups_run_off_the_event_loop(tmp_path):
+    cache = CachingLLM(SlowLLM(latency=0), path=str(tmp_path / 'llm.sqlite'))
+    lookup, threads = cache._lookup, []
+
+    def recording_lookup(*args):
+        threads.append(threading.current_thread())
+        return lookup(*args)
+
+    cache._lookup = recording_lookup
+
+    async def twice():
+        return [await cache.agenerate("p"), await cache.agenerate("p")], threading.current_thread()
+
+    answers, loop_thread = asyncio.run(twice())
+    assert answers == ["answer to p"] * 2 and cache.hits == 1
+    assert threads and loop_thread not in threads
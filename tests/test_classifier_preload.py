@@ -0,0 +1,44 @@
+import classifier
+from defect_classes import DefectClass
+
+
+class StubClassifier:
+    def load(self):
+        raise AssertionError("a stub must not be loaded")
+
+
+def test_preload_skips_registered_stub(monkeypatch):
+    monkeypatch.setattr(classifier, '_registry', {})
+    stub = classifier.register_classifier(StubClassifier())
+    assert classifier.preload_classifier(snippets=["def f(): pass"]) is stub
+
+
+def test_preload_skips_model_when_predictions_are_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(classifier, '_registry', {})
+    clf = classifier.register_classifier(classifier.DefectClassifier(cache_path=str(tmp_path / 'p.sqlite')))
+    snippet = "def f(x):\n    return x + 1\n"
+    clf.cache.put_many({classifier.content_hash(clf.revision, snippet): DefectClass.OFF_BY_ONE.value})
+    monkeypatch.setattr(clf, 'load', lambda: (_ for _ in ()).throw(AssertionError("loaded")))
+    assert classifier.preload_classifier(snippets=[snippet]) is clf
+    assert not clf.loaded
+
+
+def registered_backend():
+    return classifier.get_classifier().backend
+
+
+def test_configure_keeps_a_matching_classifier(monkeypatch):
+    monkeypatch.setattr(classifier, '_registry', {})
+    clf = classifier.configure_classifier('int8', 2)
+    assert classifier.configure_classifier('int8', 2) is clf
+    assert classifier.configure_classifier('onnx').backend == 'onnx'
+    assert classifier.get_classifier().backend == 'onnx'
+
+
+def test_spawned_workers_get_the_backend_from_the_initializer():
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=classifier.configure_classifier, initargs=('int8', None)) as pool:
+        assert pool.submit(registered_backend).result(timeout=60) == 'int8'
@@ -0,0 +1,100 @@
+import os
+import pickle
+import time
+
+import code_index
+from code_index import TrigramIndex, linear_search
+from tools import Toolset
+
+QUERIES = ["binary_search", "range(", "return", "xy", "needle"]
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def make_corpus(root):
+    """A small tree, aged out of the racy window like a checkout nobody is editing."""
+    write(root / 'a.py', "def binary_search(arr, x):\n    return arr.index(x)\n")
+    write(root / 'pkg' / 'b.py', "for i in range(3):\n    print(i)\n")
+    write(root / 'pkg' / 'deep' / 'c.py', "def helper():\n    return binary_search([1], 1)\n")
+    write(root / 'notes.txt', "binary_search in a text file is not indexed\n")
+    past = time.time() - 60
+    for dirpath, _, files in os.walk(root):
+        for name in files + ['.']:
+            os.utime(os.path.join(dirpath, name), (past, past))
+
+
+def assert_same(index, root):
+    for query in QUERIES:
+        assert index.search(query) == linear_search(str(root), query), query
+
+
+def test_index_matches_linear_search_after_file_changes(tmp_path):
+    root = tmp_path / 'code'
+    make_corpus(root)
+    index = TrigramIndex(str(root), index_path=str(tmp_path / 'index.json'))
+    assert_same(index, root)
+
+    write(root / 'pkg' / 'new.py', "needle = binary_search(xs, 3)\n")
+    assert_same(index, root)
+    (root / 'a.py').unlink()
+    assert_same(index, root)
+    os.rename(root / 'pkg' / 'b.py', root / 'pkg' / 'renamed.py')
+    assert_same(index, root)
+    write(root / 'added' / 'sub' / 'd.py', "xy = range(2)\n")
+    assert_same(index, root)
+    for path in sorted((root / 'pkg' / 'deep').iterdir()):
+        path.unlink()
+    (root / 'pkg' / 'deep').rmdir()
+    assert_same(index, root)
+
+
+def test_in_place_writes_through_toolset_are_reindexed(tmp_path, monkeypatch):
+    monkeypatch.setattr(code_index, '_indexes', {})
+    monkeypatch.setattr(code_index, 'INDEX_DIR', str(tmp_path / 'indexes'))
+    root = tmp_path / 'code'
+    make_corpus(root)
+    index = code_index.get_code_index(str(root))
+    assert index.search("needle") == []
+    toolset = Toolset(str(root), str(tmp_path), work_dir=str(root / 'pkg'))
+    toolset.write_fix(str(root / 'pkg' / 'b.py'), "needle = 1\n")
+    assert index.search("needle") == [(str(root / 'pkg' / 'b.py'), 1, "needle = 1")]
+    assert_same(index, root)
+
+
+def test_refresh_stats_directories_not_files(tmp_path, monkeypatch):
+    root = tmp_path / 'code'
+    make_corpus(root)
+    index = TrigramIndex(str(root), index_path=str(tmp_path / 'index.json'))
+    index.refresh()
+    calls = []
+    real_stat = os.stat
+    monkeypatch.setattr(code_index.os, 'stat', lambda p, *a, **k: calls.append(str(p)) or real_stat(p, *a, **k))
+    assert index.refresh() == 0
+    assert sorted(calls) == sorted(str(d) for d in (root, root / 'pkg', root / 'pkg' / 'deep'))
+
+
+def test_index_is_stored_as_json_and_reloaded(tmp_path):
+    root = tmp_path / 'code'
+    make_corpus(root)
+    path = tmp_path / 'index.json'
+    TrigramIndex(str(root), index_path=str(path)).refresh()
+    reloaded = TrigramIndex(str(root), index_path=str(path))
+    assert set(reloaded.files) == {str(root / 'a.py'), str(root / 'pkg' / 'b.py'), str(root / 'pkg' / 'deep' / 'c.py')}
+    assert_same(reloaded, root)
+
+
+def test_a_pickled_index_file_is_never_unpickled(tmp_path):
+    class Boom:
+        def __reduce__(self):
+            return (os.remove, (str(tmp_path / 'canary'),))
+    (tmp_path / 'canary').write_text("")
+    path = tmp_path / 'index.json'
+    path.write_bytes(pickle.dumps({'version': code_index.INDEX_VERSION, 'files': Boom()}))
+    root = tmp_path / 'code'
+    make_corpus(root)
+    index = TrigramIndex(str(root), index_path=str(path))
+    assert (tmp_path / 'canary').exists()
+    assert_same(index, root)
@@ -0,0 +1,69 @@
+import pytest
+
+from edits import apply_edits, edit_script, parse_edits
+from fix_gate import check_fix
+from tools import Toolset
+
+SOURCE = "def bitcount(n):\n    count = 0\n    while n:\n        n ^= n - 1\n        count += 1\n    return count\n"
+FIXED = SOURCE.replace("n ^= n - 1", "n &= n - 1")
+
+
+def test_replace_script_and_tool_args_give_the_same_source():
+    script = "REPLACE LINES 4-4\n        n &= n - 1\nEND\n"
+    args = [{'start_line': 4, 'end_line': 4, 'new_text': "        n &= n - 1"}]
+    assert apply_edits(SOURCE, script) == apply_edits(SOURCE, args) == FIXED
+
+
+def test_insert_and_delete():
+    inserted = apply_edits(SOURCE, "INSERT AFTER LINE 1\n    assert n >= 0\nEND\n")
+    assert inserted.splitlines()[1] == "    assert n >= 0"
+    assert apply_edits(SOURCE, [{'start_line': 2, 'end_line': 2, 'new_text': ''}]) == SOURCE.replace(
+        "    count = 0\n", "")
+
+
+def test_line_numbers_refer_to_the_original_source():
+    script = "REPLACE LINES 2-2\n    count = 0\n    seen = 0\nEND\nREPLACE LINES 4-4\n        n &= n - 1\nEND\n"
+    assert apply_edits(SOURCE, script) == FIXED.replace("    count = 0\n", "    count = 0\n    seen = 0\n")
+
+
+@pytest.mark.parametrize('edits, message', [
+    ([{'start_line': 0, 'end_line': 1, 'new_text': 'x'}], "outside the file"),
+    ([{'start_line': 6, 'end_line': 7, 'new_text': 'x'}], "outside the file"),
+    ([{'start_line': 4, 'end_line': 2, 'new_text': 'x'}], "outside the file"),
+    ([{'start_line': 2, 'end_line': 4, 'new_text': 'x'}, {'start_line': 4, 'end_line': 5, 'new_text': 'y'}],
+     "overlaps"),
+    ("REPLACE LINES 4-4\n        n &= n - 1\n", "no END"),
+    ("n &= n - 1\n", "expected REPLACE LINES"),
+    ([{'end_line': 4}], "integer start_line"),
+    ([], "no edits"),
+])
+def test_invalid_edits_are_rejected(edits, message):
+    with pytest.raises(ValueError, match=message):
+        apply_edits(SOURCE, edits)
+
+
+def test_numbered_prefixes_are_stripped():
+    assert parse_edits("REPLACE LINES 4-4\n  4 |         n &= n - 1\nEND\n") == [(4, 4, ["        n &= n - 1\n"])]
+
+
+def test_edit_script_round_trips():
+    assert apply_edits(SOURCE, edit_script(SOURCE, FIXED)) == FIXED
+    assert edit_script(SOURCE, SOURCE) == ""
+
+
+def test_gate_expands_and_rejects_edit_scripts():
+    source, reason = check_fix("```\nREPLACE LINES 4-4\n        n &= n - 1\nEND\n```", SOURCE, SOURCE, 'bitcount')
+    assert (source, reason) == (FIXED, None)
+    _, reason = check_fix("REPLACE LINES 9-9\nx\nEND\n", SOURCE, SOURCE, 'bitcount')
+    assert reason.startswith("invalid line edits")
+
+
+def test_apply_edits_tool_writes_and_reports(tmp_path):
+    (tmp_path / 'current_program.py').write_text(SOURCE)
+    toolset = Toolset(str(tmp_path), str(tmp_path), work_dir=str(tmp_path))
+    diff = toolset.apply_edits('current_program.py', [{'start_line': 4, 'end_line': 4, 'new_text': "        n &= n - 1"}])
+    assert "+        n &= n - 1" in diff
+    assert (tmp_path / 'current_program.py').read_text() == FIXED
+    assert toolset.apply_edits('current_program.py', [{'start_line': 40, 'new_text': 'x'}]).startswith(
+        "Error in apply_edits: lines 40-40 are outside the file")
+    assert toolset._extract_method_lines('current_program.py', 'bitcount').splitlines()[3] == "  4 |         n &= n - 1"
@@ -0,0 +1,16 @@
+import evaluate
+from results_log import load_results
+
+
+def test_sequential_sweep_records_a_crash_and_continues(monkeypatch, tmp_path):
+    def repair_program(fname, **options):
+        if fname == 'a.py':
+            raise LookupError("no recorded response")
+        return {'fixed': True, 'attempts': 1, 'diff': '', 'exact_match': True}
+
+    monkeypatch.setattr(evaluate, 'repair_program', repair_program)
+    results_path = str(tmp_path / 'results.jsonl')
+    results = evaluate.evaluate_all(['a.py', 'b.py'], results_path=results_path)
+    assert results['a.py']['error'] == 'no recorded response'
+    assert results['b.py']['fixed']
+    assert set(load_results(results_path)) == {'a.py', 'b.py'}
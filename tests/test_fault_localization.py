@@ -0,0 +1,114 @@
+import json
+import time
+
+import pytest
+
+import outcome_cache
+from defect_classes import DefectClass
+from fault_localization import collect_coverage, ochiai, rank_lines
+from fsm import RepairAgentFSM
+from Middleware import Middleware
+from prompts import build_static_prompt
+from test_runner import InProcessTestRunner
+from tools import Toolset
+
+# Line 9 is only reached by the failing cases
+SIGN = """def sign(n):
+    \"\"\"
+    Sign of n: 1, -1 or 0.
+    \"\"\"
+    if n > 0:
+        return 1
+    if n == 0:
+        return 0
+    return 1
+"""
+CASES = [[[3], 1], [[0], 0], [[-2], -1], [[-7], -1]]
+# Loops forever on every non-zero input
+SPIN = """def sign(n):
+    while n:
+        pass
+    return 0
+"""
+
+
+class RecordingClassifier:
+    def __init__(self):
+        self.snippets = []
+
+    def predict(self, snippet):
+        self.snippets.append(snippet)
+        return DefectClass.INCORRECT_OPERATOR
+
+
+def make_toolset(tmp_path, source=SIGN, cases=CASES):
+    test_dir, work_dir = tmp_path / 'tests', tmp_path / 'work'
+    test_dir.mkdir()
+    work_dir.mkdir()
+    (tmp_path / 'sign.py').write_text(source)
+    (work_dir / 'current_program.py').write_text(source)
+    (test_dir / 'sign.json').write_text("\n".join(json.dumps(c) for c in cases) + "\n")
+    return Toolset(str(tmp_path), str(test_dir), work_dir=str(work_dir), test_runner=InProcessTestRunner())
+
+
+def test_classifier_sees_the_top_ranked_lines_with_context(tmp_path):
+    toolset = make_toolset(tmp_path)
+    fsm = RepairAgentFSM(None, toolset, 'tester.py')
+    fsm.state_data['algo_name'] = 'sign'
+    fsm.state_data['bug_info'] = {'tests': ['test_sign_2']}
+    clf = RecordingClassifier()
+    mw = Middleware(None, fsm, toolset, build_static_prompt(toolset), classifier=clf)
+    assert mw._init_strategy()
+    lines = SIGN.splitlines(keepends=True)
+    assert clf.snippets == ["".join(lines[5:9])]
+    assert fsm.state_data['suspicious_lines'][0] == {'line': 9, 'score': 1.0, 'code': 'return 1'}
+
+
+def test_label_classifier_finds_the_program_a_snippet_came_from(tmp_path):
+    from benchmark import LabelClassifier
+    (tmp_path / 'sign.py').write_text(SIGN)
+    (tmp_path / 'labels.csv').write_text("filename,defect_class\nsign.py,incorrect operator\n")
+    clf = LabelClassifier(str(tmp_path / 'labels.csv'), str(tmp_path), default=DefectClass.OFF_BY_ONE)
+    snippet = "".join(SIGN.splitlines(keepends=True)[5:9])
+    assert clf.classify_batch([snippet, SIGN, "def other(): pass\n"]) == [
+        DefectClass.INCORRECT_OPERATOR, DefectClass.INCORRECT_OPERATOR, DefectClass.OFF_BY_ONE]
+
+
+def test_ochiai_ranks_the_defective_line_first(tmp_path):
+    toolset = make_toolset(tmp_path)
+    coverage = collect_coverage(toolset.work_file, str(tmp_path / 'tests' / 'sign.json'), 'sign')
+    assert [c['passed'] for c in coverage['cases']] == [True, True, False, False]
+    assert coverage['cases'][2]['lines'] == [5, 7, 9]
+    ranked = rank_lines(coverage['cases'])
+    # Line 9 runs only in failing cases; 5 and 7 also run in passing ones (ties keep file order)
+    assert [line for line, _ in ranked] == [9, 7, 5]
+    assert ranked[0][1] == 1.0
+    assert ranked[1][1] == pytest.approx(ochiai(2, 1, 2))
+    assert ranked[2][1] == pytest.approx(ochiai(2, 2, 2))
+
+
+def test_no_failing_case_means_no_ranking():
+    assert rank_lines([{'passed': True, 'lines': [1, 2]}]) == []
+    assert ochiai(0, 3, 1) == 0.0
+
+
+def test_known_timeouts_count_as_failing_and_are_cut_short(tmp_path):
+    toolset = make_toolset(tmp_path, source=SPIN)
+    testcase = str(tmp_path / 'tests' / 'sign.json')
+    start = time.perf_counter()
+    coverage = collect_coverage(toolset.work_file, testcase, 'sign', case_timeout=5,
+                                timed_out=['test_sign_0', 'test_sign_2', 'test_sign_3'])
+    assert time.perf_counter() - start < 2
+    assert [c['passed'] for c in coverage['cases']] == [False, True, False, False]
+    assert rank_lines(coverage['cases'])[0][0] == 3
+
+
+def test_localization_is_served_from_the_work_file_and_cache(tmp_path):
+    toolset = make_toolset(tmp_path)
+    toolset.test_cache = outcome_cache.TestOutcomeCache(str(tmp_path / 'outcomes.sqlite'))
+    first = toolset.run_fault_localization(file_path='sign', top=2)
+    assert [r['line'] for r in first] == [9, 7]
+    toolset._localization = None
+    assert toolset.run_fault_localization(file_path='sign', top=2) == first
+    assert toolset.test_cache.stats()['hits'] == 1
+    assert toolset.run_fault_localization(file_path='missing')[0].startswith("Error in run_fault_localization")
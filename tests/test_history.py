@@ -0,0 +1,46 @@
+from history import CommandHistory, compact_args, summarize_result, truncate
+from observation import last_tools, tool_index
+
+TEST_OUTPUT = "\n".join(
+    [f"test_bitcount_{i} FAILED: expected 1, got 2" for i in range(7)]
+    + ["test_bitcount_7 PASSED", "1/8 tests passed"]) + "\n"
+DIFF = ("--- current_program.py (original)\n+++ current_program.py (patched)\n@@ -4 +4 @@\n"
+        "-        n ^= n - 1\n+        n &= n - 1\n")
+
+
+def test_history_keeps_only_the_newest_entries():
+    history = CommandHistory(max_entries=3, shown=2)
+    for i in range(5):
+        history.append('read_range', {'start_line': i}, f"line {i}")
+    assert len(history) == 3
+    assert [e.result for e in history] == ["line 2", "line 3", "line 4"]
+    assert history.render() == ["- read_range(start_line=3): line 3", "- read_range(start_line=4): line 4"]
+    assert history[-1][0] == "read_range(start_line=4)"
+
+
+def test_results_are_cut_to_the_entry_budget():
+    history = CommandHistory(entry_tokens=10)
+    entry = history.append('extract_method', {}, "x" * 100)
+    assert entry.result == "x" * 40 + "… (+60 chars)"
+    assert truncate("short", 10) == "short"
+
+
+def test_long_args_are_elided():
+    args = {'file_path': 'current_program.py', 'new_source': "def f():\n    return 1\n", 'keyword': 'k' * 80}
+    assert compact_args(args) == f"file_path=current_program.py, new_source=<2 lines>, keyword={'k' * 60}… (+20 chars)"
+
+
+def test_test_logs_and_diffs_are_summarized():
+    summary = summarize_result('run_tests', TEST_OUTPUT)
+    assert summary.startswith("1/8 tests passed; failing: test_bitcount_0, ")
+    assert "(+2 more)" in summary
+    assert "first failure: test_bitcount_0 FAILED: expected 1, got 2" in summary
+    assert summarize_result('apply_edits', DIFF) == "changed:\n  -        n ^= n - 1\n  +        n &= n - 1"
+    assert summarize_result('extract_tests', ['test_bitcount_0']) == '["test_bitcount_0"]'
+
+
+def test_observation_reads_the_tools_of_the_last_entries():
+    history = CommandHistory()
+    for tool in ('run_tests', 'extract_method', 'apply_edits'):
+        history.append(tool, {}, "")
+    assert last_tools(history) == (tool_index('extract_method'), tool_index('write_fix'))
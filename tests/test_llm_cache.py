@@ -0,0 +1,17 @@
+from llm_cache import CachingLLM
+
+
+class EchoLLM:
+    model_name = 'echo'
+
+    def generate(self, prompt, temperature=0.2, max_output_tokens=512, prefix=None, usage=None):
+        return f"answer to {prompt}"
+
+
+def test_cache_eviction_keeps_recordings(tmp_path):
+    path = str(tmp_path / 'llm.sqlite')
+    CachingLLM(EchoLLM(), path=path, mode='record').generate("recorded")
+    cache = CachingLLM(EchoLLM(), path=path, mode='cache', max_entries=2)
+    for i in range(5):
+        cache.generate(f"filler {i}")
+    assert CachingLLM(path=path, mode='replay', model_name='echo').generate("recorded") == "answer to recorded"
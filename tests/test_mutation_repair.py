@@ -0,0 +1,65 @@
+import json
+
+from defect_classes import DefectClass
+from mutation_repair import MutationGenerator, MutationRepairer, candidate_mutations
+from test_runner import InProcessTestRunner
+from tools import Toolset
+
+# Off by one on line 5: the loop should stop at n, not n - 1
+SUM_TO = """def sum_to(n):
+    # total of 1..n
+    total = 0
+    i = 1
+    while i < n:
+        total += i
+        i += 1
+    return total
+"""
+FIXED = SUM_TO.replace("while i < n:", "while i <= n:")
+CASES = [[[1], 1], [[3], 6], [[4], 10]]
+
+
+def test_mutations_splice_into_the_original_text():
+    mutations = MutationGenerator(SUM_TO).generate(DefectClass.INCORRECT_COMPARISON_OPERATOR)
+    sources = [m[3] for m in mutations]
+    assert FIXED in sources
+    assert all("# total of 1..n" in s for s in sources)
+    assert {m[1] for m in mutations} == {5}
+
+
+def test_generated_mutations_follow_the_defect_class():
+    generator = MutationGenerator(SUM_TO)
+    assert any("total -= i" in m[3] for m in generator.generate(DefectClass.INCORRECT_ASSIGNMENT_OPERATOR))
+    assert not generator.generate(DefectClass.MISSING_FUNCTION_CALL)
+    assert any("i = 2" in m[3] for m in generator.generate(DefectClass.MISSING_OR_ADDED_1))
+
+
+def test_candidates_near_suspicious_lines_come_first():
+    ranked = candidate_mutations(SUM_TO, DefectClass.OFF_BY_ONE, 'sum_to', lines=[5])
+    assert ranked[0] == ("comparison: < -> <=", FIXED)
+    far = candidate_mutations(SUM_TO, DefectClass.OFF_BY_ONE, 'sum_to', lines=[8])
+    assert far.index(("comparison: < -> <=", FIXED)) > 0
+    assert len({source for _, source in ranked}) == len(ranked)
+    assert SUM_TO not in [source for _, source in ranked]
+
+
+def test_candidates_are_capped_and_compile():
+    ranked = candidate_mutations(SUM_TO, DefectClass.OFF_BY_ONE, max_candidates=3, broaden=True)
+    assert len(ranked) == 3
+    for _, source in ranked:
+        compile(source, "candidate", "exec")
+    assert candidate_mutations("def broken(:\n", DefectClass.OFF_BY_ONE) == []
+
+
+def test_repairer_verifies_the_passing_mutation(tmp_path):
+    test_dir, work_dir = tmp_path / 'tests', tmp_path / 'work'
+    test_dir.mkdir()
+    work_dir.mkdir()
+    (work_dir / 'current_program.py').write_text(SUM_TO)
+    (test_dir / 'sum_to.json').write_text("\n".join(json.dumps(c) for c in CASES) + "\n")
+    toolset = Toolset(str(tmp_path), str(test_dir), work_dir=str(work_dir), test_runner=InProcessTestRunner())
+    repairer = MutationRepairer(toolset, 'tester.py', parallel=2, scratch_root=str(tmp_path / 'scratch'))
+    report = repairer.repair(toolset.work_file, 'sum_to', DefectClass.OFF_BY_ONE, lines=[5])
+    assert report['verified'] and report['source'] == FIXED
+    assert report['mutation'] == "comparison: < -> <="
+    assert report['validated'] <= 2
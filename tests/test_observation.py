@@ -0,0 +1,13 @@
+import observation
+from tools import Toolset
+
+
+def test_action_space_is_frozen_to_toolset_tools():
+    assert len(observation.TOOL_NAMES) == 14
+    assert all(callable(getattr(Toolset, t, None)) for t in observation.TOOL_NAMES)
+    assert observation.OBS_DIM == len(observation.STATES) + 2 * 14
+
+
+def test_llm_only_tools_are_observed_as_their_action():
+    assert observation.tool_index('apply_edits') == observation.tool_index('write_fix')
+    assert observation.tool_index('_extract_method_lines') == -1
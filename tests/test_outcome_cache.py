@@ -0,0 +1,42 @@
+import json
+
+import outcome_cache
+from test_runner import InProcessTestRunner
+from tools import Toolset
+
+LOOPS = "def spin(n):\n    while n:\n        pass\n    return n\n"
+CASES = [[[0], 0], [[1], 1]]
+
+
+def make_toolset(tmp_path, case_timeout, cache):
+    test_dir, work_dir = tmp_path / 'tests', tmp_path / 'work'
+    test_dir.mkdir(exist_ok=True)
+    work_dir.mkdir(exist_ok=True)
+    (work_dir / 'current_program.py').write_text(LOOPS)
+    (test_dir / 'spin.json').write_text("\n".join(json.dumps(c) for c in CASES) + "\n")
+    return Toolset(str(tmp_path), str(test_dir), work_dir=str(work_dir),
+                   test_runner=InProcessTestRunner(case_timeout=case_timeout), test_cache=cache)
+
+
+def test_timed_out_runs_are_not_cached(tmp_path):
+    cache = outcome_cache.TestOutcomeCache(str(tmp_path / 'outcomes.sqlite'))
+    toolset = make_toolset(tmp_path, 0.05, cache)
+    output = toolset.run_tests('tester.py', 'spin')
+    assert "timed out" in output
+    toolset.run_tests('tester.py', 'spin')
+    assert cache.stats()['hits'] == 0
+
+
+def test_case_timeout_is_part_of_the_suite_key(tmp_path):
+    cache = outcome_cache.TestOutcomeCache(str(tmp_path / 'outcomes.sqlite'))
+
+    def run(case_timeout):
+        toolset = make_toolset(tmp_path, case_timeout, cache)
+        (tmp_path / 'work' / 'current_program.py').write_text(LOOPS.replace("while n:", "if n:"))
+        return toolset.run_tests('tester.py', 'spin')
+
+    assert run(0.05).endswith("2/2 tests passed\n")
+    run(0.5)
+    assert cache.stats()['hits'] == 0
+    run(0.05)
+    assert cache.stats()['hits'] == 1
@@ -0,0 +1,106 @@
+import json
+import re
+
+from defect_classes import DefectClass
+from fsm import RepairAgentFSM
+from Middleware import Middleware
+from prompts import build_static_prompt
+from test_runner import InProcessTestRunner
+from tools import Toolset
+
+BUGGY = """def add_one(n):
+    result = n
+    result = result + 2
+    return result
+"""
+WRONG = BUGGY.replace("+ 2", "+ 3")
+FIXED = BUGGY.replace("+ 2", "+ 1")
+CASES = [[[1], 2], [[5], 6], [[-1], 0]]
+
+
+class StubClassifier:
+    def predict(self, snippet):
+        return DefectClass.INCORRECT_OPERATOR
+
+
+class TwoAttemptLLM:
+    """Asks for a fix in GENERATE_FIX and for tests otherwise; the first fix is wrong, the second right."""
+    def __init__(self):
+        self.fixes = [WRONG, FIXED]
+        self.fix_calls = 0
+
+    def generate(self, prompt, temperature=0.2, max_output_tokens=512, prefix=None, usage=None):
+        if prefix is None:
+            fix = self.fixes[min(self.fix_calls, len(self.fixes) - 1)]
+            self.fix_calls += 1
+            return f"```python\n{fix}```"
+        state = re.search(r"Current state: (\w+)", prompt)
+        tool = 'generate_method_body' if state and state.group(1) == 'GENERATE_FIX' else 'run_tests'
+        return json.dumps({"command": {"name": tool, "args": {}}})
+
+
+def make_session(tmp_path, max_cycles=12):
+    tmp_path.mkdir(parents=True, exist_ok=True)
+    code_dir, test_dir, work_dir = (tmp_path / d for d in ('code', 'tests', 'work'))
+    for d in (code_dir, test_dir, work_dir):
+        d.mkdir()
+    (code_dir / 'add_one.py').write_text(BUGGY)
+    (work_dir / 'current_program.py').write_text(BUGGY)
+    (test_dir / 'add_one.json').write_text("\n".join(json.dumps(c) for c in CASES) + "\n")
+    toolset = Toolset(str(code_dir), str(test_dir), work_dir=str(work_dir), test_runner=InProcessTestRunner())
+    llm = TwoAttemptLLM()
+    fsm = RepairAgentFSM(llm, toolset, 'tester.py', max_cycles=max_cycles)
+    fsm.state_data['algo_name'] = 'add_one'
+    mw = Middleware(llm, fsm, toolset, build_static_prompt(toolset), classifier=StubClassifier())
+    return fsm, mw, llm
+
+
+def test_second_fix_is_requested_after_a_failed_attempt(tmp_path):
+    fsm, mw, llm = make_session(tmp_path)
+    assert fsm.run(mw) == 'GOAL_ACCOMPLISHED'
+    assert llm.fix_calls == 2
+    assert fsm.state_data['attempts'] == 1
+    assert fsm.state_data['rejections'] == 0
+    with open(fsm.state_data['work_file']) as f:
+        assert f.read() == FIXED
+
+
+def test_applied_fix_is_not_forced_again(tmp_path):
+    fsm, mw, llm = make_session(tmp_path)
+    fsm.run(mw)
+    commands = [entry.tool for entry in mw.prompt['history']]
+    results = [entry.result for entry in mw.prompt['history']]
+    assert not any(r.startswith(("No changes made", "Rejected candidate fix")) for r in results), commands
+
+
+def test_fix_generation_is_charged_to_the_token_budget(tmp_path):
+    fsm, mw, llm = make_session(tmp_path)
+    fsm.run(mw)
+    kinds = [c['kind'] for c in mw.usage['cycles']]
+    assert kinds.count('fix') == llm.fix_calls == 2
+    assert mw.usage['calls'] == len(kinds)
+
+    fsm, mw, llm = make_session(tmp_path / 'budget')
+    mw.token_budget = 1
+    fsm.run(mw)
+    assert fsm.state == 'FAILED' and fsm.state_data['failure_reason'] == 'token_budget'
+    assert llm.fix_calls == 0
+
+
+def test_estimates_use_the_reported_characters_per_token(tmp_path):
+    fsm, mw, llm = make_session(tmp_path)
+    prompt, output = "x" * 600, "y" * 200
+    # A backend reported 100 tokens for 800 characters: 8 characters per token
+    mw._record_usage(prompt, output, {'prompt_tokens': 75, 'completion_tokens': 25}, kind='fix')
+    mw._record_usage(prompt, output, {'cache_hit': True}, kind='fix')
+    estimate = mw.usage['cycles'][-1]
+    assert estimate['estimated'] and estimate['cache_hit']
+    assert (estimate['prompt_tokens'], estimate['completion_tokens']) == (75, 25)
+
+
+def test_small_prefixes_skip_the_context_cache(monkeypatch):
+    import llm_interface
+    monkeypatch.setattr(llm_interface, '_context_caches', {})
+    assert llm_interface._cached_content('gemini-2.0-flash', "static prompt " * 100) is None
+    # No CachedContent.create was attempted (a refusal would be remembered as None)
+    assert llm_interface._context_caches == {}
@@ -0,0 +1,56 @@
+import json
+
+from speculative import SpeculativeFixer
+from test_runner import WarmTestRunner
+from tools import Toolset
+
+ORIGINAL = "def double(n):\n    return n + n + 1\n"
+CASES = [[[1], 2], [[3], 6]]
+
+
+class TemperatureLLM:
+    """Answers with the source registered for each temperature."""
+    def __init__(self, sources):
+        self.sources = sources
+
+    def generate(self, prompt, temperature=None, usage=None):
+        return self.sources[round(temperature, 1)]
+
+
+def make_fixer(tmp_path, sources, runner):
+    test_dir, work_dir = tmp_path / 'tests', tmp_path / 'work'
+    test_dir.mkdir()
+    work_dir.mkdir()
+    (work_dir / 'current_program.py').write_text(ORIGINAL)
+    (test_dir / 'double.json').write_text("\n".join(json.dumps(c) for c in CASES) + "\n")
+    toolset = Toolset(str(tmp_path), str(test_dir), work_dir=str(work_dir), test_runner=runner)
+    return SpeculativeFixer(TemperatureLLM(sources), toolset, 'tester.py', n_candidates=len(sources),
+                            temperatures=sorted(sources), scratch_root=str(tmp_path))
+
+
+def test_candidates_are_checked_against_the_original(tmp_path):
+    widened = "def double(n, m=0):\n    return n + n\n"
+    runner = WarmTestRunner(workers=1)
+    try:
+        fixer = make_fixer(tmp_path, {0.2: widened}, runner)
+        # The work file already carries the widened signature from an earlier write
+        (tmp_path / 'work' / 'current_program.py').write_text(widened.replace("n + n", "n * 3"))
+        report = fixer.propose("fix it", 'double', original=ORIGINAL)
+    finally:
+        runner.close()
+    assert (report['rejected'], report['validated'], report['verified']) == (1, 0, False)
+
+
+def test_no_validation_outlives_propose(tmp_path):
+    sources = {0.2: "def double(n):\n    return n * 2\n",
+               0.5: "def double(n):\n    return n * 3\n",
+               0.8: "def double(n):\n    return n << 1\n"}
+    runner = WarmTestRunner(workers=1)
+    try:
+        report = make_fixer(tmp_path, sources, runner).propose("fix it", 'double', original=ORIGINAL)
+        assert report['verified'] and report['source'] == sources[0.2]
+        # The first candidate passed: the others were cancelled before taking the worker
+        assert report['validated'] == 1
+        assert runner._idle.qsize() == runner.workers
+    finally:
+        runner.close()
@@ -0,0 +1,27 @@
+import json
+
+from tools import Toolset
+
+BUGGY = "def double(n):\n    return n + n + 1\n"
+FIXED = "def double(n):\n    return n + n\n"
+
+
+def make_toolset(tmp_path, with_cases=True):
+    code_dir, test_dir, work_dir = (tmp_path / d for d in ('code', 'tests', 'work'))
+    for d in (code_dir, test_dir, work_dir):
+        d.mkdir()
+    (code_dir / 'double.py').write_text(BUGGY)
+    (work_dir / 'current_program.py').write_text(FIXED)
+    if with_cases:
+        (test_dir / 'double.json').write_text("\n".join(json.dumps(c) for c in [[[1], 2], [[3], 6]]) + "\n")
+    return Toolset(str(code_dir), str(test_dir), work_dir=str(work_dir))
+
+
+def test_subprocess_path_tests_the_workspace_file(tmp_path):
+    output = make_toolset(tmp_path).run_tests('tester.py', 'double')
+    assert output.endswith("2/2 tests passed\n")
+
+
+def test_subprocess_path_refuses_tester_for_a_workspace(tmp_path):
+    output = make_toolset(tmp_path, with_cases=False).run_tests('tester.py', 'double')
+    assert output.startswith("Error in run_tests: no JSON test cases for double")
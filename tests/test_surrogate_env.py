@@ -0,0 +1,63 @@
+import random
+
+import numpy as np
+
+from observation import DEFECTS, OBS_DIM, state_index, tool_index
+from surrogate_env import SurrogateModel, SurrogateRepairEnv
+from trajectories import TrajectoryRecorder
+
+GATHER, FIX, DONE = state_index('GATHER_INFO'), state_index('GENERATE_FIX'), state_index('GOAL_ACCOMPLISHED')
+RUN, EXTRACT, WRITE = tool_index('run_tests'), tool_index('extract_method'), tool_index('write_fix')
+
+
+def model(rows, min_count=2):
+    """rows: ((state, older, newer, defect, action), next_state, repeat)."""
+    keys = np.array([key for key, _, n in rows for _ in range(n)], dtype=np.int64)
+    nxt = np.array([s for _, s, n in rows for _ in range(n)], dtype=np.int64)
+    return SurrogateModel(keys, nxt, [0], min_count)
+
+
+def test_specific_contexts_win_when_seen_often_enough():
+    m = model([((FIX, RUN, EXTRACT, 0, WRITE), DONE, 2), ((FIX, -1, EXTRACT, 0, WRITE), GATHER, 3)])
+    assert m.distribution((FIX, RUN, EXTRACT, 0, WRITE)) == {DONE: 2}
+
+
+def test_sparse_contexts_back_off_to_coarser_ones():
+    m = model([((FIX, RUN, EXTRACT, 0, WRITE), DONE, 1), ((FIX, -1, EXTRACT, 0, WRITE), GATHER, 3)])
+    # (state, newer, defect, action) pools both rows
+    assert m.distribution((FIX, RUN, EXTRACT, 0, WRITE)) == {DONE: 1, GATHER: 3}
+    # Another defect only matches on (state, newer, action) and (state, action)
+    assert m.distribution((FIX, RUN, EXTRACT, 1, WRITE)) == {DONE: 1, GATHER: 3}
+
+
+def test_below_min_count_everywhere_uses_the_most_specific_counts():
+    m = model([((FIX, RUN, EXTRACT, 0, WRITE), DONE, 1)], min_count=5)
+    assert m.distribution((FIX, RUN, EXTRACT, 0, WRITE)) == {DONE: 1}
+
+
+def test_unseen_tool_in_a_state_changes_nothing():
+    m = model([((FIX, RUN, EXTRACT, 0, WRITE), DONE, 3)])
+    assert m.distribution((GATHER, RUN, EXTRACT, 0, WRITE)) == {GATHER: 1}
+    assert m.distribution((FIX, RUN, EXTRACT, 0, RUN)) == {FIX: 1}
+
+
+def test_sampling_follows_the_counts():
+    m = model([((FIX, -1, -1, 0, WRITE), DONE, 3), ((FIX, -1, -1, 0, WRITE), GATHER, 1)])
+    rng = random.Random(0)
+    draws = [m.sample((FIX, -1, -1, 0, WRITE), rng) for _ in range(4000)]
+    assert 0.7 < draws.count(DONE) / len(draws) < 0.8
+
+
+def test_env_fitted_from_recorded_sessions(tmp_path):
+    path = str(tmp_path / 'traj')
+    for _ in range(3):
+        recorder = TrajectoryRecorder(path)
+        recorder.record('INIT', (), 'run_tests', 'GENERATE_FIX')
+        recorder.record('GENERATE_FIX', (RUN,), 'write_fix', 'GOAL_ACCOMPLISHED')
+        recorder.end_episode('GOAL_ACCOMPLISHED', 'bitcount.py', DEFECTS[0])
+    env = SurrogateRepairEnv(SurrogateModel.from_store(path, min_count=2), seed=0)
+    assert env.reset().shape == (OBS_DIM,)
+    assert env.step(RUN)[1:3] == (0.0, False)
+    obs, reward, done, info = env.step(WRITE)
+    assert (reward, done, info['defect']) == (1.0, True, DEFECTS[0].value)
+    assert obs[DONE] == 1
@@ -0,0 +1,86 @@
+import json
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from observation import OBS_DIM, state_index, tool_index
+from trajectories import TrajectoryRecorder, TrajectoryStore, discounted_returns
+
+
+def record_episode(path, program, steps=3, final='GOAL_ACCOMPLISHED'):
+    recorder = TrajectoryRecorder(path)
+    for i in range(steps):
+        recorder.record('GATHER_INFO', (tool_index('run_tests'),), 'extract_method', 'GENERATE_FIX', 0.5, 0.25)
+    return recorder.end_episode(final, program)
+
+
+def test_episodes_append_and_read_back(tmp_path):
+    path = str(tmp_path / 'traj')
+    assert record_episode(path, 'bitcount.py', steps=3) == 0
+    assert record_episode(path, 'gcd.py', steps=2, final='FAILED') == 1
+    assert TrajectoryRecorder(path).end_episode('FAILED') is None
+
+    cols = TrajectoryStore(path).columns()
+    assert len(TrajectoryStore(path)) == 5
+    assert cols['obs'].shape == (5, OBS_DIM)
+    assert list(cols['episode']) == [0, 0, 0, 1, 1]
+    assert list(cols['program']) == [0, 0, 0, 1, 1]
+    assert list(cols['step']) == [0, 1, 2, 0, 1]
+    assert list(cols['reward']) == [0, 0, 1, 0, -1]
+    assert list(cols['done']) == [0, 0, 1, 0, 1]
+    assert set(cols['action']) == {tool_index('extract_method')}
+    assert set(cols['state']) == {state_index('GATHER_INFO')}
+    assert cols['obs'][0][state_index('GATHER_INFO')] == 1
+
+
+def test_bytes_past_the_committed_rows_are_dropped(tmp_path):
+    path = str(tmp_path / 'traj')
+    record_episode(path, 'bitcount.py', steps=2)
+    # A writer killed after writing its columns but before committing meta.json
+    with open(tmp_path / 'traj' / 'action.bin', 'ab') as f:
+        f.write(np.array([7, 7, 7], dtype='i2').tobytes())
+    record_episode(path, 'bitcount.py', steps=1)
+    cols = TrajectoryStore(path).columns(['action', 'episode'])
+    assert list(cols['action']) == [tool_index('extract_method')] * 3
+    assert list(cols['episode']) == [0, 0, 1]
+
+
+def _append_many(path, worker):
+    for _ in range(10):
+        record_episode(path, f"program_{worker}.py", steps=worker + 1)
+
+
+def test_concurrent_appends_keep_episodes_contiguous(tmp_path):
+    path = str(tmp_path / 'traj')
+    TrajectoryStore(path)
+    ctx = multiprocessing.get_context('fork')
+    procs = [ctx.Process(target=_append_many, args=(path, w)) for w in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    cols = TrajectoryStore(path).columns()
+    assert len(cols['action']) == 10 * (1 + 2 + 3)
+    episodes = np.asarray(cols['episode'])
+    assert sorted(set(episodes)) == list(range(30))
+    # Every episode's rows are contiguous and numbered from 0
+    boundaries = np.flatnonzero(np.diff(episodes)) + 1
+    for rows in np.split(np.arange(len(episodes)), boundaries):
+        assert list(cols['step'][rows]) == list(range(len(rows)))
+        assert cols['done'][rows[-1]] == 1
+
+
+def test_store_rejects_a_different_action_space(tmp_path):
+    path = tmp_path / 'traj'
+    record_episode(str(path), 'bitcount.py')
+    meta = json.loads((path / 'meta.json').read_text())
+    meta['tool_names'] = meta['tool_names'] + ['apply_edits']
+    (path / 'meta.json').write_text(json.dumps(meta))
+    with pytest.raises(ValueError, match="different tool set"):
+        TrajectoryStore(str(path))
+
+
+def test_discounted_returns_reset_at_episode_ends():
+    returns = discounted_returns(np.array([0, 0, 1, 0, -1], dtype='f4'), np.array([0, 0, 1, 0, 1]), gamma=0.5)
+    assert list(returns) == [0.25, 0.5, 1.0, -0.5, -1.0]
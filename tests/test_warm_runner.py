@@ -0,0 +1,56 @@
+import json
+import time
+
+from test_runner import InProcessTestRunner, WarmTestRunner, get_test_runner, run_cases, MIN_CASE_TIMEOUT
+
+CORRECT = "def double(n):\n    return 2 * n\n"
+LOOPS = "def double(n):\n    while True:\n        pass\n"
+
+
+def test_get_test_runner_honours_its_parameters():
+    runner = get_test_runner(workers=1, case_timeout=0.7)
+    assert get_test_runner(workers=3, case_timeout=0.7) is runner
+    assert runner.workers == 3
+    other = get_test_runner(workers=1, case_timeout=0.3)
+    assert other is not runner and other.case_timeout == 0.3
+
+
+def write_suite(tmp_path, source, cases=9):
+    work = tmp_path / "double.py"
+    work.write_text(source)
+    testcases = tmp_path / "double.json"
+    testcases.write_text("".join(json.dumps([[n], 2 * n]) + "\n" for n in range(cases)))
+    return str(work), str(testcases)
+
+
+def test_run_stops_after_the_second_timed_out_case(tmp_path):
+    work, testcases = write_suite(tmp_path, LOOPS)
+    start = time.perf_counter()
+    output = run_cases(work, testcases, "double", case_timeout=0.2)
+    assert time.perf_counter() - start < 1.0
+    assert output.count("FAILED: timed out") == 2
+    assert "Stopped after 2 timed-out cases (2/9 cases run)" in output
+    assert output.endswith("0/9 tests passed\n")
+
+
+def test_passing_times_become_case_budgets(tmp_path):
+    runner = InProcessTestRunner(case_timeout=0.5)
+    work, testcases = write_suite(tmp_path, CORRECT)
+    assert "9/9 tests passed" in runner.run(work, testcases, "double")
+    assert sorted(runner.baselines.get(testcases)) == sorted(f"test_double_{i}" for i in range(9))
+
+    (tmp_path / "double.py").write_text(LOOPS)
+    start = time.perf_counter()
+    output = runner.run(work, testcases, "double")
+    assert time.perf_counter() - start < 0.5
+    assert f"timed out after {MIN_CASE_TIMEOUT:.3g}s" in output
+
+
+def test_warm_runner_records_baselines(tmp_path):
+    runner = WarmTestRunner(workers=1, case_timeout=0.5)
+    try:
+        work, testcases = write_suite(tmp_path, CORRECT, cases=3)
+        assert "3/3 tests passed" in runner.run(work, testcases, "double")
+        assert len(runner.baselines.get(testcases)) == 3
+    finally:
+        runner.close()
@@ -1,119 +1,290 @@
 import os
-import ast
 import re
 import subprocess
-import logging
 import difflib
+import json
+import time
+from kvstore import content_hash
+from outcome_cache import suite_hash
+from source_model import get_source_model, invalidate_source_model
+from code_index import get_code_index, invalidate_code_index
+from edits import numbered, apply_edits
+from fault_localization import rank_lines
 
-logging.basicConfig(level=logging.INFO)
+
+WORK_FILE_NAME = 'current_program.py'
+TEST_RUNNER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_runner.py')
+
+def failed_tests(test_output: str) -> list:
+    failed_tests = []
+    for line in test_output.splitlines():
+        if "FAILED" in line or "AssertionError" in line:
+            match = re.search(r"test_\w+", line)
+            if match:
+                failed_tests.append(match.group(0))
+    return list(set(failed_tests))
+
+def timed_out_tests(test_output: str) -> list:
+    """Names of the tests a run_tests output reports as timed out."""
+    return [line.split()[0] for line in test_output.splitlines() if "FAILED: timed out" in line]
+
+def has_timeouts(test_output: str) -> bool:
+    """True when a run_tests output depends on timing: the whole run or a single case timed out."""
+    return "timed out" in test_output
+
+def tests_passed(test_output: str) -> bool:
+    """True when a run_tests output reports no failures and didn't error or time out."""
+    if not test_output or test_output.startswith(("Error", "Exception", "Test execution timed out")):
+        return False
+    return not failed_tests(test_output)
 
 class Toolset:
-    def __init__(self, code_dir: str, test_dir: str):
+    def __init__(self, code_dir: str, test_dir: str, work_dir: str = None, test_runner=None,
+                 test_cache=None):
         self.code_dir = code_dir
         self.test_dir = test_dir
+        # Optional test_runner.WarmTestRunner; without one, tests run in a fresh subprocess
+        self.test_runner = test_runner
+        # Optional outcome_cache.TestOutcomeCache consulted before running any tests
+        self.test_cache = test_cache
+        # Tests that failed last time run first on the next warm run
+        self._last_failing = []
+        # ((source, file_path), ranking) of the last run_fault_localization
+        self._localization = None
+        # (source, file_path, output) of the last full warm test run
+        self._last_run = None
+        # Relative file paths handed to the tools (e.g. the LLM's "current_program.py")
+        # resolve against work_dir, so each worker can repair in its own scratch directory.
+        self.work_dir = os.path.abspath(work_dir) if work_dir else None
+        self.work_file = self._resolve(WORK_FILE_NAME)
 
+    def _resolve(self, file_path: str) -> str:
+        if self.work_dir and not os.path.isabs(file_path):
+            return os.path.join(self.work_dir, file_path)
+        return file_path
+
+    def _display_path(self, file_path: str) -> str:
+        # Keep scratch directory names out of diffs so prompts are identical across runs
+        if self.work_dir:
+            rel = os.path.relpath(file_path, self.work_dir)
+            if not rel.startswith(os.pardir):
+                return rel
+        return file_path
 
     def read_range(self, file_path: str, start_line: int, end_line: int) -> str:
         try:
-            with open(file_path, "r") as f:
-                lines = f.readlines()
+            lines = get_source_model(self._resolve(file_path)).lines
             return "".join(lines[start_line - 1:end_line])
         except Exception as e:
             return f"Error in read_range: {e}"
 
     def get_classes_and_methods(self, file_path: str) -> dict:
         try:
-            with open(file_path, "r") as f:
-                source = f.read()
-            tree = ast.parse(source)
-            classes, functions = [], []
-            for node in ast.walk(tree):
-                if isinstance(node, ast.ClassDef):
-                    classes.append(node.name)
-                elif isinstance(node, ast.FunctionDef):
-                    functions.append(node.name)
-            return {"classes": classes, "methods": functions}
+            model = get_source_model(self._resolve(file_path))
+            return {"classes": list(model.classes), "methods": list(model.functions)}
         except Exception as e:
             return {"error": f"get_classes_and_methods: {e}"}
 
     def extract_method(self, file_path: str, method_name: str) -> str:
         try:
-            with open(file_path, "r") as f:
-                source = f.read()
-            tree = ast.parse(source)
-            for node in ast.walk(tree):
-                if isinstance(node, ast.FunctionDef) and node.name == method_name:
-                    return ast.unparse(node)
+            source = get_source_model(self._resolve(file_path)).function_source(method_name)
+            if source is not None:
+                return source
             return f"Method '{method_name}' not found."
         except Exception as e:
             return f"Error in extract_method: {e}"
 
+    def _extract_method_lines(self, file_path: str, method_name: str) -> str:
+        """Source of `method_name` as it is in the file, each line prefixed with its line number."""
+        try:
+            model = get_source_model(self._resolve(file_path))
+            node = model.function(method_name)
+            if node is None:
+                return f"Method '{method_name}' not found."
+            start = node.decorator_list[0].lineno if node.decorator_list else node.lineno
+            return numbered(model.lines[start - 1:node.end_lineno], start)
+        except Exception as e:
+            return f"Error in _extract_method_lines: {e}"
+
     def extract_tests(self, test_output: str) -> list:
-        failed_tests = []
-        for line in test_output.splitlines():
-            if "FAILED" in line or "AssertionError" in line:
-                match = re.search(r"test_\w+", line)
-                if match:
-                    failed_tests.append(match.group(0))
-        return list(set(failed_tests))
+        return failed_tests(test_output)
 
     def search_code_base(self, keyword: str, code_dir: str = None) -> list:
+        # Served from the persistent trigram index (code_index.py) instead of a full scan
         root_dir = code_dir or self.code_dir
-        matches = []
-        for root, _, files in os.walk(root_dir):
-            for name in files:
-                if name.endswith('.py'):
-                    path = os.path.join(root, name)
-                    try:
-                        with open(path, 'r') as f:
-                            for idx, line in enumerate(f.readlines()):
-                                if keyword in line:
-                                    matches.append((path, idx + 1, line.strip()))
-                    except Exception as e:
-                        matches.append((path, None, f"search_error: {e}"))
-        return matches
+        return get_code_index(root_dir).search(keyword)
 
     def find_similar_api_calls(self, method_name: str) -> list:
         return self.search_code_base(method_name)
 
-    def generate_method_body(self, prompt: str, llm) -> str:
-        return llm.generate(prompt)
+    def generate_method_body(self, prompt: str, llm, usage: dict = None) -> str:
+        return llm.generate(prompt, usage=usage)
+
 
+    def run_tests(self, test_script: str, file_path: str, fail_fast: bool = False) -> str:
+        output = self._run_tests(test_script, file_path, fail_fast)
+        if not fail_fast and self.test_runner is not None:
+            try:
+                with open(self.work_file, "r") as f:
+                    self._last_run = (f.read(), file_path, output)
+            except OSError:
+                self._last_run = None
+        return output
+
+    def _run_tests(self, test_script: str, file_path: str, fail_fast: bool = False) -> str:
+        testcase_path = os.path.join(self.test_dir, f"{file_path}.json")
+        warm = self.test_runner is not None and os.path.exists(testcase_path)
+        if self.test_cache is None:
+            return self._execute_tests(test_script, file_path, testcase_path, warm, fail_fast)
 
-    def run_tests(self, test_script: str, file_path: str) -> str:
         try:
-            result = subprocess.run(
-                ['python', test_script,file_path],cwd='Code-Refactoring-QuixBugs', capture_output=True, text=True, timeout=30
-            )
+            with open(self.work_file, "r") as f:
+                source = f.read()
+        except OSError:
+            return self._execute_tests(test_script, file_path, testcase_path, warm, fail_fast)
+        if warm:
+            suite = suite_hash(testcase_path, extra=f"warm:{file_path}:fail_fast={fail_fast}:"
+                                                    f"case_timeout={self._case_timeout()}")
+        elif os.path.exists(testcase_path):
+            suite = suite_hash(testcase_path, extra=f"subprocess-json:{file_path}:fail_fast={fail_fast}")
+        else:
+            suite = suite_hash(test_script, testcase_path, extra=f"subprocess:{file_path}")
+        cached = self.test_cache.lookup(source, suite)
+        if cached is not None:
+            return cached['output']
+
+        start = time.perf_counter()
+        output = self._execute_tests(test_script, file_path, testcase_path, warm, fail_fast)
+        # A timeout may only mean the machine was busy: never persist it
+        if not output.startswith("Error in run_tests") and not has_timeouts(output):
+            self.test_cache.record(source, suite, output, self.extract_tests(output),
+                                   time.perf_counter() - start)
+        return output
+
+    def _case_timeout(self):
+        return getattr(self.test_runner, 'case_timeout', None)
+
+    def _execute_tests(self, test_script: str, file_path: str, testcase_path: str, warm: bool,
+                       fail_fast: bool = False) -> str:
+        if warm:
+            output = self.test_runner.run(self.work_file, testcase_path, file_path,
+                                          fail_fast=fail_fast, priority=self._last_failing)
+            self._last_failing = self.extract_tests(output) or self._last_failing
+            return output
+        if os.path.exists(testcase_path):
+            # A fresh interpreter per call, but still testing this toolset's work file
+            command = ['python', TEST_RUNNER_SCRIPT, self.work_file, testcase_path, file_path]
+            command, cwd = command + (['--fail-fast'] if fail_fast else []), None
+        elif self.work_dir:
+            # tester.py imports the program from the QuixBugs checkout, not from our workspace
+            return (f"Error in run_tests: no JSON test cases for {file_path}; tester.py would test "
+                    f"Code-Refactoring-QuixBugs, not {self._display_path(self.work_file)} in the workspace")
+        else:
+            command, cwd = ['python', test_script, file_path], 'Code-Refactoring-QuixBugs'
+        try:
+            result = subprocess.run(command, cwd=cwd, capture_output=True, text=True, timeout=30)
             return result.stdout + result.stderr
         except subprocess.TimeoutExpired:
             return "Test execution timed out."
         except Exception as e:
             return f"Error in run_tests: {e}"
 
-    def run_fault_localization(self, test_output: str) -> list:
-        return self.extract_tests(test_output)
+    def run_fault_localization(self, test_output: str = None, file_path: str = None, top: int = 5) -> list:
+        """
+        The `top` most suspicious lines of the work file as {line, score, code},
+        ranked by Ochiai over per-test line coverage from one instrumented run of
+        file_path's test cases. Tests that timed out in the last full run_tests
+        of this source are traced only briefly. test_output is not needed (kept
+        for the tool's old signature). Results are reused until the work file changes.
+        """
+        try:
+            with open(self.work_file, "r") as f:
+                source = f.read()
+            if self._localization is None or self._localization[0] != (source, file_path):
+                timed_out = []
+                if self._last_run and self._last_run[:2] == (source, file_path):
+                    timed_out = timed_out_tests(self._last_run[2])
+                self._localization = ((source, file_path), self._rank_lines(source, file_path, timed_out))
+            ranked = self._localization[1]
+            if isinstance(ranked, str):
+                return [ranked]
+            lines = source.splitlines()
+            return [{'line': line, 'score': round(score, 3), 'code': lines[line - 1].strip()}
+                    for line, score in ranked[:top] if line <= len(lines)]
+        except Exception as e:
+            return [f"Error in run_fault_localization: {e}"]
+
+    def _rank_lines(self, source: str, file_path: str, timed_out: list = None):
+        """Ranked (line, score) list, or an error message. Coverage is cached with the test outcomes."""
+        testcase_path = os.path.join(self.test_dir, f"{file_path}.json")
+        if not file_path or not os.path.exists(testcase_path):
+            return f"Error in run_fault_localization: no test cases for {file_path!r}"
+        # Line numbers differ between formatting variants the outcome cache treats as one source
+        suite = suite_hash(testcase_path, extra=f"coverage:{file_path}:{content_hash('src', source)}:"
+                                                f"case_timeout={self._case_timeout()}")
+        cached = self.test_cache.lookup(source, suite) if self.test_cache is not None else None
+        if cached is not None:
+            return rank_lines(cached['output']['cases'])
+        start = time.perf_counter()
+        coverage = self._collect_coverage(testcase_path, file_path, timed_out)
+        if 'error' in coverage:
+            return coverage['error']
+        if self.test_cache is not None and not any(c.get('timed_out') for c in coverage['cases']):
+            self.test_cache.record(source, suite, coverage,
+                                   [c['name'] for c in coverage['cases'] if not c['passed']],
+                                   time.perf_counter() - start)
+        return rank_lines(coverage['cases'])
+
+    def _collect_coverage(self, testcase_path: str, file_path: str, timed_out: list = None) -> dict:
+        if self.test_runner is not None:
+            return self.test_runner.coverage(self.work_file, testcase_path, file_path, timed_out=timed_out)
+        try:
+            result = subprocess.run(
+                ['python', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fault_localization.py'),
+                 self.work_file, testcase_path, file_path, '--coverage', '--timed-out', *(timed_out or [])],
+                capture_output=True, text=True, timeout=30
+            )
+            return json.loads(result.stdout)
+        except subprocess.TimeoutExpired:
+            return {'error': "Error in run_fault_localization: test execution timed out."}
+        except ValueError:
+            return {'error': f"Error in run_fault_localization: {result.stderr.strip()[-200:]}"}
 
     def write_fix(self,file_path: str, new_source: str) -> str:
         """
         Overwrite file_path with new_source, returning a unified diff.
         """
-        import difflib
+        file_path = self._resolve(file_path)
+        label = self._display_path(file_path)
         with open(file_path, 'r') as f:
             old = f.read().splitlines(keepends=True)
         new = new_source.splitlines(keepends=True)
         diff = ''.join(difflib.unified_diff(
             old, new,
-            fromfile=f"{file_path} (original)",
-            tofile=f"{file_path} (patched)",
+            fromfile=f"{label} (original)",
+            tofile=f"{label} (patched)",
             lineterm=''
         ))
         if diff:
             with open(file_path, 'w') as f:
                 f.write(new_source)
+            invalidate_source_model(file_path)
+            invalidate_code_index(file_path)
             return diff
         return "No changes made."
 
+    def apply_edits(self, file_path: str, edits) -> str:
+        """
+        Apply line-range edits (an edit script or a list of
+        {start_line, end_line, new_text}, see edits.py) and return the unified diff.
+        """
+        try:
+            with open(self._resolve(file_path), 'r') as f:
+                new_source = apply_edits(f.read(), edits)
+        except (OSError, ValueError) as e:
+            return f"Error in apply_edits: {e}"
+        return self.write_fix(file_path, new_source)
+
     def express_hypothesis(self, hypothesis: str, state: dict) -> str:
         state['hypothesis'] = hypothesis
         return "Hypothesis expressed"
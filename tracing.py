@@ -0,0 +1,93 @@
+import os
+import json
+import time
+import threading
+import contextlib
+
+class Tracer:
+    """
+    Collects timed spans for one repair session: classification, LLM calls,
+    parse_response, tool invocations and FSM transitions. Spans are plain
+    dicts so they pickle across worker processes; timestamps come from
+    perf_counter (system-wide monotonic on Linux), so spans from several
+    sessions and processes line up in one trace.
+    """
+    def __init__(self, session: str = '', enabled: bool = True):
+        self.session = session
+        self.enabled = enabled
+        self.spans   = []
+        self._lock   = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name: str, cat: str = 'repair', **args):
+        """Time the body; `args` (and anything the body adds to the yielded dict) are kept with the span."""
+        if not self.enabled:
+            yield {}
+            return
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter()
+            record = {'session': self.session, 'name': name, 'cat': cat,
+                      'start': start, 'dur': end - start,
+                      'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args}
+            with self._lock:
+                self.spans.append(record)
+
+    def aggregate(self) -> dict:
+        return aggregate(self.spans)
+
+
+def aggregate(spans: list) -> dict:
+    """Span name -> {count, total_s, mean_ms, max_ms}."""
+    stats = {}
+    for s in spans:
+        row = stats.setdefault(s['name'], {'count': 0, 'total_s': 0.0, 'max_ms': 0.0})
+        row['count']   += 1
+        row['total_s'] += s['dur']
+        row['max_ms']   = max(row['max_ms'], 1000 * s['dur'])
+    for row in stats.values():
+        row['mean_ms'] = 1000 * row['total_s'] / row['count']
+    return stats
+
+def merge_aggregates(aggregates: list) -> dict:
+    """Combine several aggregate() results, e.g. one per program."""
+    merged = {}
+    for agg in aggregates:
+        for name, row in agg.items():
+            out = merged.setdefault(name, {'count': 0, 'total_s': 0.0, 'max_ms': 0.0})
+            out['count']   += row['count']
+            out['total_s'] += row['total_s']
+            out['max_ms']   = max(out['max_ms'], row['max_ms'])
+    for row in merged.values():
+        row['mean_ms'] = 1000 * row['total_s'] / row['count'] if row['count'] else 0.0
+    return merged
+
+def write_jsonl(spans: list, path: str):
+    """One span per line."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        for s in spans:
+            f.write(json.dumps(s, default=str) + "\n")
+
+def write_chrome_trace(spans: list, path: str):
+    """
+    Chrome trace-event JSON (chrome://tracing, Perfetto). Each session gets its
+    own track, so concurrent sessions on one event loop don't interleave.
+    """
+    origin = min((s['start'] for s in spans), default=0.0)
+    tracks = {}
+    events = []
+    for s in spans:
+        key = (s['pid'], s['session'] or s['tid'])
+        if key not in tracks:
+            tracks[key] = len(tracks) + 1
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': s['pid'], 'tid': tracks[key],
+                           'args': {'name': str(key[1])}})
+        events.append({'name': s['name'], 'cat': s['cat'], 'ph': 'X',
+                       'ts': 1e6 * (s['start'] - origin), 'dur': 1e6 * s['dur'],
+                       'pid': s['pid'], 'tid': tracks[key], 'args': s['args']})
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
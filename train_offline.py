@@ -0,0 +1,91 @@
+import os
+import argparse
+import logging
+import numpy as np
+from trajectories import TrajectoryStore, TRAJECTORY_DIR, discounted_returns
+from observation import OBS_DIM, TOOL_NAMES
+
+POLICY_PATH = os.path.join('models', 'bc_policy.pt')
+
+logger = logging.getLogger(__name__)
+
+def load_dataset(path: str = TRAJECTORY_DIR, successful_only: bool = False, gamma: float = 0.99) -> dict:
+    """
+    Observations, actions and discounted returns from a trajectory store.
+    Rows whose tool is not a Toolset method are dropped; successful_only keeps
+    only episodes that ended in GOAL_ACCOMPLISHED.
+    """
+    cols = TrajectoryStore(path).columns()
+    returns = discounted_returns(cols['reward'], cols['done'], gamma)
+    keep = np.asarray(cols['action']) >= 0
+    if successful_only:
+        solved = np.unique(cols['episode'][(cols['done'] == 1) & (cols['reward'] > 0)])
+        keep &= np.isin(cols['episode'], solved)
+    return {
+        'obs':     np.asarray(cols['obs'][keep], dtype=np.float32),
+        'action':  np.asarray(cols['action'][keep], dtype=np.int64),
+        'returns': returns[keep],
+        'episodes': len(np.unique(cols['episode'][keep])),
+    }
+
+def behaviour_cloning(dataset: dict, epochs: int = 20, batch_size: int = 256, lr: float = 3e-4,
+                      vf_coef: float = 0.5, seed: int = 0):
+    """
+    Fit PPO's default MlpPolicy to the logged actions (cross-entropy), with the
+    value head regressed on the logged returns. The result can be loaded into
+    PPO before online training (train_rl.py --init-policy).
+    """
+    import torch
+    import torch.nn.functional as F
+    from gym import spaces
+    from stable_baselines3.common.policies import ActorCriticPolicy
+
+    torch.manual_seed(seed)
+    policy = ActorCriticPolicy(spaces.Box(0, 1, shape=(OBS_DIM,), dtype=np.float32),
+                               spaces.Discrete(len(TOOL_NAMES)), lr_schedule=lambda _: lr)
+    obs = torch.as_tensor(dataset['obs'])
+    actions = torch.as_tensor(dataset['action'])
+    returns = torch.as_tensor(dataset['returns'])
+    rng = np.random.default_rng(seed)
+    for epoch in range(epochs):
+        order = torch.as_tensor(rng.permutation(len(actions)))
+        total, correct = 0.0, 0
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            values, log_prob, _ = policy.evaluate_actions(obs[idx], actions[idx])
+            loss = -log_prob.mean() + vf_coef * F.mse_loss(values.flatten(), returns[idx])
+            policy.optimizer.zero_grad()
+            loss.backward()
+            policy.optimizer.step()
+            total += loss.item() * len(idx)
+            with torch.no_grad():
+                correct += (policy.get_distribution(obs[idx]).mode() == actions[idx]).sum().item()
+        logger.info(f"epoch {epoch + 1}/{epochs}: loss {total / len(order):.4f}, "
+                    f"action accuracy {correct / len(order):.1%}")
+    return policy
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train the tool-selection policy offline from recorded trajectories.")
+    parser.add_argument('--trajectories', default=TRAJECTORY_DIR,
+                        help="Store written by evaluate.py --record-trajectories or train_rl.py --record")
+    parser.add_argument('--successful-only', action='store_true', help="Imitate only episodes that fixed the bug")
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--lr', type=float, default=3e-4)
+    parser.add_argument('--gamma', type=float, default=0.99)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', default=POLICY_PATH)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    dataset = load_dataset(args.trajectories, args.successful_only, args.gamma)
+    if not len(dataset['action']):
+        raise SystemExit(f"No usable transitions in {args.trajectories}")
+    logger.info(f"{len(dataset['action'])} transitions from {dataset['episodes']} episodes")
+    policy = behaviour_cloning(dataset, args.epochs, args.batch_size, args.lr, seed=args.seed)
+
+    import torch
+    os.makedirs(os.path.dirname(args.save) or '.', exist_ok=True)
+    torch.save(policy.state_dict(), args.save)
+    logger.info(f"saved policy to {args.save}")
@@ -1,23 +1,72 @@
-from stable_baselines3 import PPO
-from repair_env import RepairEnv
+import os
+import glob
+import argparse
+from repair_env import make_env, BUGGY_DIR, TEST_SCRIPT
+from classifier import BACKENDS as CLASSIFIER_BACKENDS
 
-bugs = ["Code-Refactoring-QuixBugs/python_programs/bitcount.py", ...]  # list all 40
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train the tool-selection policy with PPO.")
+    parser.add_argument('--n-envs', type=int, default=os.cpu_count() or 1,
+                        help="Parallel environments, each sampling episodes across all bugs")
+    parser.add_argument('--dummy', action='store_true', help="Step the envs in this process (DummyVecEnv)")
+    parser.add_argument('--timesteps', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--llm-mode', default='cache', choices=['off', 'cache', 'record', 'replay'])
+    parser.add_argument('--save', default=os.path.join('models', 'ppo_policy'))
+    parser.add_argument('--classifier-backend', choices=CLASSIFIER_BACKENDS, default='fp32',
+                        help="CPU inference path of the defect classifier in every env")
+    parser.add_argument('--record', metavar='DIR',
+                        help="Log every transition to a trajectory store (see train_offline.py)")
+    parser.add_argument('--init-policy', metavar='PATH',
+                        help="Start from a policy pre-trained offline by train_offline.py")
+    parser.add_argument('--surrogate', metavar='DIR',
+                        help="Train on the surrogate env fitted from this trajectory store instead of RepairEnv")
+    parser.add_argument('--validate-episodes', type=int, default=10,
+                        help="RepairEnv episodes to evaluate a surrogate-trained policy on (0 skips)")
+    args = parser.parse_args()
+    # After argument parsing so --help doesn't wait for torch
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv
 
-env = RepairEnv(
-    buggy_file=bugs[0],
-    code_dir="Code-Refactoring-QuixBugs/python_programs",
-    test_script="Code-Refactoring-QuixBugs/tester.py",
-    llm_api_key='API_KEY'
-)
+    bugs = sorted(glob.glob(os.path.join(BUGGY_DIR, '*.py')))
+    env_fns = [make_env(bugs, rank, seed=args.seed,
+                        code_dir=BUGGY_DIR,
+                        test_script=TEST_SCRIPT,
+                        llm_api_key='API_KEY',
+                        llm_mode=args.llm_mode,
+                        trajectories=args.record,
+                        classifier_backend=args.classifier_backend)
+               for rank in range(args.n_envs)]
+    if args.surrogate:
+        from surrogate_env import SurrogateModel, make_surrogate_env
+        surrogate = SurrogateModel.from_store(args.surrogate)
+        # Surrogate steps are microseconds: subprocesses would only add IPC
+        env = DummyVecEnv([make_surrogate_env(surrogate, rank, seed=args.seed) for rank in range(args.n_envs)])
+    else:
+        env = DummyVecEnv(env_fns) if args.dummy or args.n_envs == 1 else SubprocVecEnv(env_fns)
 
-model = PPO(
-    "MlpPolicy",
-    env,
-    verbose=1,
-    learning_rate=3e-4,
-    ent_coef=0.01,
-)
+    model = PPO(
+        "MlpPolicy",
+        env,
+        verbose=1,
+        learning_rate=3e-4,
+        ent_coef=0.01,
+    )
 
-model.learn(total_timesteps=10000)
+    if args.init_policy:
+        import torch
+        model.policy.load_state_dict(torch.load(args.init_policy))
 
-print("training finished")
\ No newline at end of file
+    model.learn(total_timesteps=args.timesteps)
+    model.save(args.save)
+    env.close()
+
+    if args.surrogate and args.validate_episodes:
+        from stable_baselines3.common.evaluation import evaluate_policy
+        real_env = DummyVecEnv(env_fns[:1])
+        mean_reward, std_reward = evaluate_policy(model, real_env, n_eval_episodes=args.validate_episodes)
+        real_env.close()
+        print(f"RepairEnv validation: mean reward {mean_reward:.2f} +/- {std_reward:.2f} "
+              f"over {args.validate_episodes} episodes")
+
+    print("training finished")
@@ -0,0 +1,152 @@
+import os
+import json
+import fcntl
+import numpy as np
+from observation import OBS_DIM, STATES, TOOL_NAMES, encode, state_index, tool_index, defect_index
+
+TRAJECTORY_DIR = os.path.join('.cache', 'trajectories')
+
+# column -> (dtype, per-row shape); one flat binary file per column
+COLUMNS = {
+    'obs':         ('u1', (OBS_DIM,)),
+    'action':      ('i2', ()),
+    'reward':      ('f4', ()),
+    'done':        ('u1', ()),
+    'episode':     ('i4', ()),
+    'step':        ('i2', ()),
+    'state':       ('i1', ()),
+    'next_state':  ('i1', ()),
+    'defect':      ('i1', ()),
+    'program':     ('i2', ()),
+    'seconds':     ('f4', ()),
+    'llm_seconds': ('f4', ()),
+}
+
+def episode_reward(final_state: str) -> float:
+    """RepairEnv's terminal reward."""
+    return 1.0 if final_state == 'GOAL_ACCOMPLISHED' else -1.0
+
+class TrajectoryStore:
+    """
+    Append-only columnar store of repair transitions. Each column is a raw
+    binary file read back as a read-only np.memmap, so training reads whole
+    columns at array speed. meta.json holds the committed row count; appends
+    from several processes are serialized with an flock, and bytes past the
+    committed count (a writer killed mid-append) are truncated on the next one.
+    """
+    def __init__(self, path: str = TRAJECTORY_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.meta = self._read_meta()
+        if self.meta['tool_names'] != TOOL_NAMES or self.meta['states'] != STATES:
+            raise ValueError(f"{path} was recorded with a different tool set or FSM states; "
+                             "use a new trajectory directory")
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, 'meta.json')
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(self._meta_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'rows': 0, 'episodes': 0, 'programs': [], 'tool_names': TOOL_NAMES, 'states': STATES,
+                    'columns': {name: [dtype, list(shape)] for name, (dtype, shape) in COLUMNS.items()}}
+
+    def _write_meta(self):
+        tmp = self._meta_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._meta_path())
+
+    def append(self, rows: dict, program: str = '') -> int:
+        """Append one episode (equal-length arrays per column, 'episode' and 'program' filled here); returns its id."""
+        n = len(rows['action'])
+        with open(os.path.join(self.path, 'lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.meta = self._read_meta()
+            episode = self.meta['episodes']
+            if program not in self.meta['programs']:
+                self.meta['programs'].append(program)
+            rows = dict(rows, episode=np.full(n, episode), program=np.full(n, self.meta['programs'].index(program)))
+            for name, (dtype, shape) in COLUMNS.items():
+                data = np.ascontiguousarray(rows[name], dtype=dtype).reshape((n,) + shape)
+                row_bytes = np.dtype(dtype).itemsize * int(np.prod(shape))
+                with open(self._column_path(name), 'ab') as f:
+                    f.truncate(self.meta['rows'] * row_bytes)
+                    f.write(data.tobytes())
+            self.meta['rows'] += n
+            self.meta['episodes'] += 1
+            self._write_meta()
+        return episode
+
+    def __len__(self):
+        return self._read_meta()['rows']
+
+    def columns(self, names: list = None) -> dict:
+        """Read-only memmaps of the committed rows, by column name."""
+        self.meta = self._read_meta()
+        rows = self.meta['rows']
+        arrays = {}
+        for name in names or COLUMNS:
+            dtype, shape = COLUMNS[name]
+            if rows == 0:
+                arrays[name] = np.zeros((0,) + shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(self._column_path(name), dtype=dtype, mode='r', shape=(rows,) + shape)
+        return arrays
+
+class TrajectoryRecorder:
+    """
+    Buffers one session's transitions (see Middleware.recorder) and appends
+    them to a TrajectoryStore when the episode ends, with RepairEnv's rewards:
+    0 per step, +1 / -1 on the last one.
+    """
+    def __init__(self, path: str = TRAJECTORY_DIR):
+        self.store = TrajectoryStore(path)
+        self.rows = []
+
+    def record(self, state_before: str, history_tools: tuple, tool_name: str, state_after: str,
+               seconds: float = 0.0, llm_seconds: float = 0.0):
+        self.rows.append((state_index(state_before), history_tools, tool_index(tool_name),
+                          state_index(state_after), seconds, llm_seconds))
+
+    def discard(self):
+        """Drop an unfinished episode (e.g. an env reset before it was done)."""
+        self.rows = []
+
+    def end_episode(self, final_state: str, program: str = '', defect=None):
+        """Write the buffered episode and start a new one. Returns its id, or None if nothing was recorded."""
+        rows, self.rows = self.rows, []
+        if not rows:
+            return None
+        n = len(rows)
+        reward = np.zeros(n, dtype='f4')
+        done = np.zeros(n, dtype='u1')
+        reward[-1], done[-1] = episode_reward(final_state), 1
+        return self.store.append({
+            'obs':         np.array([encode(state, tools) for state, tools, *_ in rows]),
+            'action':      np.array([r[2] for r in rows]),
+            'reward':      reward,
+            'done':        done,
+            'step':        np.arange(n),
+            'state':       np.array([r[0] for r in rows]),
+            'next_state':  np.array([r[3] for r in rows]),
+            'defect':      np.full(n, defect_index(defect)),
+            'seconds':     np.array([r[4] for r in rows]),
+            'llm_seconds': np.array([r[5] for r in rows]),
+        }, program)
+
+def discounted_returns(reward: np.ndarray, done: np.ndarray, gamma: float = 0.99) -> np.ndarray:
+    """Per-row discounted return to the end of its episode (rows stored episode by episode)."""
+    returns = np.zeros(len(reward), dtype=np.float32)
+    running = 0.0
+    for i in range(len(reward) - 1, -1, -1):
+        if done[i]:
+            running = 0.0
+        running = reward[i] + gamma * running
+        returns[i] = running
+    return returns
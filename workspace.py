@@ -0,0 +1,28 @@
+import os
+import shutil
+import tempfile
+from tools import WORK_FILE_NAME
+
+class Workspace:
+    """
+    A private scratch directory holding one `current_program.py`, so that
+    concurrent repair sessions never write to the same work file.
+    """
+    def __init__(self, root: str = None, prefix: str = 'repair_'):
+        if root:
+            os.makedirs(root, exist_ok=True)
+        self.path      = tempfile.mkdtemp(prefix=prefix, dir=root)
+        self.work_file = os.path.join(self.path, WORK_FILE_NAME)
+
+    def load(self, src_path: str) -> str:
+        shutil.copy(src_path, self.work_file)
+        return self.work_file
+
+    def cleanup(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()